@@ -0,0 +1,213 @@
+"""Agregados dos gastos mantidos incrementalmente e persistidos junto aos dados.
+
+Cada inserção ou edição ajusta os totais em O(1), subtraindo a contribuição
+anterior do gasto e somando a nova. Os valores são centavos inteiros, então
+o ajuste incremental e o recálculo completo (verificar) batem exatamente.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from storage import (
+    STATUS_COMPLETO,
+    STATUS_EM_ANDAMENTO,
+    STATUS_NAO_INICIADO,
+    STATUS_OUTRO,
+    abrir_storage,
+    caminho_lateral,
+    decimos_porcentagem,
+    para_reais,
+    valor_pago,
+)
+
+# Unidade dos valores gravados; arquivos de outra unidade são recalculados
+UNIDADE = "centavos"
+
+
+def status_gasto(porcentagem: float) -> str:
+    """Status de um gasto pela porcentagem paga (mesmas faixas de mascara_status)."""
+    decimos = decimos_porcentagem(porcentagem)
+    if decimos == 0:
+        return STATUS_NAO_INICIADO
+    if decimos == 1000:
+        return STATUS_COMPLETO
+    if 0 < decimos < 1000:
+        return STATUS_EM_ANDAMENTO
+    return STATUS_OUTRO
+
+
+def _contribuicao(gasto: dict) -> tuple:
+    """(categoria, valor_total, valor_pago, status) de um gasto, em centavos."""
+    pago = valor_pago(
+        gasto["entrada"], gasto["parcelas_pagas"], gasto["valor_parcela"], gasto["num_parcelas"], gasto["valor_total"]
+    )
+    categoria = gasto["categoria"]
+    return (
+        "" if pd.isna(categoria) else categoria,
+        int(gasto["valor_total"]),
+        int(pago),
+        status_gasto(gasto["porcentagem_paga"]),
+    )
+
+
+class Agregados:
+    """Totais gerais, somas por categoria e contagem de gastos por status."""
+
+    def __init__(self):
+        self.total_planejado = 0  # centavos
+        self.total_pago = 0
+        self.categorias = {}  # categoria -> [valor_total, valor_pago, quantidade]
+        self.status = {s: 0 for s in (STATUS_NAO_INICIADO, STATUS_COMPLETO, STATUS_EM_ANDAMENTO, STATUS_OUTRO)}
+        self.identidade = None  # identidade do storage quando os agregados foram gravados
+
+    @classmethod
+    def calcular(cls, df: pd.DataFrame) -> "Agregados":
+        """Recálculo completo a partir da tabela de gastos."""
+        ag = cls()
+        if df.empty:
+            return ag
+        pago = valor_pago(df["entrada"], df["parcelas_pagas"], df["valor_parcela"], df["num_parcelas"], df["valor_total"])
+        ag.total_planejado = int(df["valor_total"].sum())
+        ag.total_pago = int(pago.sum())
+        por_categoria = (
+            df.assign(valor_pago=pago)
+            .groupby("categoria", observed=True)
+            .agg(valor_total=("valor_total", "sum"), valor_pago=("valor_pago", "sum"), quantidade=("id", "size"))
+        )
+        ag.categorias = {
+            cat: [int(linha.valor_total), int(linha.valor_pago), int(linha.quantidade)]
+            for cat, linha in por_categoria.iterrows()
+        }
+        for status, quantidade in df["porcentagem_paga"].map(status_gasto).value_counts().items():
+            ag.status[status] = int(quantidade)
+        return ag
+
+    def aplicar(self, anterior: dict = None, novo: dict = None) -> None:
+        """Ajusta os agregados para a troca de um gasto (None = não existia / removido)."""
+        for gasto, sinal in ((anterior, -1), (novo, 1)):
+            if gasto is None:
+                continue
+            categoria, valor_total, valor_pago, status = _contribuicao(gasto)
+            self.total_planejado += sinal * valor_total
+            self.total_pago += sinal * valor_pago
+            soma = self.categorias.setdefault(categoria, [0, 0, 0])
+            soma[0] += sinal * valor_total
+            soma[1] += sinal * valor_pago
+            soma[2] += sinal
+            if soma[2] == 0:
+                del self.categorias[categoria]
+            self.status[status] += sinal
+
+    def incorporar(self, df: pd.DataFrame) -> None:
+        """Soma os gastos de uma tabela que ainda não estavam nos agregados (ex.: importação)."""
+        novo = Agregados.calcular(df)
+        self.total_planejado += novo.total_planejado
+        self.total_pago += novo.total_pago
+        for categoria, (valor_total, valor_pago, quantidade) in novo.categorias.items():
+            soma = self.categorias.setdefault(categoria, [0, 0, 0])
+            soma[0] += valor_total
+            soma[1] += valor_pago
+            soma[2] += quantidade
+        for status, quantidade in novo.status.items():
+            self.status[status] += quantidade
+
+    def resumos(self) -> dict:
+        """Mesmo formato de calcular_resumos() (em reais)."""
+        total_faltante = self.total_planejado - self.total_pago
+        progresso_geral = (self.total_pago / self.total_planejado * 100) if self.total_planejado > 0 else 0
+        return {
+            "total_planejado": para_reais(self.total_planejado),
+            "total_pago": para_reais(self.total_pago),
+            "total_faltante": para_reais(total_faltante),
+            "progresso_geral": float(progresso_geral),
+        }
+
+    def por_categoria(self) -> pd.DataFrame:
+        """Somas por categoria (centavos): categoria, valor_total, valor_pago, valor_restante."""
+        df = pd.DataFrame(
+            [(cat, total, pago) for cat, (total, pago, _) in self.categorias.items()],
+            columns=["categoria", "valor_total", "valor_pago"],
+        )
+        df["valor_restante"] = df["valor_total"] - df["valor_pago"]
+        return df.sort_values("categoria", ignore_index=True)
+
+    def divergencias(self, outro: "Agregados") -> list:
+        """Lista as diferenças em relação a outros agregados (ex.: um recálculo)."""
+        erros = []
+        for nome in ("total_planejado", "total_pago"):
+            if getattr(self, nome) != getattr(outro, nome):
+                erros.append(f"{nome}: {getattr(self, nome)} != {getattr(outro, nome)} (centavos)")
+        for cat in self.categorias.keys() | outro.categorias.keys():
+            a = self.categorias.get(cat, [0, 0, 0])
+            b = outro.categorias.get(cat, [0, 0, 0])
+            if a != b:
+                erros.append(f"categoria {cat!r}: {a} != {b}")
+        for status, quantidade in self.status.items():
+            if quantidade != outro.status.get(status, 0):
+                erros.append(f"status {status}: {quantidade} != {outro.status.get(status, 0)}")
+        return erros
+
+    def verificar(self, df: pd.DataFrame) -> list:
+        """Confere os agregados contra um recálculo completo da tabela."""
+        return self.divergencias(Agregados.calcular(df))
+
+    # Persistência (JSON ao lado do arquivo de dados)
+    @staticmethod
+    def caminho(data_path: Path) -> Path:
+        return caminho_lateral(data_path, ".agregados.json")
+
+    def salvar(self, path: Path) -> None:
+        """Grava de forma atômica (arquivo temporário + rename)."""
+        conteudo = {
+            "unidade": UNIDADE,
+            "total_planejado": self.total_planejado,
+            "total_pago": self.total_pago,
+            "categorias": self.categorias,
+            "status": self.status,
+            "identidade": self.identidade,
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(conteudo, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def carregar(cls, path: Path):
+        """Lê os agregados gravados, ou None se não existirem ou estiverem corrompidos."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                conteudo = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if conteudo.get("unidade") != UNIDADE:
+            # Gravado em reais (float), antes dos centavos
+            return None
+        ag = cls()
+        ag.total_planejado = conteudo["total_planejado"]
+        ag.total_pago = conteudo["total_pago"]
+        ag.categorias = conteudo["categorias"]
+        ag.status.update(conteudo["status"])
+        ag.identidade = conteudo["identidade"]
+        return ag
+
+
+def identidade_json(identidade) -> list:
+    """Identidade do storage no formato em que fica gravada no JSON (tuplas viram listas)."""
+    return json.loads(json.dumps(identidade))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confere os agregados gravados contra um recálculo completo.")
+    parser.add_argument("dados", type=Path, help="arquivo de dados (CSV, SQLite, Parquet ou Arrow)")
+    args = parser.parse_args()
+    armazenado = Agregados.carregar(Agregados.caminho(args.dados))
+    if armazenado is None:
+        print("Nenhum agregado gravado.")
+    else:
+        erros = armazenado.verificar(abrir_storage(args.dados).ler())
+        print("\n".join(erros) if erros else "Agregados conferem com o recálculo completo.")
@@ -1,27 +1,99 @@
 import streamlit as st
 import pandas as pd
+import html
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
-from datetime import date
+from datetime import date, timedelta
 
-# Caminho do arquivo de dados
+from agregados import Agregados, identidade_json
+from cronograma import fluxo_mensal, parcelas_atrasadas, proximas_parcelas
+from graficos import agrupar_cauda, grafico_evolucao, grafico_fluxo, grafico_progresso, grafico_totais
+from historico import Historico
+from importacao import importar, ler_blocos
+from indices import IndiceBusca, IndiceFiltros
+from livro import Livro
+from metricas import Medidor
+from nucleo import (
+    derivar_gastos,
+    dividir_parcelas,
+    formatar_moeda,
+    reconciliar_edicao,
+    validar_gastos,
+)
+from planos import CachePlanos, nome_valido
+from relatorios import FORMATOS, RELATORIOS, Exportacao
+from storage import (
+    COLUMNS,
+    COLUNAS_CATEGORICAS,
+    COLUNAS_MONETARIAS,
+    STATUS_COMPLETO,
+    STATUS_EM_ANDAMENTO,
+    STATUS_NAO_INICIADO,
+    STATUS_OUTRO,
+    em_reais,
+    gastos_pendentes,
+    para_centavos,
+    para_reais,
+    valor_pago,
+)
+
+# Copy-on-write: as sessões recebem cópias rasas do DataFrame em cache
+# e só pagam a cópia das colunas que de fato alterarem
+pd.set_option("mode.copy_on_write", True)
+
+# Caminho do arquivo de dados; o formato é detectado pelo conteúdo/extensão
+# (.csv e .parquet/.arrow usam snapshot + journal; .db usa SQLite).
+# É o plano padrão; com ?plano=<nome> na URL a sessão usa data/planos/<nome>.*
 DATA_PATH = Path("data/gastos.csv")
-DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-# Colunas base do CSV
-COLUMNS = [
-    "id",
-    "categoria",
-    "fornecedor",
-    "descricao",
-    "valor_total",
-    "entrada",
-    "num_parcelas",
-    "valor_parcela",
-    "parcelas_pagas",
-    "porcentagem_paga",
-    "data_primeira_parcela",
-    "observacoes",
-]
+
+# Opções do filtro de status da aba "Nossos Gastos"
+STATUS_FILTROS = {
+    "Todos": None,
+    "Completos (100%)": STATUS_COMPLETO,
+    "Em andamento": STATUS_EM_ANDAMENTO,
+    "Não iniciados (0%)": STATUS_NAO_INICIADO,
+}
+
+# Rótulos dos status na aba "Gráficos"
+STATUS_ROTULOS = {
+    STATUS_NAO_INICIADO: "Não Iniciado",
+    STATUS_COMPLETO: "Completo",
+    STATUS_EM_ANDAMENTO: "Em Andamento",
+    STATUS_OUTRO: "Outro",
+}
+
+# Abas da visualização principal e o nome da fase medida de cada uma
+ABAS = {
+    "🎀 Nossos Gastos": "aba_gastos",
+    "📊 Edição Avançada": "aba_edicao",
+    "📈 Gráficos": "aba_graficos",
+}
+
+# Opções de quantidade de cards por página na aba "Nossos Gastos"
+TAMANHOS_PAGINA = [10, 25, 50, 100]
+
+# Com ?perf=1 na URL, o tempo de cada fase do rerun é medido, mostrado na
+# barra lateral e acrescentado a este arquivo (JSON lines)
+DESEMPENHO_PATH = Path("data/desempenho.jsonl")
+
+# Escrita atrasada: as gravações são confirmadas em memória e vão para o
+# disco juntas até este intervalo depois (segundos). Uma queda do processo
+# perde no máximo esse intervalo; a saída normal grava tudo. None grava
+# cada escrita na hora, na thread da sessão
+ESCRITA_INTERVALO_S = 1.0
+
+# Períodos do gráfico de evolução (dias; None = todo o histórico)
+PERIODOS_EVOLUCAO = {"3 meses": 90, "1 ano": 365, "Tudo": None}
+
+# Exportação de relatórios: threads do pool e onde os arquivos gerados ficam
+EXPORTACAO_TRABALHADORES = 2
+EXPORTACOES_DIR = Path(tempfile.gettempdir()) / "casamento-exportacoes"
+
+# Índices da aba "Nossos Gastos" no cache do plano (campo -> classe)
+INDICES = {"indices": IndiceFiltros, "busca": IndiceBusca}
 
 # Configuração de estilo para casamento
 def apply_wedding_styles():
@@ -273,163 +345,551 @@ def apply_wedding_styles():
         </style>
     """, unsafe_allow_html=True)
 
+@st.cache_resource
+def _cache_planos() -> CachePlanos:
+    """Cache em memória dos planos, compartilhado entre sessões e reruns do processo."""
+    return CachePlanos(padrao=DATA_PATH, intervalo_escrita=ESCRITA_INTERVALO_S, ao_descarregar=_apos_descarregar)
+
+@st.cache_resource
+def _pool_exportacao() -> ThreadPoolExecutor:
+    """Threads que geram os relatórios exportados, compartilhadas entre sessões."""
+    return ThreadPoolExecutor(max_workers=EXPORTACAO_TRABALHADORES, thread_name_prefix="exportacao")
+
+def plano_atual():
+    """Plano escolhido pela sessão (?plano=<nome> na URL), ou None para o padrão."""
+    return st.query_params.get("plano") or None
+
+def medidor_sessao() -> Medidor:
+    """Medidor de fases da sessão, ligado/desligado pelo parâmetro ?perf=1."""
+    medidor = st.session_state.get("medidor_desempenho")
+    if medidor is None:
+        medidor = Medidor(sessao=uuid.uuid4().hex[:8], exportar_para=DESEMPENHO_PATH)
+        st.session_state["medidor_desempenho"] = medidor
+    medidor.ativo = st.query_params.get("perf") == "1"
+    return medidor
+
+def medir(nome: str):
+    """Span de uma fase do rerun atual (contexto vazio se a medição estiver desligada)."""
+    medidor = st.session_state.get("medidor_desempenho")
+    return medidor.medir(nome) if medidor is not None else Medidor.NULO
+
+def _data_cache() -> dict:
+    """Entrada do cache de planos para o plano da sessão atual."""
+    return _cache_planos().obter(plano_atual())
+
 def load_data() -> pd.DataFrame:
-    """Carrega o CSV de gastos, criando se não existir."""
-    if not DATA_PATH.exists():
-        df = pd.DataFrame(columns=COLUMNS)
-        df.to_csv(DATA_PATH, index=False)
-        return df
+    """Carrega os gastos do storage configurado, criando se não existir.
+
+    O DataFrame tipado fica em cache, identificado pela versão de dados e
+    pela identidade do storage (mtime/tamanho dos arquivos). Reruns sem
+    mudança não tocam o disco; cada chamada recebe uma cópia copy-on-write.
+    """
+    cache = _data_cache()
+    with cache["lock"]:
+        chave = (cache["versao"], cache["storage"].identidade())
+        if cache["df"] is not None and cache["chave"] == chave:
+            cache["hits"] += 1
+            _cache_planos().contar(True)
+            return cache["df"].copy(deep=False)
+
+        df = cache["storage"].ler()
+        cache.update(chave=chave, df=df)
+        cache["misses"] += 1
+        _cache_planos().contar(False)
+        _cache_planos().registrar_tamanho(cache)
+        return df.copy(deep=False)
+
+def load_visao(nome: str, calcular, dia: date = None):
+    """Resultado de calcular() (os dados de uma aba), memoizado na versão dos dados.
 
-    df = pd.read_csv(DATA_PATH)
+    Calculado só quando a aba é aberta; as sessões que abrem a mesma aba
+    sobre a mesma versão reaproveitam o resultado. Visões que dependem da
+    data de hoje passam o dia e são recalculadas também quando ele muda.
+    """
+    load_data()  # garante que o cache está atualizado
+    cache = _data_cache()
+    memo = nome if dia is None else (nome, dia)
+    with cache["lock"]:
+        chave = cache["chave"]
+        guardado = cache["visoes"].get(memo)
+    if guardado is not None and guardado[0] == chave:
+        return guardado[1]
+    resultado = calcular()
+    with cache["lock"]:
+        if dia is not None:
+            # A visão de outro dia não volta a valer
+            for antiga in [k for k in cache["visoes"] if isinstance(k, tuple) and k[0] == nome]:
+                del cache["visoes"][antiga]
+        # Se houve escrita durante o cálculo, a chave antiga nunca mais confere
+        cache["visoes"][memo] = (chave, resultado)
+        _cache_planos().registrar_tamanho(cache)
+    return resultado
 
-    # Garante que todas as colunas existam
-    for col in COLUMNS:
-        if col not in df.columns:
-            df[col] = None
+def _carregar_agregados(cache: dict) -> Agregados:
+    """Agregados em dia com o storage; recalcula se foram gravados para outro estado.
 
-    # Tipagem básica
-    df["valor_total"] = pd.to_numeric(df["valor_total"], errors="coerce").fillna(0.0)
-    df["entrada"] = pd.to_numeric(df["entrada"], errors="coerce").fillna(0.0)
-    df["num_parcelas"] = pd.to_numeric(df["num_parcelas"], errors="coerce").fillna(1).astype(int)
-    df["valor_parcela"] = pd.to_numeric(df["valor_parcela"], errors="coerce").fillna(0.0)
-    df["parcelas_pagas"] = pd.to_numeric(df["parcelas_pagas"], errors="coerce").fillna(0).astype(int)
-    df["porcentagem_paga"] = pd.to_numeric(df["porcentagem_paga"], errors="coerce").fillna(0.0)
+    Deve ser chamada com o lock do cache.
+    """
+    identidade = identidade_json(cache["storage"].identidade())
+    agregados = cache["agregados"] or Agregados.carregar(Agregados.caminho(cache["path"]))
+    if agregados is None or agregados.identidade != identidade:
+        agregados = Agregados.calcular(cache["storage"].ler())
+        agregados.identidade = identidade
+        agregados.salvar(Agregados.caminho(cache["path"]))
+    cache["agregados"] = agregados
+    return agregados
 
-    return df[COLUMNS]
+def _carregar_livro(cache: dict) -> Livro:
+    """Livro de pagamentos do plano; na primeira vez, aberto com um snapshot da tabela atual.
+
+    Deve ser chamada com o lock do cache, antes da escrita a registrar.
+    """
+    if cache["livro"] is None:
+        cache["livro"] = Livro(cache["path"], tabela=lambda: cache["storage"].ler())
+    cache["livro"].iniciar()
+    return cache["livro"]
+
+def devido_em(dia: date):
+    """Total devido (reais) no fim do dia, pelo livro de pagamentos; None se o livro começa depois."""
+    cache = _data_cache()
+    with cache["lock"]:
+        if cache["livro"] is None:
+            cache["livro"] = Livro(cache["path"], tabela=lambda: cache["storage"].ler())
+        devido = cache["livro"].devido_em(dia)
+    return None if devido is None else para_reais(devido)
+
+def _carregar_historico(cache: dict, preencher: bool = False) -> Historico:
+    """Histórico diário do plano; com preencher, os dias anteriores ao primeiro registro são reconstruídos.
+
+    Deve ser chamada com o lock do cache.
+    """
+    if cache["historico"] is None:
+        cache["historico"] = Historico(cache["path"])
+    historico = cache["historico"]
+    if preencher and not historico.preenchido:
+        livro = cache["livro"] or Livro(cache["path"])
+        historico.preencher(cache["storage"].ler(), livro if livro.iniciado() else None)
+    return historico
+
+def _registrar_historico(cache: dict, agregados: Agregados) -> None:
+    """Grava no histórico os totais de hoje (só se mudaram). Deve ser chamada com o lock do cache."""
+    _carregar_historico(cache).registrar(date.today(), agregados)
+
+def _escrever(operacao, ajustar_agregados=None, ajustar_indices=None, registrar=None):
+    """Executa uma escrita no storage, ajusta os agregados e invalida o cache.
+
+    Os índices dos filtros e da busca, se estavam em dia, são ajustados
+    por ajustar_indices (chamada com cada um); sem ela, são descartados e
+    remontados na próxima consulta. registrar(livro) acrescenta ao livro de pagamentos os eventos
+    da escrita. Se a operação retornar conflitos (lista não vazia), nada foi
+    gravado e eles são repassados ao chamador.
+    """
+    cache = _data_cache()
+    with medir("salvar"), cache["lock"]:
+        agregados = _carregar_agregados(cache)
+        livro = _carregar_livro(cache) if registrar is not None else None
+        chave = (cache["versao"], cache["storage"].identidade())
+        em_dia = [nome for nome in INDICES if cache[nome] is not None and cache[nome + "_chave"] == chave]
+        descartadas = len(cache["descartadas"])
+        conflitos = operacao(cache["storage"])
+        if conflitos:
+            return conflitos
+        if len(cache["descartadas"]) != descartadas:
+            # A operação descarregou as pendentes e houve conflito com o disco:
+            # _apos_descarregar já refez tudo a partir do que foi gravado
+            return []
+        if livro is not None:
+            registrar(livro)
+        if ajustar_agregados is not None:
+            agregados = ajustar_agregados(agregados)
+        agregados.identidade = identidade_json(cache["storage"].identidade())
+        if not getattr(cache["storage"], "pendentes", 0):
+            # Com escrita atrasada, vão para o disco junto com os dados (_apos_descarregar)
+            agregados.salvar(Agregados.caminho(cache["path"]))
+            if livro is not None:
+                livro.sincronizar()
+            _registrar_historico(cache, agregados)
+        cache["agregados"] = agregados
+        cache["versao"] += 1
+        cache["chave"] = None
+        for nome in INDICES:
+            if nome in em_dia and ajustar_indices is not None:
+                ajustar_indices(cache[nome])
+                cache[nome + "_chave"] = (cache["versao"], cache["storage"].identidade())
+            else:
+                cache.update({nome: None, nome + "_chave": None})
+        return []
+
+def _apos_descarregar(cache: dict, antes, depois, conflitos: list) -> None:
+    """Escritas pendentes gravadas em disco: o conteúdo não mudou, só a identidade do storage.
+
+    Chamada pela EscritaAtrasada com o lock do plano. O que estava em dia
+    com a identidade anterior (df, índices, visões e agregados)
+    passa à nova, sem recarregar; os agregados, os totais do dia no
+    histórico e os eventos do livro de pagamentos são gravados agora.
+    Com conflitos, ver _descartar_escritas.
+    """
+    if conflitos:
+        _descartar_escritas(cache, conflitos)
+        return
+    anterior, atual = (cache["versao"], antes), (cache["versao"], depois)
+    for campo in ("chave", "indices_chave", "busca_chave"):
+        if cache[campo] == anterior:
+            cache[campo] = atual
+    for memo in (cache["visoes"], cache["exportacoes"]):
+        for nome, (chave, dados) in list(memo.items()):
+            if chave == anterior:
+                memo[nome] = (atual, dados)
+    agregados = cache["agregados"]
+    if agregados is not None and agregados.identidade == identidade_json(antes):
+        agregados.identidade = identidade_json(depois)
+        agregados.salvar(Agregados.caminho(cache["path"]))
+        _registrar_historico(cache, agregados)
+    if cache["livro"] is not None:
+        cache["livro"].sincronizar()
+
+def _descartar_escritas(cache: dict, conflitos: list) -> None:
+    """Escritas já confirmadas às sessões não chegaram ao disco (gravaram as mesmas linhas por fora).
+
+    Tudo o que foi ajustado com elas (tabela, agregados, índices e visões)
+    é descartado e refeito a partir do storage na próxima leitura, o livro
+    de pagamentos é ressincronizado com a tabela gravada e o relatório fica
+    no plano, para as sessões mostrarem (render_descartadas).
+    """
+    cache["versao"] += 1
+    cache.update(
+        chave=None, df=None, agregados=None,
+        indices=None, indices_chave=None, busca=None, busca_chave=None,
+    )
+    cache["visoes"].clear()
+    if cache["livro"] is not None and cache["livro"].iniciado():
+        cache["livro"].substituir()
+        cache["livro"].sincronizar()
+    cache["descartadas"].extend(conflitos)
 
 def save_data(df: pd.DataFrame) -> None:
-    """Salva o DataFrame de volta no CSV."""
-    df.to_csv(DATA_PATH, index=False)
+    """Salva o DataFrame inteiro de volta no storage (sem conferir versões)."""
+    _escrever(
+        lambda storage: storage.salvar(df[COLUMNS]),
+        lambda agregados: Agregados.calcular(df),
+        registrar=lambda livro: livro.substituir(),
+    )
 
-def calcular_resumos(df: pd.DataFrame) -> dict:
-    """Calcula totais: planejado, pago e faltante."""
-    if df.empty:
+def upsert_gastos(gastos: list, anteriores: list = None) -> list:
+    """Insere ou atualiza gastos (por id) sem reescrever o arquivo inteiro.
+
+    anteriores traz o estado de cada gasto antes da edição (None para os
+    novos). Sua coluna versao é a versão esperada no storage: se outra
+    sessão gravou a linha nesse meio tempo, nada é salvo e o relatório de
+    conflitos é retornado. Sem conflito, os agregados são ajustados a
+    partir de anteriores, sem recalcular a tabela, os pagamentos vão para o
+    livro (com o id e a versão que o storage deu a cada linha) e retorna [].
+    """
+    anteriores = anteriores or [None] * len(gastos)
+    esperadas = [None if anterior is None else anterior["versao"] for anterior in anteriores]
+    gravadas = []  # as linhas como o storage as gravou
+
+    def gravar(storage):
+        linhas, conflitos = storage.upsert(gastos, esperadas)
+        gravadas.extend(linhas)
+        return conflitos
+
+    def ajustar(agregados):
+        for anterior, novo in zip(anteriores, gravadas):
+            agregados.aplicar(anterior, novo)
+        return agregados
+
+    def ajustar_indices(indices):
+        for anterior, novo in zip(anteriores, gravadas):
+            indices.aplicar(anterior, novo)
+
+    return _escrever(
+        gravar,
+        ajustar,
+        ajustar_indices,
+        lambda livro: livro.registrar(zip(anteriores, gravadas)),
+    )
+
+def importar_planilha(arquivo, nome: str):
+    """Importa uma planilha CSV/XLSX em blocos, com uma escrita por bloco.
+
+    Os blocos vão para o journal dentro de um lote do storage, compactado
+    uma única vez no fim. Retorna (quantidade importada, relatório de erros por linha).
+    """
+    def gravar(gastos: pd.DataFrame) -> list:
+        gravadas = []  # as linhas com o id que o storage deu a cada uma
+
+        def escrever(storage):
+            linhas, conflitos = storage.upsert(gastos.to_dict("records"))
+            gravadas.extend(linhas)
+            return conflitos
+
+        def ajustar(agregados):
+            agregados.incorporar(gastos)
+            return agregados
+
+        _escrever(
+            escrever,
+            ajustar,
+            lambda indices: indices.incorporar(gastos.assign(id=[linha["id"] for linha in gravadas])),
+            lambda livro: livro.registrar((None, gasto) for gasto in gravadas),
+        )
+        return gravadas
+
+    cache = _data_cache()
+    with ExitStack() as pilha:
+        with cache["lock"]:
+            pilha.enter_context(cache["storage"].lote())
+        try:
+            return importar(ler_blocos(arquivo, nome), gravar, proximo_id())
+        finally:
+            with cache["lock"]:
+                # Compacta pelo caminho das escritas, mantendo o cache em dia;
+                # ao fechar, o lote não tem mais o que compactar
+                compact_data()
+                pilha.close()
+
+def proximo_id() -> int:
+    """Id para um gasto novo (o storage troca por outro se já estiver em uso)."""
+    df = load_data()
+    return 1 if df.empty else int(df["id"].max()) + 1
+
+def compact_data() -> None:
+    """Incorpora o journal ao snapshot (no CSV) ou otimiza o banco (no SQLite)."""
+    # As linhas não mudam de lugar: os índices continuam valendo
+    _escrever(lambda storage: storage.compactar(), ajustar_indices=lambda indices: None)
+
+def load_agregados() -> Agregados:
+    """Totais, somas por categoria e contagem por status, sem varrer a tabela."""
+    cache = _data_cache()
+    with cache["lock"]:
+        return _carregar_agregados(cache)
+
+def verificar_agregados() -> list:
+    """Confere os agregados contra um recálculo completo; corrige se divergirem."""
+    cache = _data_cache()
+    with cache["lock"]:
+        agregados = _carregar_agregados(cache)
+        recalculo = Agregados.calcular(cache["storage"].ler())
+        erros = agregados.divergencias(recalculo)
+        if erros:
+            recalculo.identidade = agregados.identidade
+            recalculo.salvar(Agregados.caminho(cache["path"]))
+            cache["agregados"] = recalculo
+        return erros
+
+def _carregar_indices(cache: dict, nome: str = "indices") -> tuple:
+    """(df em cache, índice `nome` em dia com ele); remonta o índice se for de outra versão.
+
+    Deve ser chamada com o lock do cache, depois de load_data().
+    """
+    if cache["df"] is None:
+        # Plano descartado do cache entre as duas chamadas
+        cache.update(chave=None, df=cache["storage"].ler())
+    if cache[nome] is None or cache[nome + "_chave"] != cache["chave"]:
+        cache[nome] = INDICES[nome].construir(cache["df"])
+        cache[nome + "_chave"] = cache["chave"]
+        _cache_planos().registrar_tamanho(cache)
+    return cache["df"], cache[nome]
+
+def consultar_gastos(categoria: str = None, status: str = None, busca: str = "") -> pd.DataFrame:
+    """Gastos filtrados por categoria e/ou status, pelos índices em memória.
+
+    Com busca (texto livre), só os gastos que contêm todas as palavras em
+    fornecedor, descrição ou observações, dos mais relevantes para os menos.
+    """
+    load_data()  # garante que o cache está atualizado
+    cache = _data_cache()
+    with cache["lock"]:
+        df, indices = _carregar_indices(cache)
+        posicoes = indices.filtrar(categoria, status)
+        if not indices.confere(df["id"].to_numpy(), posicoes):
+            # Ajuste incremental fora de sincronia com a tabela relida
+            # (ex.: o storage trocou o id de uma inserção): remonta
+            cache["indices"] = None
+            df, indices = _carregar_indices(cache)
+            posicoes = indices.filtrar(categoria, status)
+        if busca.strip():
+            df, indice = _carregar_indices(cache, "busca")
+            encontradas = indice.buscar(busca, posicoes)
+            if not indice.confere(df["id"].to_numpy(), encontradas):
+                # Como nos filtros: cada posição encontrada precisa ser do gasto indexado
+                cache["busca"] = None
+                df, indice = _carregar_indices(cache, "busca")
+                encontradas = indice.buscar(busca, posicoes)
+            posicoes = encontradas
+    if posicoes is None:
+        return df.copy(deep=False)
+    return df.iloc[posicoes]
+
+def listar_categorias() -> list:
+    load_data()
+    cache = _data_cache()
+    with cache["lock"]:
+        return _carregar_indices(cache)[1].nomes_categorias()
+
+def proximos_vencimentos() -> pd.DataFrame:
+    """Gastos com saldo a pagar, ordenados pela data da primeira parcela.
+
+    Calculados sobre o DataFrame em cache, sem consultar o storage (que no
+    CSV/Arrow releria o snapshot e o journal).
+    """
+    return gastos_pendentes(load_data())
+
+def cache_stats() -> dict:
+    """Retorna contadores de acerto/falta do cache de load_data().
+
+    Os do plano da sessão e, em "planos", os do cache de planos como um todo
+    (memória ocupada, taxa de acerto e quantos planos foram descartados).
+    """
+    cache = _data_cache()
+    with cache["lock"]:
+        total = cache["hits"] + cache["misses"]
         return {
-            "total_planejado": 0.0,
-            "total_pago": 0.0,
-            "total_faltante": 0.0,
-            "progresso_geral": 0.0,
+            "versao": cache["versao"],
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "hit_rate": (cache["hits"] / total) if total else 0.0,
+            "planos": _cache_planos().estatisticas(),
         }
 
-    # Calcula valor pago considerando entrada + parcelas pagas
-    valor_pago_por_linha = df["entrada"] + (df["parcelas_pagas"] * df["valor_parcela"])
-    total_planejado = df["valor_total"].sum()
-    total_pago = valor_pago_por_linha.sum()
-    total_faltante = total_planejado - total_pago
-    progresso_geral = (total_pago / total_planejado * 100) if total_planejado > 0 else 0
+def _moeda_serie(centavos: pd.Series) -> pd.Series:
+    """Versão vetorizada de formatar_moeda, a partir de centavos."""
+    return "R$ " + (
+        para_reais(centavos).map("{:,.2f}".format)
+        .str.replace(",", "X")
+        .str.replace(".", ",")
+        .str.replace("X", ".")
+    )
 
-    return {
-        "total_planejado": float(total_planejado),
-        "total_pago": float(total_pago),
-        "total_faltante": float(total_faltante),
-        "progresso_geral": float(progresso_geral),
-    }
+def montar_cards_html(df: pd.DataFrame) -> str:
+    """Monta o HTML dos cards de todos os gastos de uma vez, coluna a coluna."""
+    if df.empty:
+        return ""
+    if "progresso" not in df.columns:
+        df = derivar_gastos(df)
 
-def formatar_moeda(valor: float) -> str:
-    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    valor_pago = df["valor_pago"]
+    valor_restante = df["valor_restante"]
+    porcentagem_txt = df["progresso"].map("{:.1f}".format)
 
-def sincronizar_parcelas_porcentagem(df: pd.DataFrame) -> pd.DataFrame:
-    """Sincroniza parcelas_pagas e porcentagem_paga"""
-    df_sinc = df.copy()
-    
-    # Se porcentagem foi alterada, atualiza parcelas_pagas
-    mask_porc = df_sinc['porcentagem_paga'].notna()
-    df_sinc.loc[mask_porc, 'parcelas_pagas'] = (
-        (df_sinc.loc[mask_porc, 'valor_total'] - df_sinc.loc[mask_porc, 'entrada']) * 
-        df_sinc.loc[mask_porc, 'porcentagem_paga'] / 100 / 
-        df_sinc.loc[mask_porc, 'valor_parcela']
-    ).round().astype(int)
-    
-    # Se parcelas foram alteradas, atualiza porcentagem
-    mask_parc = df_sinc['parcelas_pagas'].notna()
-    df_sinc.loc[mask_parc, 'porcentagem_paga'] = (
-        (df_sinc.loc[mask_parc, 'entrada'] + 
-         (df_sinc.loc[mask_parc, 'parcelas_pagas'] * df_sinc.loc[mask_parc, 'valor_parcela'])) / 
-        df_sinc.loc[mask_parc, 'valor_total'] * 100
-    ).round(1)
-    
-    return df_sinc
+    def texto(col):
+        return df[col].astype(str).map(html.escape)
+
+    # Informações de parcelas
+    info_parcelas = df["parcelas_pagas"].astype(str) + "/" + df["num_parcelas"].astype(str) + " parcelas"
+
+    entrada_html = (
+        '<div style="font-size: 0.9rem; color: #666; margin-top: 0.5rem;">Entrada: '
+        + _moeda_serie(df["entrada"]) + '</div>'
+    ).where(df["entrada"] > 0, "")
+
+    cards = (
+        '<div class="gasto-card">'
+        '<div class="gasto-header">'
+        '<div style="flex: 1;">'
+        '<div class="gasto-title">' + texto("categoria") + '</div>'
+        '<div class="gasto-subtitle">' + texto("fornecedor") + '</div>'
+        '<div class="gasto-subtitle" style="font-size: 0.9rem; margin-top: 0.2rem;">' + texto("descricao") + '</div>'
+        '</div>'
+        '<div style="text-align: right;">'
+        '<div style="font-weight: 600; color: #333; font-size: 1.2rem;">' + _moeda_serie(df["valor_total"]) + '</div>'
+        '<div style="font-size: 0.9rem; color: #666;">' + info_parcelas + '</div>'
+        '<div style="font-size: 0.9rem; color: #666;">Parcela: ' + _moeda_serie(df["valor_parcela"]) + '</div>'
+        '</div>'
+        '</div>'
+        '<div class="gasto-progress">'
+        '<div style="display: flex; justify-content: space-between; margin-bottom: 0.3rem;">'
+        '<span style="font-size: 1rem;">Progresso</span>'
+        '<span style="font-weight: 600; color: var(--rosa-escuro); font-size: 1rem;">' + porcentagem_txt + '%</span>'
+        '</div>'
+        '<div style="background: #e0e0e0; border-radius: 10px; height: 8px; overflow: hidden;">'
+        '<div style="background: linear-gradient(90deg, var(--rosa-medio), var(--dourado)); width: ' + porcentagem_txt + '%; height: 100%; border-radius: 10px;"></div>'
+        '</div>'
+        '</div>'
+        '<div class="gasto-values">'
+        '<div class="valor-pago">Pago: ' + _moeda_serie(valor_pago) + '</div>'
+        '<div class="valor-restante">Restante: ' + _moeda_serie(valor_restante) + '</div>'
+        '</div>'
+        + entrada_html +
+        '</div>'
+    )
+    return "".join(cards)
 
 def render_gasto_card(gasto):
     """Renderiza um card individual para cada gasto"""
-    valor_pago = gasto['entrada'] + (gasto['parcelas_pagas'] * gasto['valor_parcela'])
-    valor_restante = gasto['valor_total'] - valor_pago
-    porcentagem_paga = (valor_pago / gasto['valor_total'] * 100) if gasto['valor_total'] > 0 else 0
-    
-    # Informações de parcelas
-    info_parcelas = f"{gasto['parcelas_pagas']}/{gasto['num_parcelas']} parcelas"
-    
-    # Vamos construir o HTML em partes para evitar problemas de quebra
-    card_parts = []
-    card_parts.append(f'<div class="gasto-card">')
-    card_parts.append(f'<div class="gasto-header">')
-    card_parts.append(f'<div style="flex: 1;">')
-    card_parts.append(f'<div class="gasto-title">{gasto["categoria"]}</div>')
-    card_parts.append(f'<div class="gasto-subtitle">{gasto["fornecedor"]}</div>')
-    card_parts.append(f'<div class="gasto-subtitle" style="font-size: 0.9rem; margin-top: 0.2rem;">{gasto["descricao"]}</div>')
-    card_parts.append(f'</div>')
-    card_parts.append(f'<div style="text-align: right;">')
-    card_parts.append(f'<div style="font-weight: 600; color: #333; font-size: 1.2rem;">{formatar_moeda(gasto["valor_total"])}</div>')
-    card_parts.append(f'<div style="font-size: 0.9rem; color: #666;">{info_parcelas}</div>')
-    card_parts.append(f'<div style="font-size: 0.9rem; color: #666;">Parcela: {formatar_moeda(gasto["valor_parcela"])}</div>')
-    card_parts.append(f'</div>')
-    card_parts.append(f'</div>')
-    
-    card_parts.append(f'<div class="gasto-progress">')
-    card_parts.append(f'<div style="display: flex; justify-content: space-between; margin-bottom: 0.3rem;">')
-    card_parts.append(f'<span style="font-size: 1rem;">Progresso</span>')
-    card_parts.append(f'<span style="font-weight: 600; color: var(--rosa-escuro); font-size: 1rem;">{porcentagem_paga:.1f}%</span>')
-    card_parts.append(f'</div>')
-    card_parts.append(f'<div style="background: #e0e0e0; border-radius: 10px; height: 8px; overflow: hidden;">')
-    card_parts.append(f'<div style="background: linear-gradient(90deg, var(--rosa-medio), var(--dourado)); width: {porcentagem_paga}%; height: 100%; border-radius: 10px;"></div>')
-    card_parts.append(f'</div>')
-    card_parts.append(f'</div>')
-    
-    card_parts.append(f'<div class="gasto-values">')
-    card_parts.append(f'<div class="valor-pago">Pago: {formatar_moeda(valor_pago)}</div>')
-    card_parts.append(f'<div class="valor-restante">Restante: {formatar_moeda(valor_restante)}</div>')
-    card_parts.append(f'</div>')
+    st.markdown(montar_cards_html(pd.DataFrame([gasto])), unsafe_allow_html=True)
+
+def render_lista_cards(df: pd.DataFrame) -> None:
+    """Renderiza os cards paginados, com a página visível num único bloco HTML."""
+    total = len(df)
+    col_p1, col_p2, col_p3 = st.columns([1, 1, 2])
+    with col_p1:
+        tamanho = st.selectbox("Gastos por página:", TAMANHOS_PAGINA, index=1, key="tamanho_pagina")
+    num_paginas = max(1, -(-total // tamanho))
+    # Filtro ou tamanho de página mudou: volta para uma página que existe
+    if st.session_state.get("pagina_gastos", 1) > num_paginas:
+        st.session_state["pagina_gastos"] = num_paginas
+    with col_p2:
+        pagina = st.number_input("Página:", min_value=1, max_value=num_paginas, step=1, key="pagina_gastos")
+    inicio = (pagina - 1) * tamanho
+    fim = min(inicio + tamanho, total)
+    with col_p3:
+        st.caption(f"Mostrando {inicio + 1 if total else 0}–{fim} de {total} gasto(s) · página {pagina} de {num_paginas}")
+
+    st.markdown(montar_cards_html(df.iloc[inicio:fim]), unsafe_allow_html=True)
+
+def render_resumos(resumos: dict) -> None:
+    """Métricas principais (totais e progresso geral) em cards."""
+    st.markdown("---")
     
-    if gasto['entrada'] > 0:
-        card_parts.append(f'<div style="font-size: 0.9rem; color: #666; margin-top: 0.5rem;">Entrada: {formatar_moeda(gasto["entrada"])}</div>')
+    # Métricas principais
+    col1, col2, col3, col4 = st.columns(4)
     
-    card_parts.append(f'</div>')
+    with col1:
+        st.markdown(f"""
+            <div class="metric-card">
+                <h3>Total Planejado</h3>
+                <h2>{formatar_moeda(resumos["total_planejado"])}</h2>
+            </div>
+        """, unsafe_allow_html=True)
     
-    # Junta todas as partes em uma única string
-    card_html = ''.join(card_parts)
+    with col2:
+        st.markdown(f"""
+            <div class="metric-card">
+                <h3>Total Pago</h3>
+                <h2>{formatar_moeda(resumos["total_pago"])}</h2>
+            </div>
+        """, unsafe_allow_html=True)
     
-    st.markdown(card_html, unsafe_allow_html=True)
+    with col3:
+        st.markdown(f"""
+            <div class="metric-card">
+                <h3>Saldo a Pagar</h3>
+                <h2>{formatar_moeda(resumos["total_faltante"])}</h2>
+            </div>
+        """, unsafe_allow_html=True)
     
-# ==========================
-#   APP STREAMLIT
-# ==========================
+    with col4:
+        st.markdown(f"""
+            <div class="metric-card">
+                <h3>Progresso Geral</h3>
+                <h2>{resumos["progresso_geral"]:.1f}%</h2>
+            </div>
+        """, unsafe_allow_html=True)
 
-def main():
-    apply_wedding_styles()
-    
-    st.set_page_config(
-        page_title="Controle Financeiro - Nosso Casamento",
-        page_icon="💍",
-        layout="wide",
-        initial_sidebar_state="collapsed"
-    )
+    # Barra de progresso geral
+    st.progress(resumos["progresso_geral"] / 100, text=f"Progresso geral do nosso casamento: {resumos['progresso_geral']:.1f}%")
 
-    # Header com novo estilo
-    st.markdown("""
-        <div class="header-container">
-            <h1 style="color: #d48aa9; margin: 0; font-size: 2.5rem;">💍 Nosso Casamento</h1>
-            <p style="color: #666; font-size: 1.3rem; margin: 0.5rem 0 0 0; font-weight: 500;">Controle financeiro dos nossos sonhos</p>
-            <div style="margin-top: 1rem; font-size: 1.1rem; color: #888;">
-                💕 Cada detalhe planejado com amor 💕
-            </div>
-        </div>
-    """, unsafe_allow_html=True)
+    st.markdown("---")
 
-    # Carrega dados
-    df = load_data()
-    resumos = calcular_resumos(df)
+@st.fragment
+def render_formulario() -> None:
+    """Formulário de novo gasto.
 
-    # --------- FORMULÁRIO EXPANDÍVEL ---------
+    Roda como fragmento: mexer nos campos refaz só o formulário (prévia da
+    parcela e do progresso); a página inteira só é refeita ao adicionar.
+    """
     # Inicializa o estado do expander
     if 'expander_aberto' not in st.session_state:
         st.session_state.expander_aberto = False
@@ -438,9 +898,13 @@ def main():
     if not st.session_state.expander_aberto:
         col_btn1, col_btn2, col_btn3 = st.columns([1,2,1])
         with col_btn2:
-            if st.button("➕ **Adicionar Novo Gasto**", use_container_width=True, key="abrir_form"):
-                st.session_state.expander_aberto = True
-                st.rerun()
+            # O callback roda antes do fragmento ser refeito: abre sem um rerun extra
+            st.button(
+                "➕ **Adicionar Novo Gasto**",
+                use_container_width=True,
+                key="abrir_form",
+                on_click=lambda: st.session_state.update(expander_aberto=True),
+            )
 
     # Mostra o formulário apenas se o expander estiver aberto
     if st.session_state.expander_aberto:
@@ -457,12 +921,16 @@ def main():
             with col2:
                 num_parcelas = st.number_input("Número de parcelas", min_value=1, step=1, value=1, key="num_parcelas")
                 
-                # Agora recalcula dinâmico a cada mudança
-                valor_parcela = 0.0
-                if valor_total > entrada and num_parcelas > 0:
-                    valor_parcela = (valor_total - entrada) / num_parcelas
+                # Agora recalcula dinâmico a cada mudança (em centavos; o resto
+                # da divisão vai na última parcela)
+                valor_total_c, entrada_c = para_centavos(valor_total), para_centavos(entrada)
+                valor_parcela = dividir_parcelas(valor_total_c, entrada_c, num_parcelas)
+                ultima = valor_total_c - entrada_c - (num_parcelas - 1) * valor_parcela
                 
-                st.info(f"**💎 Valor por parcela:** {formatar_moeda(valor_parcela)}")
+                texto_parcela = f"**💎 Valor por parcela:** {formatar_moeda(para_reais(valor_parcela))}"
+                if valor_parcela and ultima != valor_parcela:
+                    texto_parcela += f" (última: {formatar_moeda(para_reais(ultima))})"
+                st.info(texto_parcela)
                 
                 # Slider agora acompanha num_parcelas dinamicamente
                 parcelas_pagas = st.slider(
@@ -473,8 +941,8 @@ def main():
                 )
                 
                 # Calcula porcentagem paga em tempo real
-                valor_pago_total = entrada + (parcelas_pagas * valor_parcela)
-                porcentagem_paga = (valor_pago_total / valor_total * 100) if valor_total > 0 else 0
+                valor_pago_total = valor_pago(entrada_c, parcelas_pagas, valor_parcela, num_parcelas, valor_total_c)
+                porcentagem_paga = (valor_pago_total / valor_total_c * 100) if valor_total_c > 0 else 0
                 
                 st.caption(f"📊 **Progresso:** {porcentagem_paga:.1f}%")
                 
@@ -487,40 +955,29 @@ def main():
                 submitted = st.button("💕 Adicionar à Nossa Lista", use_container_width=True)
 
             if submitted:
-                # Validações
-                erros = []
-                if valor_total <= 0:
-                    erros.append("O valor total deve ser maior que zero.")
-                if entrada > valor_total:
-                    erros.append("A entrada não pode ser maior que o valor total.")
-                if not categoria.strip():
-                    erros.append("Informe uma categoria.")
-                if not fornecedor.strip():
-                    erros.append("Informe o fornecedor.")
-
-                if erros:
+                nova_linha = {
+                    "id": proximo_id(),
+                    "categoria": categoria.strip(),
+                    "fornecedor": fornecedor.strip(),
+                    "descricao": descricao.strip(),
+                    "valor_total": valor_total_c,
+                    "entrada": entrada_c,
+                    "num_parcelas": int(num_parcelas),
+                    "valor_parcela": valor_parcela,
+                    "parcelas_pagas": int(parcelas_pagas),
+                    "porcentagem_paga": float(porcentagem_paga),
+                    "data_primeira_parcela": data_primeira_parcela.isoformat(),
+                    "observacoes": observacoes.strip(),
+                }
+
+                # Validações (as mesmas regras usadas nas tarefas em lote)
+                erros = validar_gastos(pd.DataFrame([nova_linha]))["erro"]
+
+                if not erros.empty:
                     for e in erros:
                         st.error(e)
                 else:
-                    novo_id = 1 if df.empty else int(df["id"].max()) + 1
-
-                    nova_linha = {
-                        "id": novo_id,
-                        "categoria": categoria.strip(),
-                        "fornecedor": fornecedor.strip(),
-                        "descricao": descricao.strip(),
-                        "valor_total": float(valor_total),
-                        "entrada": float(entrada),
-                        "num_parcelas": int(num_parcelas),
-                        "valor_parcela": float(valor_parcela),
-                        "parcelas_pagas": int(parcelas_pagas),
-                        "porcentagem_paga": float(porcentagem_paga),
-                        "data_primeira_parcela": data_primeira_parcela.isoformat(),
-                        "observacoes": observacoes.strip(),
-                    }
-
-                    df = pd.concat([df, pd.DataFrame([nova_linha])], ignore_index=True)
-                    save_data(df)
+                    upsert_gastos([nova_linha])
                     st.success("Gasto adicionado com sucesso! 💝")
                     
                     # Fecha o expander e limpa os campos
@@ -533,264 +990,594 @@ def main():
                         if key in st.session_state:
                             del st.session_state[key]
                     
+                    # Só aqui a página inteira é refeita, com o novo gasto
                     st.rerun()
 
-    # --------- RESUMO EM CARDS ---------
-    st.markdown("---")
+def render_importacao() -> None:
+    """Upload de planilha para importação em massa e o relatório da última importação."""
+    with st.expander("📥 Importar Planilha (CSV ou XLSX)"):
+        st.caption(
+            "Colunas obrigatórias: categoria, fornecedor e valor_total. Opcionais: descricao, entrada, "
+            "num_parcelas, parcelas_pagas, data_primeira_parcela e observacoes."
+        )
+        arquivo = st.file_uploader("Planilha", type=["csv", "xlsx"], key="planilha_importacao")
+        if arquivo is not None and st.button("📥 Importar", key="importar_planilha"):
+            try:
+                st.session_state["resultado_importacao"] = importar_planilha(arquivo, arquivo.name)
+            except ValueError as erro:
+                st.error(str(erro))
+            else:
+                st.rerun()
+
+        resultado = st.session_state.get("resultado_importacao")
+        if resultado is not None:
+            importados, relatorio = resultado
+            st.success(f"{importados} gasto(s) importado(s). 💝")
+            if not relatorio.empty:
+                st.warning(f"{relatorio['linha'].nunique()} linha(s) com erro não foram importadas.")
+                st.dataframe(relatorio, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "⬇️ Baixar relatório de erros",
+                    relatorio.to_csv(index=False).encode("utf-8"),
+                    file_name="erros_importacao.csv",
+                    mime="text/csv",
+                )
+
+def pedir_exportacao(tipo: str, formato: str) -> Exportacao:
+    """Exportação do relatório na versão atual dos dados, gerada no pool de threads.
+
+    A de mesma versão (pronta ou em andamento) é reaproveitada; a de uma
+    versão anterior é descartada.
+    """
+    df = load_data()
+    cache = _data_cache()
+    with cache["lock"]:
+        chave = cache["chave"]
+        if cache["df"] is not None:
+            df = cache["df"].copy(deep=False)
+        guardada = cache["exportacoes"].get((tipo, formato))
+        if guardada is not None:
+            if guardada[0] == chave and guardada[1].erro is None:
+                return guardada[1]
+            guardada[1].descartar()
+        EXPORTACOES_DIR.mkdir(parents=True, exist_ok=True)
+        destino = EXPORTACOES_DIR / f"{cache['nome'] or 'padrao'}-{uuid.uuid4().hex[:8]}{FORMATOS[formato][1]}"
+        exportacao = Exportacao(_pool_exportacao(), df, tipo, formato, destino)
+        cache["exportacoes"][(tipo, formato)] = (chave, exportacao)
+        return exportacao
+
+@st.fragment(run_every=0.5)
+def render_progresso_exportacao() -> None:
+    """Progresso da exportação em andamento, atualizado a cada meio segundo sem refazer a página."""
+    exportacao = st.session_state.get("exportacao")
+    if exportacao is None or exportacao.concluida:
+        # Pronta: refaz a página para mostrar o botão de download
+        st.rerun()
+    st.progress(exportacao.progresso, text=f"Gerando {RELATORIOS[exportacao.tipo][0].lower()}…")
+
+@st.fragment
+def render_exportacao() -> None:
+    """Exportação de relatórios (CSV, XLSX ou HTML), gerados no pool de threads.
+
+    Roda como fragmento: escolher o relatório e o formato refaz só este
+    trecho; o progresso é atualizado por render_progresso_exportacao.
+    """
+    with st.expander("📤 Exportar Relatório"):
+        col_tipo, col_formato = st.columns([2, 1])
+        with col_tipo:
+            tipo = st.selectbox(
+                "Relatório", list(RELATORIOS), format_func=lambda t: RELATORIOS[t][0], key="relatorio_tipo"
+            )
+        with col_formato:
+            formato = st.radio("Formato", list(FORMATOS), format_func=str.upper, horizontal=True, key="relatorio_formato")
+        if st.button("📤 Gerar relatório", key="gerar_relatorio"):
+            st.session_state["exportacao"] = pedir_exportacao(tipo, formato)
+
+        exportacao = st.session_state.get("exportacao")
+        if exportacao is None:
+            return
+        if not exportacao.concluida:
+            render_progresso_exportacao()
+        elif exportacao.erro is not None:
+            st.error(f"Não foi possível gerar o relatório: {exportacao.erro}")
+        elif not exportacao.destino.exists():
+            # Descartado por uma exportação mais nova (os dados mudaram)
+            st.session_state.pop("exportacao", None)
+            st.info("Os dados mudaram desde a geração; gere o relatório de novo.")
+        else:
+            # O botão some depois do download; gerar de novo sem mudanças nos dados é imediato
+            with open(exportacao.destino, "rb") as arquivo:
+                st.download_button(
+                    f"⬇️ Baixar {exportacao.nome_arquivo}",
+                    arquivo,
+                    file_name=exportacao.nome_arquivo,
+                    mime=exportacao.mime,
+                    key="baixar_relatorio",
+                    on_click=lambda: st.session_state.pop("exportacao", None),
+                )
+
+def render_aba_gastos() -> None:
+    st.subheader("Nossa Lista de Gastos")
     
-    # Métricas principais
-    col1, col2, col3, col4 = st.columns(4)
+    # Filtros
+    col_f1, col_f2 = st.columns(2)
+    with col_f1:
+        categorias = ["Todas"] + listar_categorias()
+        categoria_filtro = st.selectbox("Filtrar por categoria:", categorias)
     
-    with col1:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h3>Total Planejado</h3>
-                <h2>{formatar_moeda(resumos["total_planejado"])}</h2>
-            </div>
-        """, unsafe_allow_html=True)
+    with col_f2:
+        status_filtro = st.selectbox("Filtrar por status:", list(STATUS_FILTROS))
+
+    busca = st.text_input(
+        "🔎 Buscar:",
+        placeholder="fornecedor, descrição ou observações (ex.: flores entrada)",
+        key="busca_gastos",
+        # Resultados vêm por relevância: uma busca nova começa da primeira página
+        on_change=lambda: st.session_state.pop("pagina_gastos", None),
+    )
     
-    with col2:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h3>Total Pago</h3>
-                <h2>{formatar_moeda(resumos["total_pago"])}</h2>
-            </div>
-        """, unsafe_allow_html=True)
+    # Aplica filtros e busca (pelos índices em memória)
+    df_filtrado = consultar_gastos(
+        None if categoria_filtro == "Todas" else categoria_filtro,
+        STATUS_FILTROS[status_filtro],
+        busca,
+    )
     
-    with col3:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h3>Saldo a Pagar</h3>
-                <h2>{formatar_moeda(resumos["total_faltante"])}</h2>
-            </div>
-        """, unsafe_allow_html=True)
+    # Exibe cards (paginados)
+    render_lista_cards(df_filtrado)
+
+def dados_edicao() -> pd.DataFrame:
+    """Tabela do editor: valores em reais e textos livres (sem categorias fixas)."""
+    editable_cols = [
+        "id", "categoria", "fornecedor", "descricao", "valor_total", "entrada",
+        "num_parcelas", "valor_parcela", "parcelas_pagas", "porcentagem_paga",
+        "data_primeira_parcela", "observacoes"
+    ]
+    return em_reais(load_data()[editable_cols]).astype({col: str for col in COLUNAS_CATEGORICAS})
+
+def render_aba_edicao() -> None:
+    st.subheader("Edição Detalhada")
+    st.caption("Edite os valores diretamente na tabela abaixo (alterações não salvas se perdem ao trocar de aba)")
+
+    # Sem edições em andamento, o editor acompanha os dados atuais; com edições,
+    # fica nas linhas que mostrou, cujas versões são as esperadas ao salvar
+    editor = st.session_state.get("editor_avancado")
+    if "edicao_base" not in st.session_state or not (editor and editor["edited_rows"]):
+        st.session_state["edicao_base"] = (load_data(), load_visao("edicao", dados_edicao))
+    df, tabela = st.session_state["edicao_base"]
+
+    st.data_editor(
+        tabela,
+        num_rows="fixed",
+        disabled=["id"],
+        use_container_width=True,
+        key="editor_avancado",
+    )
+
+    col_salvar, col_cancelar = st.columns(2)
+    with col_salvar:
+        if st.button("💾 Salvar Alterações", use_container_width=True, type="primary"):
+            # Só as linhas tocadas no editor são reconciliadas e gravadas
+            linhas_editadas = st.session_state["editor_avancado"]["edited_rows"]
+            originais = [df.iloc[int(pos)][COLUMNS].to_dict() for pos in linhas_editadas]
+            alterados = [
+                reconciliar_edicao(original, _edicao_em_centavos(alteracoes))
+                for original, alteracoes in zip(originais, linhas_editadas.values())
+            ]
+            conflitos = upsert_gastos(alterados, originais) if alterados else []
+            if conflitos:
+                # Outra sessão gravou essas linhas: nada foi salvo; as edições
+                # continuam no editor, agora sobre os dados atuais
+                st.session_state["conflitos_edicao"] = conflitos
+                del st.session_state["edicao_base"]
+            else:
+                st.session_state.pop("conflitos_edicao", None)
+                del st.session_state["editor_avancado"]
+                st.success("Alterações salvas com sucesso! 💝")
+            st.rerun()
+
+    with col_cancelar:
+        if st.button("❌ Descartar Alterações", use_container_width=True):
+            st.session_state.pop("conflitos_edicao", None)
+            del st.session_state["editor_avancado"]
+            st.rerun()
+
+    conflitos = st.session_state.get("conflitos_edicao")
+    if conflitos:
+        render_conflitos(conflitos)
+
+def _edicao_em_centavos(alteracoes: dict) -> dict:
+    """Células editadas (reais no editor) com os valores monetários em centavos."""
+    convertidas = dict(alteracoes)
+    for col in COLUNAS_MONETARIAS:
+        valor = pd.to_numeric(convertidas.get(col), errors="coerce")
+        if col in convertidas and not pd.isna(valor):
+            convertidas[col] = para_centavos(valor)
+    return convertidas
+
+def dados_graficos(hoje: date) -> dict:
+    """Tabelas e especificações dos gráficos da aba Gráficos, já prontas para exibir.
+
+    As parcelas em atraso são contadas até hoje.
+    """
+    df = load_data()
+    agregados = load_agregados()
+
+    def com_progresso(somas):
+        somas = somas.assign(progresso_percentual=(somas["valor_pago"] / somas["valor_total"] * 100).round(1))
+        return somas.assign(pago=_moeda_serie(somas["valor_pago"])).pipe(
+            em_reais, ["valor_total", "valor_pago", "valor_restante"]
+        )
+
+    # Somas por categoria (mantidas incrementalmente) e o progresso de cada
+    # uma; a tabela e os gráficos usam as maiores categorias e "Outros" para o resto
+    principais = com_progresso(agrupar_cauda(agregados.por_categoria()))
+
+    # Próxima parcela em aberto de cada gasto com valor a pagar
+    pendentes = proximas_parcelas(proximos_vencimentos())
+    if not pendentes.empty:
+        pendentes["parcela"] = (
+            pendentes["proxima_parcela"].astype(str) + "/" + pendentes["num_parcelas"].astype(str)
+        )
+        pendentes = em_reais(
+            pendentes[['categoria', 'fornecedor', 'parcela', 'valor_parcela', 'valor_restante', 'proximo_vencimento']],
+            ['valor_parcela', 'valor_restante'],
+        )
+
+    atrasadas = parcelas_atrasadas(df, hoje)
+    total_atrasado = para_reais(atrasadas["valor"].sum())
+    if not atrasadas.empty:
+        atrasadas = (
+            atrasadas.merge(df[['id', 'categoria', 'fornecedor']], on='id')
+            .assign(parcela=lambda t: t['parcela'].astype(str) + "/" + t['num_parcelas'].astype(str))
+            [['categoria', 'fornecedor', 'parcela', 'valor', 'vencimento', 'dias_em_atraso']]
+            .pipe(em_reais, ['valor'])
+        )
+
+    fluxo = em_reais(fluxo_mensal(df), ["pago", "a_pagar"])
+
+    return {
+        "por_categoria": principais[["categoria", "valor_total", "valor_pago", "valor_restante"]],
+        "progresso": principais[["categoria", "progresso_percentual", "pago"]],
+        "grafico_totais": grafico_totais(principais),
+        "grafico_progresso": grafico_progresso(principais),
+        "grafico_fluxo": grafico_fluxo(fluxo) if not fluxo.empty else None,
+        # Contagem por status (mantida incrementalmente)
+        "status": pd.Series(agregados.status).sort_values(ascending=False),
+        "total_gastos": len(df),
+        "pendentes": pendentes,
+        "atrasadas": atrasadas,
+        "total_atrasado": total_atrasado,
+    }
+
+def dados_evolucao(hoje: date, dias: int = None) -> dict:
+    """Série do histórico dos últimos dias até hoje (ou inteira), reamostrada, e o gráfico de evolução.
+
+    Na primeira vez, o histórico anterior ao primeiro registro é preenchido
+    pelo livro de pagamentos e pelo cronograma; os totais de hoje são
+    registrados se ainda não estavam.
+    """
+    cache = _data_cache()
+    with cache["lock"]:
+        historico = _carregar_historico(cache, preencher=True)
+        historico.registrar(hoje, _carregar_agregados(cache))
+        serie = historico.tendencia(None if dias is None else hoje - timedelta(days=dias))
+    return {"serie": serie, "grafico": grafico_evolucao(serie) if not serie.empty else None}
+
+def render_aba_graficos() -> None:
+    hoje = date.today()
+    dados = load_visao("graficos", lambda: dados_graficos(hoje), hoje)
+
+    st.subheader("Visualizações Gráficas")
     
-    with col4:
-        st.markdown(f"""
-            <div class="metric-card">
-                <h3>Progresso Geral</h3>
-                <h2>{resumos["progresso_geral"]:.1f}%</h2>
-            </div>
-        """, unsafe_allow_html=True)
+    # Gráfico 1: Distribuição por Categoria
+    st.write("### 📊 Distribuição de Gastos por Categoria")
+    
+    gastos_por_categoria = dados["por_categoria"]
+    
+    # Mostra como tabela e gráfico de barras
+    col_g1, col_g2 = st.columns(2)
+    
+    with col_g1:
+        st.dataframe(
+            # Já da maior para a menor, com "Outros" por último
+            gastos_por_categoria.rename(columns={
+                'categoria': 'Categoria',
+                'valor_total': 'Total (R$)',
+                'valor_pago': 'Pago (R$)',
+                'valor_restante': 'Restante (R$)'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    with col_g2:
+        # Gráfico de barras para totais por categoria (especificação em cache)
+        st.vega_lite_chart(dados["grafico_totais"], use_container_width=True)
+    
+    # Gráfico 2: Progresso por Categoria
+    st.write("### 📈 Progresso de Pagamento por Categoria")
+    
+    col_g3, col_g4 = st.columns(2)
+    
+    with col_g3:
+        # Gráfico de barras horizontais para progresso
+        st.vega_lite_chart(dados["grafico_progresso"], use_container_width=True)
+    
+    with col_g4:
+        # Progresso por categoria numa única tabela compacta
+        st.dataframe(
+            dados["progresso"],
+            column_config={
+                "categoria": "Categoria",
+                "progresso_percentual": st.column_config.ProgressColumn(
+                    "Progresso", format="%.1f%%", min_value=0, max_value=100
+                ),
+                "pago": "Pago",
+            },
+            use_container_width=True,
+            hide_index=True,
+        )
+    
+    # Gráfico 3: Status dos Pagamentos
+    st.write("### 🎯 Status dos Pagamentos")
+    
+    status_counts = dados["status"]
+    
+    col_g5, col_g6 = st.columns(2)
+    
+    with col_g5:
+        # Gráfico de pizza para status
+        st.write("**Distribuição por Status**")
+        for status, count in status_counts[status_counts > 0].items():
+            st.write(f"**{STATUS_ROTULOS[status]}:** {count} gasto(s)")
+    
+    with col_g6:
+        # Métricas resumidas
+        st.metric("Total de Gastos", dados["total_gastos"])
+        st.metric("Completos", int(status_counts[STATUS_COMPLETO]))
+        st.metric("Em Andamento", int(status_counts[STATUS_EM_ANDAMENTO]))
+        st.metric("Não Iniciados", int(status_counts[STATUS_NAO_INICIADO]))
+    
+    # Gráfico 4: Linha do Tempo (Próximos Vencimentos)
+    st.write("### ⏰ Próximos Vencimentos")
+    
+    gastos_pendentes = dados["pendentes"]
+    
+    if not gastos_pendentes.empty:
+        # Mostra os próximos vencimentos
+        st.dataframe(
+            gastos_pendentes.rename(columns={
+                'categoria': 'Categoria',
+                'fornecedor': 'Fornecedor',
+                'parcela': 'Parcela',
+                'valor_parcela': 'Valor da Parcela (R$)',
+                'valor_restante': 'Valor Restante (R$)',
+                'proximo_vencimento': 'Próximo Vencimento'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.success("🎉 Todos os gastos estão quitados!")
 
-    # Barra de progresso geral
-    st.progress(resumos["progresso_geral"] / 100, text=f"Progresso geral do nosso casamento: {resumos['progresso_geral']:.1f}%")
+    # Gráfico 5: Parcelas em atraso
+    atrasadas = dados["atrasadas"]
+    if not atrasadas.empty:
+        st.write("### ⚠️ Parcelas em Atraso")
+        st.warning(
+            f"{len(atrasadas)} parcela(s) vencida(s) sem pagamento, "
+            f"somando {formatar_moeda(dados['total_atrasado'])}."
+        )
+        st.dataframe(
+            atrasadas.rename(columns={
+                'categoria': 'Categoria',
+                'fornecedor': 'Fornecedor',
+                'parcela': 'Parcela',
+                'valor': 'Valor (R$)',
+                'vencimento': 'Vencimento',
+                'dias_em_atraso': 'Dias em Atraso'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
 
-    st.markdown("---")
+    # Gráfico 6: Projeção do fluxo de caixa por mês
+    st.write("### 💸 Fluxo de Caixa Mensal")
+    if dados["grafico_fluxo"] is not None:
+        st.vega_lite_chart(dados["grafico_fluxo"], use_container_width=True)
 
-    # --------- VISUALIZAÇÃO PRINCIPAL ---------
-    if not df.empty:
-        # Prepara dados para exibição
-        df_display = df.copy()
-        df_display["valor_pago"] = df_display["entrada"] + (df_display["parcelas_pagas"] * df_display["valor_parcela"])
-        df_display["valor_restante"] = df_display["valor_total"] - df_display["valor_pago"]
+    # Evolução do planejado e do pago, pelo histórico diário
+    st.write("### 📉 Evolução dos Pagamentos")
+    periodo = st.radio("Período", list(PERIODOS_EVOLUCAO), horizontal=True, key="periodo_evolucao")
+    evolucao = load_visao(f"evolucao_{periodo}", lambda: dados_evolucao(hoje, PERIODOS_EVOLUCAO[periodo]), hoje)
+    if evolucao["grafico"] is not None:
+        st.vega_lite_chart(evolucao["grafico"], use_container_width=True)
 
-        # Abas para diferentes visualizações
-        tab1, tab2, tab3 = st.tabs(["🎀 Nossos Gastos", "📊 Edição Avançada", "📈 Gráficos"])
+    # Histórico: total devido numa data passada, pelo livro de pagamentos
+    st.write("### 🕰️ Quanto Devíamos em…")
+    dia = st.date_input("Data", value=date.today(), key="livro_dia")
+    devido = devido_em(dia)
+    if devido is None:
+        st.info("O histórico de pagamentos começa depois dessa data.")
+    else:
+        st.metric(f"Devido em {dia:%d/%m/%Y}", formatar_moeda(devido))
 
-        with tab1:
-            st.subheader("Nossa Lista de Gastos")
-            
-            # Filtros
-            col_f1, col_f2 = st.columns(2)
-            with col_f1:
-                categorias = ["Todas"] + list(df_display['categoria'].unique())
-                categoria_filtro = st.selectbox("Filtrar por categoria:", categorias)
-            
-            with col_f2:
-                status_options = ["Todos", "Completos (100%)", "Em andamento", "Não iniciados (0%)"]
-                status_filtro = st.selectbox("Filtrar por status:", status_options)
-            
-            # Aplica filtros
-            df_filtrado = df_display.copy()
-            if categoria_filtro != "Todas":
-                df_filtrado = df_filtrado[df_filtrado['categoria'] == categoria_filtro]
-            
-            if status_filtro == "Completos (100%)":
-                df_filtrado = df_filtrado[df_filtrado['porcentagem_paga'] == 100]
-            elif status_filtro == "Em andamento":
-                df_filtrado = df_filtrado[(df_filtrado['porcentagem_paga'] > 0) & (df_filtrado['porcentagem_paga'] < 100)]
-            elif status_filtro == "Não iniciados (0%)":
-                df_filtrado = df_filtrado[df_filtrado['porcentagem_paga'] == 0]
-            
-            # Exibe cards
-            for _, gasto in df_filtrado.iterrows():
-                render_gasto_card(gasto)
+    # Conferência dos totais mantidos incrementalmente
+    if st.button("🔍 Conferir totais", key="conferir_totais"):
+        erros = verificar_agregados()
+        if erros:
+            st.warning("Totais divergentes foram recalculados: " + "; ".join(erros))
+        else:
+            st.success("Totais conferem com o recálculo completo. ✅")
 
-        with tab2:
-            st.subheader("Edição Detalhada")
-            st.caption("Edite os valores diretamente na tabela abaixo")
-            
-            editable_cols = [
-                "id", "categoria", "fornecedor", "descricao", "valor_total", "entrada",
-                "num_parcelas", "valor_parcela", "parcelas_pagas", "porcentagem_paga",
-                "data_primeira_parcela", "observacoes"
-            ]
+def render_painel_desempenho(medidor: Medidor) -> None:
+    """Painel na barra lateral com p50/p95 de cada fase nos reruns desta sessão e os contadores do cache."""
+    with st.sidebar:
+        st.subheader("⏱️ Desempenho")
+        cache = cache_stats()
+        planos = cache["planos"]
+        st.caption(
+            f"Cache da tabela: {cache['hits']} acerto(s) e {cache['misses']} falta(s) neste plano "
+            f"({cache['hit_rate']:.0%}); {planos['hit_rate']:.0%} em {planos['planos_em_cache']} plano(s), "
+            f"{planos['memoria_bytes'] / 2**20:.1f} de {planos['memoria_max_bytes'] / 2**20:.0f} MiB, "
+            f"{planos['descartes']} descarte(s)."
+        )
+        estatisticas = medidor.estatisticas()
+        if not estatisticas:
+            st.caption("Interaja com a página para medir os próximos reruns.")
+            return
+        tabela = pd.DataFrame(estatisticas)
+        st.caption(f"Últimos {len(medidor.historico)} rerun(s) desta sessão, em ms.")
+        st.dataframe(
+            tabela.rename(columns={
+                "fase": "Fase", "reruns": "Reruns", "ultimo_ms": "Último",
+                "p50_ms": "p50", "p95_ms": "p95",
+            }).round(1),
+            use_container_width=True,
+            hide_index=True,
+        )
+        st.bar_chart(tabela[tabela["fase"] != "total"].set_index("fase")["ultimo_ms"], horizontal=True)
+        st.download_button(
+            "⬇️ Exportar (JSON lines)",
+            medidor.jsonl().encode("utf-8"),
+            file_name="desempenho.jsonl",
+            mime="application/jsonl",
+        )
 
-            edited_df = st.data_editor(
-                df[editable_cols],
-                num_rows="fixed",
-                use_container_width=True,
-                key="editor_avancado",
-            )
+def render_conflitos(conflitos: list) -> None:
+    """Mostra, para cada linha em conflito, a sua edição ao lado da versão atual."""
+    st.error(
+        f"⚠️ {len(conflitos)} gasto(s) foram alterados por outra sessão enquanto você editava. "
+        "Nada foi salvo: revise as linhas abaixo na tabela (já com os dados atuais) e salve novamente."
+    )
+    render_diferencas(conflitos)
 
-            col_salvar, col_cancelar = st.columns(2)
-            with col_salvar:
-                if st.button("💾 Salvar Alterações", use_container_width=True, type="primary"):
-                    # Sincroniza parcelas e porcentagem
-                    edited_df = sincronizar_parcelas_porcentagem(edited_df)
-                    
-                    # Reaplica tipagem
-                    edited_df["valor_total"] = pd.to_numeric(edited_df["valor_total"], errors="coerce").fillna(0.0)
-                    edited_df["entrada"] = pd.to_numeric(edited_df["entrada"], errors="coerce").fillna(0.0)
-                    edited_df["num_parcelas"] = pd.to_numeric(edited_df["num_parcelas"], errors="coerce").fillna(1).astype(int)
-                    edited_df["valor_parcela"] = pd.to_numeric(edited_df["valor_parcela"], errors="coerce").fillna(0.0)
-                    edited_df["parcelas_pagas"] = pd.to_numeric(edited_df["parcelas_pagas"], errors="coerce").fillna(0).astype(int)
-                    edited_df["porcentagem_paga"] = pd.to_numeric(edited_df["porcentagem_paga"], errors="coerce").fillna(0.0)
-
-                    # Garante consistência
-                    edited_df["parcelas_pagas"] = edited_df[["parcelas_pagas", "num_parcelas"]].min(axis=1)
-                    edited_df["porcentagem_paga"] = edited_df["porcentagem_paga"].clip(0, 100)
-
-                    save_data(edited_df[COLUMNS])
-                    st.success("Alterações salvas com sucesso! 💝")
-                    st.rerun()
+def render_descartadas() -> None:
+    """Avisa, uma vez por sessão, das alterações salvas que não chegaram ao disco (ver _descartar_escritas)."""
+    cache = _data_cache()
+    with cache["lock"]:
+        descartadas = list(cache["descartadas"])
+    chave = f"descartadas_vistas_{plano_atual() or ''}"
+    # Só as perdidas depois que a sessão abriu o plano (ou que ele voltou ao cache)
+    vistas = st.session_state.setdefault(chave, len(descartadas))
+    if vistas > len(descartadas):
+        vistas = st.session_state[chave] = 0
+    novas = descartadas[vistas:]
+    if not novas:
+        return
+    st.error(
+        f"⚠️ {len(novas)} alteração(ões) salva(s) não chegaram ao arquivo: as mesmas linhas foram "
+        "gravadas por fora antes. Os dados mostrados já são os do arquivo; refaça o que faltar."
+    )
+    render_diferencas(novas)
+    if st.button("Entendi", key="descartadas_ok"):
+        st.session_state[chave] = len(descartadas)
+        st.rerun()
 
-            with col_cancelar:
-                if st.button("❌ Descartar Alterações", use_container_width=True):
-                    st.rerun()
+def render_diferencas(conflitos: list) -> None:
+    """Tabela com os campos de cada linha em conflito: a sua edição ao lado da versão atual."""
+    linhas = []
+    for conflito in conflitos:
+        atual = conflito["atual"] or {}
+        for campo in ("categoria", "fornecedor", "valor_total", "entrada", "parcelas_pagas", "porcentagem_paga"):
+            sua, valor_atual = conflito["sua"].get(campo), atual.get(campo)
+            if sua != valor_atual:
+                if campo in COLUNAS_MONETARIAS:
+                    sua, valor_atual = (None if v is None else formatar_moeda(para_reais(v)) for v in (sua, valor_atual))
+                linhas.append({
+                    "ID": conflito["id"],
+                    "Campo": campo,
+                    "Sua edição": str(sua),
+                    "Versão atual": str(valor_atual),
+                })
+    if linhas:
+        st.dataframe(pd.DataFrame(linhas), use_container_width=True, hide_index=True)
 
-        with tab3:
-            st.subheader("Visualizações Gráficas")
-            
-            # Prepara dados para os gráficos
-            df_graficos = df.copy()
-            df_graficos["valor_pago"] = df_graficos["entrada"] + (df_graficos["parcelas_pagas"] * df_graficos["valor_parcela"])
-            df_graficos["valor_restante"] = df_graficos["valor_total"] - df_graficos["valor_pago"]
-            
-            # Gráfico 1: Distribuição por Categoria
-            st.write("### 📊 Distribuição de Gastos por Categoria")
-            
-            # Agrupa por categoria
-            gastos_por_categoria = df_graficos.groupby('categoria').agg({
-                'valor_total': 'sum',
-                'valor_pago': 'sum',
-                'valor_restante': 'sum'
-            }).reset_index()
-            
-            # Mostra como tabela e gráfico de barras
-            col_g1, col_g2 = st.columns(2)
-            
-            with col_g1:
-                st.dataframe(
-                    gastos_por_categoria[['categoria', 'valor_total', 'valor_pago', 'valor_restante']]
-                    .rename(columns={
-                        'categoria': 'Categoria',
-                        'valor_total': 'Total (R$)',
-                        'valor_pago': 'Pago (R$)',
-                        'valor_restante': 'Restante (R$)'
-                    })
-                    .sort_values('Total (R$)', ascending=False),
-                    use_container_width=True,
-                    hide_index=True
-                )
-            
-            with col_g2:
-                # Gráfico de barras para totais por categoria
-                st.bar_chart(
-                    gastos_por_categoria.set_index('categoria')['valor_total'],
-                    use_container_width=True
-                )
-            
-            # Gráfico 2: Progresso por Categoria
-            st.write("### 📈 Progresso de Pagamento por Categoria")
-            
-            # Calcula progresso percentual por categoria
-            gastos_por_categoria['progresso_percentual'] = (
-                gastos_por_categoria['valor_pago'] / gastos_por_categoria['valor_total'] * 100
-            ).round(1)
-            
-            col_g3, col_g4 = st.columns(2)
-            
-            with col_g3:
-                # Gráfico de barras horizontais para progresso
-                st.bar_chart(
-                    gastos_por_categoria.set_index('categoria')['progresso_percentual'],
-                    use_container_width=True
-                )
-            
-            with col_g4:
-                # Métricas de progresso por categoria
-                for _, cat in gastos_por_categoria.iterrows():
-                    st.metric(
-                        label=f"{cat['categoria']}",
-                        value=f"{cat['progresso_percentual']}%",
-                        delta=formatar_moeda(cat['valor_pago']),
-                        delta_color="normal"
-                    )
-            
-            # Gráfico 3: Status dos Pagamentos
-            st.write("### 🎯 Status dos Pagamentos")
-            
-            # Classifica os gastos por status
-            def classificar_status(porcentagem):
-                if porcentagem == 0:
-                    return "Não Iniciado"
-                elif porcentagem == 100:
-                    return "Completo"
-                elif porcentagem > 0 and porcentagem < 100:
-                    return "Em Andamento"
-                else:
-                    return "Outro"
-            
-            df_graficos['status'] = df_graficos['porcentagem_paga'].apply(classificar_status)
-            status_counts = df_graficos['status'].value_counts()
-            
-            col_g5, col_g6 = st.columns(2)
-            
-            with col_g5:
-                # Gráfico de pizza para status
-                st.write("**Distribuição por Status**")
-                for status, count in status_counts.items():
-                    st.write(f"**{status}:** {count} gasto(s)")
-            
-            with col_g6:
-                # Métricas resumidas
-                total_gastos = len(df_graficos)
-                completos = len(df_graficos[df_graficos['porcentagem_paga'] == 100])
-                andamento = len(df_graficos[(df_graficos['porcentagem_paga'] > 0) & (df_graficos['porcentagem_paga'] < 100)])
-                nao_iniciados = len(df_graficos[df_graficos['porcentagem_paga'] == 0])
-                
-                st.metric("Total de Gastos", total_gastos)
-                st.metric("Completos", completos)
-                st.metric("Em Andamento", andamento)
-                st.metric("Não Iniciados", nao_iniciados)
-            
-            # Gráfico 4: Linha do Tempo (Próximos Vencimentos)
-            st.write("### ⏰ Próximos Vencimentos")
-            
-            # Filtra gastos que ainda têm valor a pagar
-            gastos_pendentes = df_graficos[df_graficos['valor_restante'] > 0].copy()
-            
-            if not gastos_pendentes.empty:
-                # Ordena pela data da primeira parcela
-                gastos_pendentes['data_primeira_parcela'] = pd.to_datetime(gastos_pendentes['data_primeira_parcela'])
-                gastos_pendentes = gastos_pendentes.sort_values('data_primeira_parcela')
-                
-                # Mostra os próximos vencimentos
-                st.dataframe(
-                    gastos_pendentes[['categoria', 'fornecedor', 'valor_restante', 'data_primeira_parcela']]
-                    .rename(columns={
-                        'categoria': 'Categoria',
-                        'fornecedor': 'Fornecedor',
-                        'valor_restante': 'Valor Restante (R$)',
-                        'data_primeira_parcela': 'Próximo Vencimento'
-                    }),
-                    use_container_width=True,
-                    hide_index=True
-                )
+# ==========================
+#   APP STREAMLIT
+# ==========================
+
+def main():
+    medidor = medidor_sessao()
+    medidor.novo_rerun(plano=plano_atual())
+
+    with medir("estilos"):
+        apply_wedding_styles()
+    
+    st.set_page_config(
+        page_title="Controle Financeiro - Nosso Casamento",
+        page_icon="💍",
+        layout="wide",
+        initial_sidebar_state="expanded" if medidor.ativo else "collapsed"
+    )
+
+    # Header com novo estilo
+    st.markdown("""
+        <div class="header-container">
+            <h1 style="color: #d48aa9; margin: 0; font-size: 2.5rem;">💍 Nosso Casamento</h1>
+            <p style="color: #666; font-size: 1.3rem; margin: 0.5rem 0 0 0; font-weight: 500;">Controle financeiro dos nossos sonhos</p>
+            <div style="margin-top: 1rem; font-size: 1.1rem; color: #888;">
+                💕 Cada detalhe planejado com amor 💕
+            </div>
+        </div>
+    """, unsafe_allow_html=True)
+
+    plano = plano_atual()
+    if plano is not None:
+        if not nome_valido(plano):
+            st.error("Plano inválido: use só letras minúsculas, números, '-' e '_'.")
+            st.stop()
+        if not _cache_planos().existe(plano):
+            # Só um clique cria o arquivo: um ?plano= qualquer não cria nada
+            st.warning(f"O plano '{plano}' ainda não existe.")
+            if st.button("📒 Criar plano", key="criar_plano"):
+                _cache_planos().criar(plano)
+                st.rerun()
+            st.stop()
+        st.caption(f"📒 Plano: {plano}")
+
+    render_descartadas()
+
+    # Carrega dados (as colunas calculadas ficam para as abas que as usam)
+    with medir("carregar"):
+        df = load_data()
+        agregados = load_agregados()
+
+    # --------- FORMULÁRIO EXPANDÍVEL ---------
+    render_formulario()
+
+    render_importacao()
+
+    render_exportacao()
+
+    # --------- RESUMO EM CARDS ---------
+    with medir("resumos"):
+        render_resumos(agregados.resumos())
+
+    # --------- VISUALIZAÇÃO PRINCIPAL ---------
+    if not df.empty:
+        # Só a aba escolhida é calculada e enviada ao navegador (st.tabs
+        # executaria as três a cada rerun)
+        # A escolha é guardada fora do widget: um st.rerun() que interrompa o
+        # script antes do seletor (ex.: ao adicionar um gasto) não volta à primeira aba
+        aba = st.radio(
+            "Visualização",
+            list(ABAS),
+            index=list(ABAS).index(st.session_state.get("aba_atual", next(iter(ABAS)))),
+            horizontal=True,
+            key="aba",
+            label_visibility="collapsed",
+        )
+        st.session_state["aba_atual"] = aba
+
+        with medir(ABAS[aba]):
+            if aba == "🎀 Nossos Gastos":
+                render_aba_gastos()
+            elif aba == "📊 Edição Avançada":
+                render_aba_edicao()
             else:
-                st.success("🎉 Todos os gastos estão quitados!")
+                render_aba_graficos()
 
     else:
         # Estado vazio
@@ -802,6 +1589,9 @@ def main():
             </div>
         """, unsafe_allow_html=True)
 
+    if medidor.ativo:
+        render_painel_desempenho(medidor)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""Benchmarks do app sobre planos sintéticos (gerador.py) de vários tamanhos.
+
+Mede load_data (frio e em cache), save_data (até o dado estar no disco:
+inclui descarregar as escritas atrasadas), calcular_resumos,
+sincronizar_parcelas_porcentagem, render_gasto_card (uma página de cards)
+e um rerun completo de main() pelo AppTest do Streamlit, sem navegador.
+Para cada medida grava a mediana e o mínimo dos tempos e o pico de memória
+alocada (tracemalloc, numa execução à parte).
+
+    python benchmark.py --saida bench.json --tamanhos 100 10000
+    python benchmark.py --comparar base.json bench.json --tolerancia 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+from streamlit import config
+from streamlit import logger as st_logger
+from streamlit.testing.v1 import AppTest
+
+import app
+from gerador import gerar_gastos
+from nucleo import calcular_resumos, sincronizar_parcelas_porcentagem
+from storage import abrir_storage
+
+TAMANHOS = [100, 10_000, 1_000_000]
+REPETICOES = 5
+
+# Diferenças abaixo disso são ruído e nunca contam como regressão
+_RUIDO_S = 0.001
+_RUIDO_BYTES = 1024 * 1024
+
+# Script executado pelo AppTest: o app com o arquivo de dados do benchmark
+_SCRIPT_APP = """
+from pathlib import Path
+import app
+app.DATA_PATH = Path({data_path!r})
+app.main()
+"""
+
+
+def _limpar_cache() -> None:
+    # Grava as escritas atrasadas antes de descartar os planos em cache
+    app._cache_planos().descarregar()
+    app._cache_planos.clear()
+
+
+def medir(funcao, repeticoes: int) -> dict:
+    """Tempo (mediana e mínimo de `repeticoes` execuções) e pico de memória de uma execução."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "mediana_s": statistics.median(tempos),
+        "min_s": min(tempos),
+        "pico_bytes": pico,
+        "repeticoes": repeticoes,
+    }
+
+
+def _repeticoes(n: int, repeticoes: int) -> int:
+    # Os maiores planos levam segundos por execução; menos repetições bastam
+    return repeticoes if n <= 10_000 else max(1, repeticoes // 5)
+
+
+def medir_tamanho(n: int, formato: str, repeticoes: int, seed: int) -> dict:
+    """Roda todas as medidas para um plano de n gastos, num diretório temporário."""
+    repeticoes = _repeticoes(n, repeticoes)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        cwd = os.getcwd()
+        os.chdir(pasta)
+        try:
+            data_path = Path(f"data/gastos.{formato}")
+            data_path.parent.mkdir()
+            abrir_storage(data_path).salvar(gerar_gastos(n, seed))
+            app.DATA_PATH = data_path
+            _limpar_cache()
+
+            def carregar_frio():
+                _limpar_cache()
+                app.load_data()
+
+            resultados["load_data_frio"] = medir(carregar_frio, repeticoes)
+            app.load_data()
+            resultados["load_data_cache"] = medir(app.load_data, repeticoes)
+
+            df = app.load_data()
+
+            def salvar():
+                # Com a escrita atrasada, save_data só enfileira: a medida inclui a
+                # gravação no disco (journal ou SQLite, com fsync)
+                app.save_data(df)
+                app._cache_planos().descarregar()
+
+            resultados["save_data"] = medir(salvar, repeticoes)
+            resultados["calcular_resumos"] = medir(lambda: calcular_resumos(df), repeticoes)
+            resultados["sincronizar_parcelas_porcentagem"] = medir(
+                lambda: sincronizar_parcelas_porcentagem(df), repeticoes
+            )
+
+            pagina = [gasto for _, gasto in df.head(app.TAMANHOS_PAGINA[1]).iterrows()]
+
+            def renderizar_pagina():
+                for gasto in pagina:
+                    app.render_gasto_card(gasto)
+
+            resultados["render_gasto_card_pagina"] = medir(renderizar_pagina, repeticoes)
+
+            at = AppTest.from_string(_SCRIPT_APP.format(data_path=str(data_path)), default_timeout=1800)
+
+            def rerun_frio():
+                _limpar_cache()
+                at.run()
+
+            resultados["main_rerun_frio"] = medir(rerun_frio, repeticoes)
+            at.run()
+            resultados["main_rerun"] = medir(at.run, repeticoes)
+            if at.exception:
+                raise RuntimeError(f"main() falhou no AppTest: {at.exception}")
+        finally:
+            _limpar_cache()
+            os.chdir(cwd)
+    return resultados
+
+
+def executar(tamanhos: list, formato: str, repeticoes: int, seed: int) -> dict:
+    # Sem ScriptRunContext fora do AppTest, o Streamlit avisa a cada chamada
+    config.set_option("logger.level", "error")
+    st_logger.set_log_level(logging.ERROR)
+
+    relatorio = {
+        "meta": {
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+            "formato": formato,
+            "seed": seed,
+            "save_data": "com descarregar() das escritas atrasadas",
+        },
+        "resultados": {},
+    }
+    for n in tamanhos:
+        print(f"{n} gastos...", file=sys.stderr)
+        relatorio["resultados"][str(n)] = medir_tamanho(n, formato, repeticoes, seed)
+    return relatorio
+
+
+def comparar(base: dict, novo: dict, tolerancia: float) -> list:
+    """Linhas da comparação entre duas execuções; regressao=True se piorou além da tolerância."""
+    linhas = []
+    for tamanho, medidas in novo["resultados"].items():
+        for nome, medida in medidas.items():
+            anterior = base["resultados"].get(tamanho, {}).get(nome)
+            if anterior is None:
+                continue
+            tempo = medida["mediana_s"] / anterior["mediana_s"] if anterior["mediana_s"] else float("inf")
+            memoria = medida["pico_bytes"] / anterior["pico_bytes"] if anterior["pico_bytes"] else float("inf")
+            regressao_tempo = tempo > 1 + tolerancia and medida["mediana_s"] - anterior["mediana_s"] > _RUIDO_S
+            regressao_memoria = (
+                memoria > 1 + tolerancia and medida["pico_bytes"] - anterior["pico_bytes"] > _RUIDO_BYTES
+            )
+            linhas.append({
+                "tamanho": int(tamanho),
+                "medida": nome,
+                "antes_s": anterior["mediana_s"],
+                "depois_s": medida["mediana_s"],
+                "razao_tempo": tempo,
+                "razao_memoria": memoria,
+                "regressao": regressao_tempo or regressao_memoria,
+            })
+    return linhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do app com planos sintéticos.")
+    parser.add_argument("--saida", type=Path, default=Path("bench.json"), help="arquivo JSON com os resultados")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS)
+    parser.add_argument("--formato", choices=["csv", "db", "parquet", "arrow"], default="csv")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--comparar", type=Path, nargs=2, metavar=("BASE", "NOVO"),
+                        help="compara dois resultados em vez de medir")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="piora relativa aceita antes de acusar regressão (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.comparar:
+        base, novo = (json.loads(p.read_text(encoding="utf-8")) for p in args.comparar)
+        linhas = comparar(base, novo, args.tolerancia)
+        tabela = pd.DataFrame(linhas)
+        if not tabela.empty:
+            tabela["regressao"] = tabela["regressao"].map({True: "REGRESSÃO", False: ""})
+            print(tabela.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        regressoes = [linha for linha in linhas if linha["regressao"]]
+        print(f"{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}.")
+        sys.exit(1 if regressoes else 0)
+
+    relatorio = executar(args.tamanhos, args.formato, args.repeticoes, args.seed)
+    args.saida.write_text(json.dumps(relatorio, indent=2), encoding="utf-8")
+    for tamanho, medidas in relatorio["resultados"].items():
+        for nome, medida in medidas.items():
+            print(f"{tamanho:>8} {nome:<34} {medida['mediana_s'] * 1000:10.2f} ms {medida['pico_bytes'] / 2**20:9.1f} MiB")
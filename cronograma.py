@@ -0,0 +1,164 @@
+"""Cronograma de parcelas: expansão vetorizada de cada gasto em suas parcelas.
+
+As parcelas vencem mensalmente a partir de data_primeira_parcela, no mesmo
+dia do mês (ou no último dia, em meses mais curtos). As primeiras
+parcelas_pagas parcelas de cada gasto são consideradas pagas; a entrada não
+entra no cronograma. Valores em centavos: a última parcela leva o resto da
+divisão, e as parcelas de um gasto somam exatamente valor_total - entrada.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+# Representação interna de NaT em datetime64
+_NAT = np.iinfo("int64").min
+_NS_POR_DIA = 86_400 * 1_000_000_000
+
+
+def _datas_base(df: pd.DataFrame):
+    """Mês (meses desde 1970) e dia (0-based) da primeira parcela de cada gasto.
+
+    Datas inválidas ficam com mês _NAT.
+    """
+    primeira = pd.to_datetime(df["data_primeira_parcela"], errors="coerce").to_numpy("datetime64[D]")
+    mes = primeira.astype("datetime64[M]")
+    dia = (primeira - mes.astype("datetime64[D]")).astype("int64")
+    return mes.astype("int64"), dia
+
+
+def _tabela_meses(primeiro: int, ultimo: int) -> np.ndarray:
+    """Dia (desde 1970) em que começa cada mês de primeiro..ultimo+1."""
+    meses = np.arange(primeiro, ultimo + 2).astype("datetime64[M]")
+    return meses.astype("datetime64[D]").astype("int64")
+
+
+def _vencimentos(mes0: np.ndarray, dia0: np.ndarray, numero: np.ndarray) -> np.ndarray:
+    """Vencimento (datetime64[ns]) da parcela `numero` (1-based), ajustando ao fim do mês.
+
+    A conversão mês -> dia é feita por uma tabela com um item por mês do
+    intervalo, em vez da aritmética de calendário do NumPy elemento a elemento.
+    """
+    invalidos = mes0 == _NAT
+    if invalidos.all():
+        return np.full(len(mes0), _NAT, dtype="int64").view("datetime64[ns]")
+    if invalidos.any():
+        # Posição provisória válida; o resultado volta a NaT no final
+        mes0 = np.where(invalidos, mes0[~invalidos].min(), mes0)
+
+    mes = mes0 + (numero - 1)
+    primeiro = mes.min()
+    posicao = mes - primeiro
+    inicio_dos_meses = _tabela_meses(primeiro, mes.max())
+    inicio = inicio_dos_meses[posicao]
+    dias_no_mes = inicio_dos_meses[posicao + 1] - inicio
+    resultado = (inicio + np.minimum(dia0, dias_no_mes - 1)) * _NS_POR_DIA
+    if invalidos.any():
+        resultado[invalidos] = _NAT
+    return resultado.view("datetime64[ns]")
+
+
+def _resto_ultima(df: pd.DataFrame) -> np.ndarray:
+    """Quanto a última parcela de cada gasto tem a mais que valor_parcela (centavos)."""
+    valor_total = df["valor_total"].to_numpy("int64")
+    entrada = df["entrada"].to_numpy("int64")
+    n = df["num_parcelas"].to_numpy("int64")
+    valor_parcela = df["valor_parcela"].to_numpy("int64")
+    return valor_total - entrada - n * valor_parcela
+
+
+def expandir_parcelas(df: pd.DataFrame) -> pd.DataFrame:
+    """Uma linha por parcela: id, parcela, vencimento, valor e se já foi paga.
+
+    Feito numa única passada NumPy (np.repeat + aritmética de datas), sem
+    laço por gasto ou por parcela.
+    """
+    n = np.maximum(df["num_parcelas"].to_numpy("int64"), 0)
+    total = int(n.sum())
+    inicio = np.cumsum(n) - n
+    numero = np.arange(total, dtype="int64") - np.repeat(inicio, n) + 1
+
+    mes0, dia0 = _datas_base(df)
+    vencimento = _vencimentos(np.repeat(mes0, n), np.repeat(dia0, n), numero)
+    ultima = numero == np.repeat(n, n)
+    valor = np.repeat(df["valor_parcela"].to_numpy("int64"), n)
+    valor[ultima] += _resto_ultima(df)[n > 0]
+
+    return pd.DataFrame({
+        "id": np.repeat(df["id"].to_numpy(), n),
+        "parcela": numero.astype("int32"),
+        "num_parcelas": np.repeat(n.astype("int32"), n),
+        "vencimento": vencimento,
+        "valor": valor,
+        "paga": numero <= np.repeat(df["parcelas_pagas"].to_numpy("int64"), n),
+    }, copy=False)
+
+
+def proximas_parcelas(df: pd.DataFrame) -> pd.DataFrame:
+    """Próxima parcela em aberto de cada gasto, ordenada pelo vencimento.
+
+    Como as parcelas são pagas em ordem, a próxima é a parcelas_pagas + 1;
+    o vencimento é calculado direto, sem expandir o cronograma.
+    """
+    pendentes = df[df["parcelas_pagas"] < df["num_parcelas"]]
+    mes0, dia0 = _datas_base(pendentes)
+    numero = pendentes["parcelas_pagas"].to_numpy("int64") + 1
+    return (
+        pendentes.assign(
+            proxima_parcela=numero,
+            proximo_vencimento=_vencimentos(mes0, dia0, numero),
+        )
+        .sort_values("proximo_vencimento", kind="stable")
+    )
+
+
+def parcelas_atrasadas(df: pd.DataFrame, hoje: date = None) -> pd.DataFrame:
+    """Parcelas não pagas com vencimento anterior a hoje.
+
+    Só os gastos cuja próxima parcela já venceu são expandidos.
+    """
+    hoje = np.datetime64(hoje or date.today(), "D")
+    proximas = proximas_parcelas(df)
+    em_atraso = proximas[proximas["proximo_vencimento"].to_numpy() < hoje]
+    cronograma = expandir_parcelas(em_atraso[df.columns])
+    atrasadas = cronograma[~cronograma["paga"].to_numpy() & (cronograma["vencimento"].to_numpy() < hoje)]
+    atraso = hoje - atrasadas["vencimento"].to_numpy().astype("datetime64[D]")
+    return atrasadas.assign(dias_em_atraso=atraso.astype("int64")).reset_index(drop=True)
+
+
+def fluxo_mensal(df: pd.DataFrame) -> pd.DataFrame:
+    """Valor pago e a pagar (centavos) por mês de vencimento (projeção do fluxo de caixa).
+
+    Cada gasto soma valor_parcela num intervalo contínuo de meses (pagas,
+    depois em aberto), mais o resto da divisão no mês da última parcela; os
+    intervalos são acumulados com vetores de diferença e uma soma
+    cumulativa, sem expandir as parcelas.
+    """
+    mes0, _ = _datas_base(df)
+    validos = mes0 != _NAT
+    if not validos.any():
+        return pd.DataFrame({"mes": pd.Series(dtype="datetime64[ns]"), "pago": [], "a_pagar": []})
+
+    mes0 = mes0[validos]
+    n = np.maximum(df["num_parcelas"].to_numpy("int64")[validos], 0)
+    pagas = np.clip(df["parcelas_pagas"].to_numpy("int64")[validos], 0, n)
+    valor = df["valor_parcela"].to_numpy("int64")[validos]
+    resto = np.where(n > 0, _resto_ultima(df)[validos], 0)
+
+    primeiro = mes0.min()
+    inicio = mes0 - primeiro
+    tamanho = int((inicio + n).max()) + 1
+    ultima = np.maximum(inicio + n - 1, 0)
+
+    def acumular(de, ate, quitados):
+        # Somas em float64 de centavos inteiros são exatas abaixo de 2**53
+        diff = np.bincount(de, weights=valor, minlength=tamanho) - np.bincount(ate, weights=valor, minlength=tamanho)
+        total = np.cumsum(diff) + np.bincount(ultima, weights=np.where(quitados, resto, 0), minlength=tamanho)
+        return np.rint(total).astype("int64")[:-1]
+
+    pago = acumular(inicio, inicio + pagas, pagas == n)
+    a_pagar = acumular(inicio + pagas, inicio + n, pagas < n)
+    mes = (np.arange(tamanho - 1) + primeiro).astype("datetime64[M]")
+    resultado = pd.DataFrame({"mes": mes.astype("datetime64[ns]"), "pago": pago, "a_pagar": a_pagar})
+    return resultado[(resultado["pago"] > 0) | (resultado["a_pagar"] > 0)].reset_index(drop=True)
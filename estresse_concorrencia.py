@@ -0,0 +1,145 @@
+"""Teste de estresse do controle otimista de concorrência (compare-and-swap).
+
+Várias threads escritoras disputam os mesmos gastos: cada uma lê a linha,
+incrementa parcelas_pagas e grava com a versão lida, repetindo quando há
+conflito; também inserem gastos novos com ids calculados sobre uma leitura
+possivelmente antiga. No final, a soma dos incrementos e o número de linhas
+precisam bater exatamente, ou seja, nenhuma atualização foi perdida.
+
+Com --atrasada, as escritas passam pela EscritaAtrasada, como no app: o
+compare-and-swap é feito contra a memória e as linhas vão para o disco a
+cada --intervalo segundos; a contagem final é lida do disco.
+
+    python estresse_concorrencia.py --formato csv --threads 16 --incrementos 50
+    python estresse_concorrencia.py --formato db --atrasada --intervalo 0.01
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from storage import COLUMNS, EscritaAtrasada, SqliteStorage, abrir_storage
+
+
+def _gasto(gasto_id: int) -> dict:
+    return {
+        "id": gasto_id,
+        "categoria": "Estresse",
+        "fornecedor": f"Fornecedor {gasto_id}",
+        "descricao": "",
+        "valor_total": 100_000,  # centavos
+        "entrada": 0,
+        "num_parcelas": 1_000_000,
+        "valor_parcela": 0,
+        "parcelas_pagas": 0,
+        "porcentagem_paga": 0.0,
+        "data_primeira_parcela": "2026-01-01",
+        "observacoes": "",
+        "versao": 0,
+    }
+
+
+def executar(path: Path, threads: int, incrementos: int, insercoes: int, linhas: int, seed: int,
+             intervalo: float = None) -> dict:
+    """Roda o estresse sobre um arquivo novo e retorna as contagens observadas.
+
+    Com intervalo, as escritas passam por uma EscritaAtrasada com esse intervalo.
+    """
+    storage = abrir_storage(path)
+    storage.salvar(pd.DataFrame([_gasto(i) for i in range(1, linhas + 1)], columns=COLUMNS))
+    # SQLite: uma conexão por thread, sem lock em Python (o CAS fica no banco).
+    # Arquivos e escrita atrasada: uma instância compartilhada e um lock curto
+    # por operação, como no app (na escrita atrasada, o mesmo do descarregamento).
+    lock = threading.RLock()
+    if intervalo is not None:
+        storage = EscritaAtrasada(storage, lock, intervalo)
+    por_conexao = isinstance(storage, SqliteStorage)
+    conflitos = [0] * threads
+    erros = []
+    largada = threading.Barrier(threads)
+
+    def operar(armazenamento, funcao):
+        if por_conexao:
+            return funcao(armazenamento)
+        with lock:
+            return funcao(armazenamento)
+
+    def escritor(indice: int) -> None:
+        armazenamento = SqliteStorage(path) if por_conexao else storage
+        rng = random.Random(seed + indice)
+        largada.wait()
+        try:
+            for _ in range(incrementos):
+                gasto_id = rng.randint(1, linhas)
+                while True:
+                    df = operar(armazenamento, lambda s: s.ler())
+                    atual = df[df["id"] == gasto_id].iloc[0].to_dict()
+                    novo = {**atual, "parcelas_pagas": int(atual["parcelas_pagas"]) + 1}
+                    _, relatorio = operar(armazenamento, lambda s: s.upsert([novo], [int(atual["versao"])]))
+                    if not relatorio:
+                        break
+                    conflitos[indice] += 1
+            for _ in range(insercoes):
+                df = operar(armazenamento, lambda s: s.ler())
+                novo = _gasto(int(df["id"].max()) + 1)
+                operar(armazenamento, lambda s: s.upsert([novo]))
+        except Exception as erro:  # noqa: BLE001 - reportado no resultado
+            erros.append(f"thread {indice}: {erro!r}")
+
+    inicio = time.perf_counter()
+    workers = [threading.Thread(target=escritor, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if intervalo is not None:
+        storage.descarregar()
+    duracao = time.perf_counter() - inicio
+
+    final = abrir_storage(path).ler()
+    return {
+        "incrementos_esperados": threads * incrementos,
+        "incrementos_gravados": int(final["parcelas_pagas"].sum()),
+        "linhas_esperadas": linhas + threads * insercoes,
+        "linhas_gravadas": len(final),
+        "ids_unicos": bool(final["id"].is_unique),
+        "conflitos": sum(conflitos),
+        "erros": erros,
+        "segundos": round(duracao, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estresse de escritas concorrentes com compare-and-swap.")
+    parser.add_argument("--formato", choices=["csv", "db", "parquet", "arrow"], default="csv")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--incrementos", type=int, default=50, help="incrementos por thread")
+    parser.add_argument("--insercoes", type=int, default=5, help="inserções por thread")
+    parser.add_argument("--linhas", type=int, default=8, help="gastos disputados (poucos = mais conflitos)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--atrasada", action="store_true", help="escreve pela EscritaAtrasada, como o app")
+    parser.add_argument("--intervalo", type=float, default=0.05, help="segundos entre descarregamentos (com --atrasada)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        resultado = executar(
+            Path(pasta) / f"estresse.{args.formato}",
+            args.threads, args.incrementos, args.insercoes, args.linhas, args.seed,
+            args.intervalo if args.atrasada else None,
+        )
+    for chave, valor in resultado.items():
+        print(f"{chave}: {valor}")
+
+    ok = (
+        not resultado["erros"]
+        and resultado["incrementos_gravados"] == resultado["incrementos_esperados"]
+        and resultado["linhas_gravadas"] == resultado["linhas_esperadas"]
+        and resultado["ids_unicos"]
+    )
+    print("OK: nenhuma atualização perdida." if ok else "FALHA: atualizações perdidas ou erros.")
+    sys.exit(0 if ok else 1)
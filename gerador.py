@@ -0,0 +1,82 @@
+"""Gerador de planos de casamento sintéticos para benchmarks e testes manuais.
+
+Os dados imitam um plano real: poucas categorias concentram a maior parte
+dos gastos, o número de parcelas mistura à vista com parcelamentos longos
+e os pagamentos estão em estágios diferentes. A mesma semente gera sempre
+o mesmo conjunto.
+
+    python gerador.py 10000 data/planos/teste.csv --seed 42
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage import COLUMNS, abrir_storage, tipos_internos, valor_pago
+
+# Categorias em ordem de frequência (distribuição tipo Zipf)
+CATEGORIAS = [
+    "Buffet", "Decoração", "Fotografia", "Música", "Vestido", "Flores", "Convites",
+    "Bolo e Doces", "Bebidas", "Local", "Filmagem", "Trajes", "Alianças",
+    "Lembrancinhas", "Cabelo e Maquiagem", "Transporte", "Lua de Mel", "Cerimonial",
+]
+# Número de parcelas e a probabilidade de cada um
+_PARCELAS = np.array([1, 2, 3, 4, 5, 6, 8, 10, 12, 18, 24])
+_PESOS_PARCELAS = np.array([30, 8, 10, 6, 6, 10, 4, 10, 10, 3, 3], dtype=float)
+_DESCRICOES = ["", "Contrato assinado", "Pacote completo", "Orçamento aprovado", "Sinal pago", "Inclui montagem"]
+_OBSERVACOES = ["", "", "", "Negociar desconto", "Confirmar data", "Pagar por PIX", "Reajuste anual"]
+
+
+def gerar_gastos(n: int, seed: int = 0) -> pd.DataFrame:
+    """n gastos sintéticos na representação do storage (centavos), gerados de forma vetorizada."""
+    rng = np.random.default_rng(seed)
+
+    pesos = 1.0 / np.arange(1, len(CATEGORIAS) + 1) ** 1.1
+    categoria = np.asarray(CATEGORIAS, dtype=object)[rng.choice(len(CATEGORIAS), n, p=pesos / pesos.sum())]
+    fornecedor = np.char.add("Fornecedor ", rng.integers(1, max(2, n // 4 + 2), n).astype(str))
+
+    # Valores (centavos): log-normal arredondada a R$ 10, entre R$ 50 e R$ 200 mil
+    valor_total = (np.clip(np.round(rng.lognormal(8.3, 1.1, n), -1), 50, 200_000) * 100).astype("int64")
+    tem_entrada = rng.random(n) < 0.4
+    entrada = np.where(tem_entrada, np.round(valor_total * rng.uniform(0.1, 0.3, n)), 0).astype("int64")
+    num_parcelas = rng.choice(_PARCELAS, n, p=_PESOS_PARCELAS / _PESOS_PARCELAS.sum())
+    valor_parcela = (valor_total - entrada) // num_parcelas
+
+    # Estágio do pagamento: não iniciado, em andamento ou quitado
+    estagio = rng.choice(3, n, p=[0.3, 0.5, 0.2])
+    parcelas_pagas = np.select(
+        [estagio == 0, estagio == 2],
+        [0, num_parcelas],
+        default=np.floor(rng.random(n) * num_parcelas).astype(int),
+    )
+    pago = valor_pago(entrada, parcelas_pagas, valor_parcela, num_parcelas, valor_total)
+    porcentagem = np.round(pago / valor_total * 100, 1)
+
+    inicio = np.datetime64("2025-01-01") + rng.integers(0, 900, n).astype("timedelta64[D]")
+    return tipos_internos(pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "categoria": categoria,
+        "fornecedor": fornecedor,
+        "descricao": np.asarray(_DESCRICOES, dtype=object)[rng.integers(0, len(_DESCRICOES), n)],
+        "valor_total": valor_total,
+        "entrada": entrada,
+        "num_parcelas": num_parcelas,
+        "valor_parcela": valor_parcela,
+        "parcelas_pagas": parcelas_pagas,
+        "porcentagem_paga": np.minimum(porcentagem, 100.0),
+        "data_primeira_parcela": inicio.astype(str),
+        "observacoes": np.asarray(_OBSERVACOES, dtype=object)[rng.integers(0, len(_OBSERVACOES), n)],
+        "versao": 0,
+    })[COLUMNS])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um plano sintético no formato do arquivo de destino.")
+    parser.add_argument("linhas", type=int)
+    parser.add_argument("destino", type=Path, help="arquivo de dados (CSV, SQLite, Parquet ou Arrow)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.destino.parent.mkdir(parents=True, exist_ok=True)
+    abrir_storage(args.destino).salvar(gerar_gastos(args.linhas, args.seed))
+    print(f"{args.linhas} gasto(s) gerado(s) em {args.destino}")
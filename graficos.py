@@ -0,0 +1,122 @@
+"""Especificações Vega-Lite dos gráficos da aba "Gráficos", montadas com o Altair.
+
+Os gráficos recebem tabelas já agregadas e pequenas: as categorias além de
+MAX_CATEGORIAS são somadas numa linha "Outros", então o tamanho do que vai
+ao navegador não cresce com o número de categorias. As especificações são
+dicts prontos para st.vega_lite_chart; quem as usa (app.py) guarda-as junto
+com os dados da aba, por versão dos dados, e o Altair só roda quando os
+dados mudam.
+"""
+import altair as alt
+import pandas as pd
+
+# Categorias mostradas individualmente; as demais viram uma linha "Outros"
+MAX_CATEGORIAS = 12
+
+# Cores do tema do app
+COR_PRINCIPAL = "#d48aa9"
+COR_SECUNDARIA = "#f1c6d6"
+
+
+def agrupar_cauda(por_categoria: pd.DataFrame, max_categorias: int = MAX_CATEGORIAS) -> pd.DataFrame:
+    """Categorias da maior para a menor por valor_total; além de max_categorias, uma linha com as somas.
+
+    Espera categoria e colunas numéricas somáveis (ex.: valor_total,
+    valor_pago, valor_restante). A linha da cauda se chama "Outros (n)",
+    com n categorias somadas.
+    """
+    ordenado = por_categoria.sort_values("valor_total", ascending=False, kind="stable", ignore_index=True)
+    if len(ordenado) <= max_categorias:
+        return ordenado
+    principais = ordenado.iloc[:max_categorias - 1]
+    cauda = ordenado.iloc[max_categorias - 1:]
+    outros = cauda.drop(columns="categoria").sum().to_frame().T.astype(cauda.dtypes.drop("categoria"))
+    outros.insert(0, "categoria", f"Outros ({len(cauda)})")
+    return pd.concat([principais, outros], ignore_index=True)
+
+
+def _spec(grafico: alt.Chart) -> dict:
+    spec = grafico.to_dict()
+    # Largura/altura fixas do tema padrão do Altair; o Streamlit ajusta ao contêiner
+    spec.pop("config", None)
+    return spec
+
+
+def grafico_totais(por_categoria: pd.DataFrame) -> dict:
+    """Barras do valor total (reais) por categoria, da maior para a menor."""
+    return _spec(
+        alt.Chart(por_categoria[["categoria", "valor_total"]])
+        .mark_bar(color=COR_PRINCIPAL)
+        .encode(
+            x=alt.X("categoria:N", sort="-y", title=None),
+            y=alt.Y("valor_total:Q", title="Total (R$)"),
+            tooltip=[
+                alt.Tooltip("categoria:N", title="Categoria"),
+                alt.Tooltip("valor_total:Q", title="Total (R$)", format=",.2f"),
+            ],
+        )
+    )
+
+
+def grafico_progresso(por_categoria: pd.DataFrame) -> dict:
+    """Barras horizontais do percentual pago por categoria (0 a 100)."""
+    return _spec(
+        alt.Chart(por_categoria[["categoria", "progresso_percentual"]])
+        .mark_bar(color=COR_PRINCIPAL)
+        .encode(
+            x=alt.X("progresso_percentual:Q", title="Pago (%)", scale=alt.Scale(domain=[0, 100])),
+            y=alt.Y("categoria:N", sort="-x", title=None),
+            tooltip=[
+                alt.Tooltip("categoria:N", title="Categoria"),
+                alt.Tooltip("progresso_percentual:Q", title="Pago (%)", format=".1f"),
+            ],
+        )
+    )
+
+
+def grafico_fluxo(fluxo: pd.DataFrame) -> dict:
+    """Barras empilhadas do valor pago e a pagar (reais) por mês."""
+    return _spec(
+        alt.Chart(fluxo[["mes", "pago", "a_pagar"]])
+        .transform_fold(["pago", "a_pagar"], as_=["situacao", "valor"])
+        .transform_calculate(situacao="datum.situacao == 'pago' ? 'Pago' : 'A pagar'")
+        .mark_bar()
+        .encode(
+            x=alt.X("yearmonth(mes):O", title=None),
+            y=alt.Y("sum(valor):Q", title="Valor (R$)"),
+            color=alt.Color(
+                "situacao:N",
+                title=None,
+                scale=alt.Scale(domain=["Pago", "A pagar"], range=[COR_PRINCIPAL, COR_SECUNDARIA]),
+            ),
+            tooltip=[
+                alt.Tooltip("yearmonth(mes):O", title="Mês"),
+                alt.Tooltip("situacao:N", title="Situação"),
+                alt.Tooltip("sum(valor):Q", title="Valor (R$)", format=",.2f"),
+            ],
+        )
+    )
+
+
+def grafico_evolucao(serie: pd.DataFrame) -> dict:
+    """Linhas do planejado e do pago (reais) ao longo do tempo (série de historico.tendencia)."""
+    return _spec(
+        alt.Chart(serie[["dia", "planejado", "pago"]])
+        .transform_fold(["planejado", "pago"], as_=["serie", "valor"])
+        .transform_calculate(serie="datum.serie == 'pago' ? 'Pago' : 'Planejado'")
+        .mark_line(interpolate="step-after")
+        .encode(
+            x=alt.X("dia:T", title=None),
+            y=alt.Y("valor:Q", title="Valor (R$)"),
+            color=alt.Color(
+                "serie:N",
+                title=None,
+                scale=alt.Scale(domain=["Pago", "Planejado"], range=[COR_PRINCIPAL, COR_SECUNDARIA]),
+            ),
+            tooltip=[
+                alt.Tooltip("dia:T", title="Dia", format="%d/%m/%Y"),
+                alt.Tooltip("serie:N", title="Série"),
+                alt.Tooltip("valor:Q", title="Valor (R$)", format=",.2f"),
+            ],
+        )
+    )
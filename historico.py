@@ -0,0 +1,269 @@
+"""Histórico diário dos totais do plano (planejado e pago, geral e por categoria).
+
+Um registro por dia em que algo mudou: uma linha com os totais gerais
+(categoria nula) e uma por categoria, em centavos. Fica em arquivos
+Parquet por mês ao lado dos dados (<plano>.historico/AAAA-MM.parquet); uma
+gravação reescreve só o mês corrente. O que veio antes do primeiro
+registro pode ser preenchido pelo livro de pagamentos (dias com eventos)
+e, antes dele, estimado pelo cronograma: cada gasto conta a partir da
+data da primeira parcela, com a entrada paga nesse dia e cada parcela
+paga no vencimento.
+
+    python historico.py data/gastos.csv --preencher
+"""
+import argparse
+import os
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from agregados import Agregados
+from cronograma import expandir_parcelas
+from livro import CRIACAO, EDICAO, PARCELA_PAGA, REMOCAO, SUBSTITUICAO
+from storage import abrir_storage, adotar_lateral, em_reais
+
+# Pontos da série de tendência; períodos mais longos são reamostrados
+MAX_PONTOS = 400
+
+ORIGEM_REGISTRO = "registro"      # gravado pelo app no dia
+ORIGEM_LIVRO = "livro"            # reconstruído dos eventos do livro de pagamentos
+ORIGEM_CRONOGRAMA = "cronograma"  # estimado pelas datas das parcelas
+
+SCHEMA = pa.schema([
+    pa.field("dia", pa.date32()),
+    pa.field("categoria", pa.string()),  # nula na linha dos totais gerais
+    pa.field("valor_total", pa.int64()),
+    pa.field("valor_pago", pa.int64()),
+    pa.field("origem", pa.string()),
+])
+
+_COLUNAS = SCHEMA.names
+
+
+def _vazio() -> pd.DataFrame:
+    return SCHEMA.empty_table().to_pandas()
+
+
+def _linhas_agregados(dia: date, agregados: Agregados, origem: str) -> pd.DataFrame:
+    """Linhas de um dia: totais gerais e somas por categoria."""
+    categorias = sorted(agregados.categorias.items())
+    return pd.DataFrame({
+        "dia": [dia] * (len(categorias) + 1),
+        "categoria": [None] + [cat for cat, _ in categorias],
+        "valor_total": [agregados.total_planejado] + [total for _, (total, _, _) in categorias],
+        "valor_pago": [agregados.total_pago] + [pago for _, (_, pago, _) in categorias],
+        "origem": origem,
+    })
+
+
+def _dias_do_cronograma(df: pd.DataFrame, hoje: date = None) -> pd.DataFrame:
+    """Estimativa diária pelo cronograma: gastos a partir da primeira parcela, parcelas pagas no vencimento.
+
+    Datas futuras (parcelas adiantadas) contam como pagas hoje.
+    """
+    hoje = np.datetime64(hoje or date.today(), "D")
+    inicio = pd.to_datetime(df["data_primeira_parcela"], errors="coerce").to_numpy("datetime64[D]")
+    inicio = np.where(np.isnat(inicio) | (inicio > hoje), hoje, inicio)
+    categoria = df["categoria"].astype(str).to_numpy()
+
+    parcelas = expandir_parcelas(df)
+    pagas = parcelas[parcelas["paga"].to_numpy()]
+    posicao = pd.Index(df["id"]).get_indexer(pagas["id"])
+    vencimento = pagas["vencimento"].to_numpy().astype("datetime64[D]")
+    vencimento = np.where(np.isnat(vencimento) | (vencimento > hoje), hoje, vencimento)
+
+    mudancas = pd.DataFrame({
+        "dia": np.concatenate([inicio, vencimento]),
+        "categoria": np.concatenate([categoria, categoria[posicao]]),
+        "valor_total": np.concatenate([df["valor_total"].to_numpy("int64"), np.zeros(len(pagas), "int64")]),
+        "valor_pago": np.concatenate([df["entrada"].to_numpy("int64"), pagas["valor"].to_numpy("int64")]),
+    })
+    if mudancas.empty:
+        return _vazio()
+    # Dia x categoria, acumulado ao longo dos dias
+    acumulado = {
+        coluna: mudancas.pivot_table(index="dia", columns="categoria", values=coluna, aggfunc="sum", fill_value=0)
+        .cumsum()
+        for coluna in ("valor_total", "valor_pago")
+    }
+    existe = mudancas.pivot_table(index="dia", columns="categoria", values="valor_total", aggfunc="size", fill_value=0).cumsum() > 0
+    por_categoria = pd.DataFrame({
+        "valor_total": acumulado["valor_total"].stack(),
+        "valor_pago": acumulado["valor_pago"].stack(),
+        "existe": existe.stack(),
+    })
+    por_categoria = por_categoria[por_categoria.pop("existe")].reset_index()
+    totais = pd.DataFrame({
+        "valor_total": acumulado["valor_total"].sum(axis=1),
+        "valor_pago": acumulado["valor_pago"].sum(axis=1),
+    }).reset_index().assign(categoria=None)
+    linhas = pd.concat([totais, por_categoria], ignore_index=True).assign(origem=ORIGEM_CRONOGRAMA)
+    linhas["dia"] = pd.to_datetime(linhas["dia"]).dt.date
+    return linhas.sort_values(["dia", "categoria"], na_position="first", kind="stable", ignore_index=True)[_COLUNAS]
+
+
+def _dias_do_livro(livro) -> pd.DataFrame:
+    """Totais no fim de cada dia com eventos, reaplicando o livro desde o primeiro snapshot."""
+    if not livro.iniciado():
+        return _vazio()
+    primeiro = livro.snapshots[0]
+    snapshots = {s["seq"]: s for s in livro.snapshots}
+    df = livro.ler_snapshot(primeiro)
+    agregados = Agregados.calcular(df)
+    gastos = {gasto["id"]: gasto for gasto in df.to_dict("records")}
+    partes = []
+    dia = primeiro["ts"][:10]
+    for evento in livro.eventos():
+        if evento["ts"][:10] != dia:
+            partes.append(_linhas_agregados(date.fromisoformat(dia), agregados, ORIGEM_LIVRO))
+            dia = evento["ts"][:10]
+        tipo, id_ = evento["tipo"], evento.get("id")
+        anterior = gastos.get(id_)
+        if tipo in (CRIACAO, EDICAO):
+            novo = evento["linha"]
+        elif tipo == PARCELA_PAGA and anterior is not None:
+            novo = {**anterior, "parcelas_pagas": evento["parcela"], "porcentagem_paga": evento["porcentagem_paga"]}
+        elif tipo == REMOCAO:
+            novo = None
+        elif tipo == SUBSTITUICAO:
+            df = livro.ler_snapshot(snapshots[evento["seq"]])
+            agregados = Agregados.calcular(df)
+            gastos = {gasto["id"]: gasto for gasto in df.to_dict("records")}
+            continue
+        else:
+            continue  # entrada paga: já contada no gasto criado
+        agregados.aplicar(anterior, novo)
+        if novo is None:
+            gastos.pop(id_, None)
+        else:
+            gastos[id_] = novo
+    partes.append(_linhas_agregados(date.fromisoformat(dia), agregados, ORIGEM_LIVRO))
+    return pd.concat(partes, ignore_index=True)
+
+
+class Historico:
+    """Registros diários de um plano, carregados inteiros na primeira consulta (são pequenos)."""
+
+    def __init__(self, data_path: Path):
+        data_path = Path(data_path)
+        self.diretorio = adotar_lateral(data_path, ".historico")
+        self._df = None
+        self.preenchido = False  # preencher() já rodou neste objeto
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            arquivos = sorted(self.diretorio.glob("*.parquet")) if self.diretorio.exists() else []
+            tabelas = [pq.read_table(a, schema=SCHEMA) for a in arquivos]
+            self._df = pa.concat_tables(tabelas).to_pandas() if tabelas else _vazio()
+        return self._df
+
+    def vazio(self) -> bool:
+        return self.df.empty
+
+    def _gravar_mes(self, mes: str) -> None:
+        """Reescreve o arquivo do mês (AAAA-MM) a partir dos registros em memória, de forma atômica."""
+        df = self.df
+        linhas = df[pd.to_datetime(df["dia"]).dt.strftime("%Y-%m") == mes]
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        path = self.diretorio / f"{mes}.parquet"
+        tmp_path = path.with_name(path.name + ".tmp")
+        pq.write_table(pa.Table.from_pandas(linhas, schema=SCHEMA, preserve_index=False), tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _substituir(self, novas: pd.DataFrame, dias) -> None:
+        df = self.df
+        restantes = df[~df["dia"].isin(set(dias))]
+        self._df = (
+            pd.concat([restantes, novas], ignore_index=True)
+            .sort_values("dia", kind="stable", ignore_index=True)
+        )
+
+    def registrar(self, dia: date, agregados: Agregados) -> bool:
+        """Grava os totais do dia (substituindo os do mesmo dia); False se nada mudou."""
+        novas = _linhas_agregados(dia, agregados, ORIGEM_REGISTRO)
+        atuais = self.df[self.df["dia"] == dia]
+        if len(atuais) == len(novas) and (
+            atuais[["categoria", "valor_total", "valor_pago"]].reset_index(drop=True)
+            .equals(novas[["categoria", "valor_total", "valor_pago"]])
+        ):
+            return False
+        self._substituir(novas, [dia])
+        self._gravar_mes(dia.strftime("%Y-%m"))
+        return True
+
+    def preencher(self, df: pd.DataFrame, livro=None, hoje: date = None) -> int:
+        """Preenche os dias anteriores ao primeiro registro; retorna quantos dias foram acrescentados.
+
+        Dias com eventos no livro vêm dele; os anteriores ao livro, do
+        cronograma da tabela atual (df).
+        """
+        hoje = hoje or date.today()
+        self.preenchido = True
+        limite = self.df["dia"].min() if not self.vazio() else hoje
+        do_livro = _dias_do_livro(livro) if livro is not None else _vazio()
+        do_livro = do_livro[do_livro["dia"] < limite]
+        if not do_livro.empty:
+            limite = do_livro["dia"].min()
+        do_cronograma = _dias_do_cronograma(df, hoje)
+        do_cronograma = do_cronograma[do_cronograma["dia"] < limite]
+        partes = [d for d in (do_cronograma, do_livro) if not d.empty]
+        if not partes:
+            return 0
+        novas = pd.concat(partes, ignore_index=True)
+        self._substituir(novas, novas["dia"].unique())
+        for mes in sorted(set(pd.to_datetime(novas["dia"]).dt.strftime("%Y-%m"))):
+            self._gravar_mes(mes)
+        return int(novas["dia"].nunique())
+
+    def tendencia(self, inicio: date = None, fim: date = None, pontos: int = MAX_PONTOS) -> pd.DataFrame:
+        """Planejado e pago (reais) e progresso (%) ao longo do período, com no máximo `pontos` pontos.
+
+        Cada ponto é o último registro até o fim do seu intervalo (os dias
+        sem registro repetem o anterior); períodos longos usam intervalos
+        de vários dias.
+        """
+        totais = self.df[self.df["categoria"].isna()]
+        if totais.empty:
+            return pd.DataFrame({"dia": pd.Series(dtype="datetime64[ns]"), "planejado": [], "pago": [], "progresso": []})
+        dias = totais["dia"].to_numpy("datetime64[D]")
+        inicio = np.datetime64(inicio or totais["dia"].iloc[0], "D")
+        fim = np.datetime64(fim or date.today(), "D")
+        inicio = max(inicio, dias[0])
+        if fim < inicio:
+            fim = inicio
+        n_dias = int((fim - inicio).astype("int64")) + 1
+        passo = -(-n_dias // pontos)
+        pontos_dias = np.minimum(inicio + np.arange(passo - 1, n_dias + passo - 1, passo), fim)
+        posicao = np.searchsorted(dias, pontos_dias, side="right") - 1
+        planejado = totais["valor_total"].to_numpy("int64")[posicao]
+        pago = totais["valor_pago"].to_numpy("int64")[posicao]
+        return em_reais(pd.DataFrame({
+            "dia": pontos_dias.astype("datetime64[ns]"),
+            "planejado": planejado,
+            "pago": pago,
+            "progresso": np.where(planejado > 0, pago / np.maximum(planejado, 1) * 100, 0.0).round(1),
+        }), ["planejado", "pago"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Histórico diário dos totais de um plano.")
+    parser.add_argument("dados", type=Path, help="arquivo de dados do plano")
+    parser.add_argument("--preencher", action="store_true", help="preenche os dias anteriores pelo livro e pelo cronograma")
+    args = parser.parse_args()
+
+    from livro import Livro
+
+    historico = Historico(args.dados)
+    if args.preencher:
+        livro = Livro(args.dados)
+        dias = historico.preencher(abrir_storage(args.dados).ler(), livro if livro.iniciado() else None)
+        print(f"{dias} dia(s) preenchido(s)")
+    serie = historico.tendencia(pontos=12)
+    print(serie.to_string(index=False) if not serie.empty else "Histórico vazio.")
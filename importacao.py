@@ -0,0 +1,181 @@
+"""Importação em massa de gastos a partir de planilhas CSV ou XLSX.
+
+A planilha é lida em blocos de TAMANHO_BLOCO linhas, de modo que a memória
+usada não depende do tamanho do arquivo. Cada bloco é validado com as
+regras do formulário (vetorizadas), tem os valores passados para centavos,
+recebe valor_parcela, porcentagem_paga e ids como o formulário faria, e as
+linhas válidas são gravadas numa única escrita por bloco. As linhas
+inválidas vão para um relatório de erros.
+
+    python importacao.py planilha.xlsx data/gastos.csv --erros erros.csv
+"""
+import argparse
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from nucleo import calcular_parcelas, validar_gastos
+from storage import COLUMNS, abrir_storage, para_centavos
+
+# Linhas da planilha lidas e gravadas por vez
+TAMANHO_BLOCO = 50_000
+
+COLUNAS_OBRIGATORIAS = ["categoria", "fornecedor", "valor_total"]
+
+# Colunas opcionais e o valor usado quando vêm vazias (como no formulário)
+_PADROES = {
+    "descricao": "",
+    "entrada": 0.0,
+    "num_parcelas": 1,
+    "parcelas_pagas": 0,
+    "data_primeira_parcela": None,  # data da importação
+    "observacoes": "",
+}
+
+_NUMERICAS = ["valor_total", "entrada", "num_parcelas", "parcelas_pagas"]
+_TEXTOS = ["categoria", "fornecedor", "descricao", "observacoes"]
+
+
+def _blocos_xlsx(fonte, tamanho_bloco: int):
+    # openpyxl só é necessário para planilhas XLSX
+    from openpyxl import load_workbook
+
+    planilha = load_workbook(fonte, read_only=True, data_only=True)
+    try:
+        linhas = planilha.active.iter_rows(values_only=True)
+        cabecalho = [str(c) if c is not None else "" for c in next(linhas, ())]
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha)
+            if len(bloco) == tamanho_bloco:
+                yield pd.DataFrame(bloco, columns=cabecalho)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=cabecalho)
+    finally:
+        planilha.close()
+
+
+def ler_blocos(fonte, nome: str, tamanho_bloco: int = TAMANHO_BLOCO):
+    """Blocos de linhas da planilha (fonte: caminho ou arquivo aberto), sem conversão de tipos."""
+    if Path(nome).suffix.lower() in (".xlsx", ".xlsm"):
+        yield from _blocos_xlsx(fonte, tamanho_bloco)
+    else:
+        yield from pd.read_csv(fonte, dtype=str, keep_default_na=False, chunksize=tamanho_bloco)
+
+
+def preparar_bloco(bruto: pd.DataFrame, primeira_linha: int, hoje: date = None):
+    """Converte e valida um bloco; retorna (gastos válidos sem id, erros).
+
+    erros tem uma linha por problema: linha (na planilha, contando o
+    cabeçalho como linha 1) e erro.
+    """
+    bruto = bruto.rename(columns=lambda c: str(c).strip().lower())
+    faltando = [c for c in COLUNAS_OBRIGATORIAS if c not in bruto.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes na planilha: {', '.join(faltando)}")
+
+    n = len(bruto)
+    gastos = {}
+    problemas = []  # (posicoes, erro)
+    for coluna in _TEXTOS:
+        valores = bruto[coluna] if coluna in bruto.columns else pd.Series(_PADROES.get(coluna, ""), index=bruto.index)
+        gastos[coluna] = valores.fillna("").astype(str).str.strip()
+
+    for coluna in _NUMERICAS:
+        if coluna not in bruto.columns:
+            gastos[coluna] = pd.Series(_PADROES[coluna], index=bruto.index)
+            continue
+        texto = bruto[coluna].astype(str).str.strip().where(bruto[coluna].notna(), "")
+        numeros = pd.to_numeric(bruto[coluna], errors="coerce")
+        invalidos = numeros.isna() & (texto != "")
+        problemas.append((np.flatnonzero(invalidos.to_numpy()), f"{coluna}: valor não numérico."))
+        gastos[coluna] = numeros.fillna(_PADROES.get(coluna, 0.0))
+
+    if "data_primeira_parcela" in bruto.columns:
+        texto = bruto["data_primeira_parcela"].astype(str).str.strip().where(bruto["data_primeira_parcela"].notna(), "")
+        valores = bruto["data_primeira_parcela"].where(texto != "")
+        # ISO (2026-03-15) ou o formato brasileiro (15/03/2026)
+        datas = pd.to_datetime(valores, errors="coerce", format="ISO8601")
+        datas = datas.fillna(pd.to_datetime(valores.where(datas.isna()), errors="coerce", format="%d/%m/%Y"))
+        problemas.append((np.flatnonzero((datas.isna() & (texto != "")).to_numpy()), "data_primeira_parcela: data inválida."))
+    else:
+        datas = pd.Series(pd.NaT, index=bruto.index, dtype="datetime64[ns]")
+    gastos["data_primeira_parcela"] = datas.dt.strftime("%Y-%m-%d").fillna((hoje or date.today()).isoformat())
+
+    gastos = pd.DataFrame(gastos).reset_index(drop=True)
+    num_parcelas, parcelas_pagas = gastos["num_parcelas"], gastos["parcelas_pagas"]
+    problemas += [
+        (np.flatnonzero(((num_parcelas < 1) | (num_parcelas % 1 != 0)).to_numpy()),
+         "num_parcelas: deve ser um inteiro maior ou igual a 1."),
+        (np.flatnonzero(((parcelas_pagas < 0) | (parcelas_pagas > num_parcelas) | (parcelas_pagas % 1 != 0)).to_numpy()),
+         "parcelas_pagas: deve ser um inteiro entre 0 e num_parcelas."),
+        (np.flatnonzero((gastos["entrada"] < 0).to_numpy()), "entrada: não pode ser negativa."),
+    ]
+    validacao = validar_gastos(gastos)
+    problemas.append((validacao["posicao"].to_numpy(), validacao["erro"].to_numpy()))
+
+    erros = pd.concat(
+        [pd.DataFrame({"posicao": posicoes, "erro": erro}) for posicoes, erro in problemas],
+        ignore_index=True,
+    ).sort_values("posicao", kind="stable", ignore_index=True)
+    validos = np.ones(n, dtype=bool)
+    validos[erros["posicao"].to_numpy(dtype="int64")] = False
+
+    gastos = gastos[validos].astype({"num_parcelas": "int32", "parcelas_pagas": "int32"})
+    # A planilha traz reais; daqui em diante, centavos
+    gastos = gastos.assign(valor_total=para_centavos(gastos["valor_total"]), entrada=para_centavos(gastos["entrada"]))
+    erros = pd.DataFrame({"linha": erros["posicao"].to_numpy() + primeira_linha, "erro": erros["erro"]})
+    return calcular_parcelas(gastos).reset_index(drop=True), erros
+
+
+def importar(blocos, gravar, proximo_id: int, hoje: date = None):
+    """Prepara cada bloco, numera os gastos a partir de proximo_id e chama gravar(bloco).
+
+    gravar recebe um DataFrame com as colunas do storage, deve fazer uma
+    única escrita e retornar as linhas gravadas: o storage troca os ids que
+    outra escrita ocupou no meio tempo, e o bloco seguinte é numerado a
+    partir do maior id gravado. Retorna (quantidade importada, relatório de erros).
+    """
+    importados = 0
+    relatorios = []
+    primeira_linha = 2  # linha 1 é o cabeçalho
+    for bruto in blocos:
+        gastos, erros = preparar_bloco(bruto, primeira_linha, hoje)
+        primeira_linha += len(bruto)
+        if not erros.empty:
+            relatorios.append(erros)
+        if gastos.empty:
+            continue
+        gastos = gastos.assign(id=np.arange(proximo_id, proximo_id + len(gastos)), versao=0)[COLUMNS]
+        gravadas = gravar(gastos)
+        proximo_id = max(proximo_id + len(gastos), max((linha["id"] for linha in gravadas), default=0) + 1)
+        importados += len(gastos)
+    relatorio = pd.concat(relatorios, ignore_index=True) if relatorios else pd.DataFrame(columns=["linha", "erro"])
+    return importados, relatorio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa gastos de uma planilha CSV/XLSX em blocos.")
+    parser.add_argument("planilha", type=Path)
+    parser.add_argument("destino", type=Path, help="arquivo de dados (CSV, SQLite, Parquet ou Arrow)")
+    parser.add_argument("--bloco", type=int, default=TAMANHO_BLOCO, help="linhas por bloco")
+    parser.add_argument("--erros", type=Path, help="grava o relatório de erros neste CSV")
+    args = parser.parse_args()
+
+    storage = abrir_storage(args.destino)
+    atual = storage.ler()
+    # Os blocos vão para o journal, compactado uma vez no fim
+    with storage.lote():
+        importados, relatorio = importar(
+            ler_blocos(args.planilha, args.planilha.name, args.bloco),
+            lambda gastos: storage.upsert(gastos.to_dict("records"))[0],
+            1 if atual.empty else int(atual["id"].max()) + 1,
+        )
+    print(f"{importados} gasto(s) importado(s), {relatorio['linha'].nunique()} linha(s) com erro.")
+    if args.erros is not None:
+        relatorio.to_csv(args.erros, index=False)
+    elif not relatorio.empty:
+        print(relatorio.head(20).to_string(index=False))
@@ -0,0 +1,421 @@
+"""Índices dos filtros e da busca da aba "Nossos Gastos", mantidos incrementalmente.
+
+Montados uma vez por versão dos dados: para cada categoria, as posições das
+suas linhas na tabela (em ordem crescente); para cada status, um bitmap
+(array booleano) sobre as linhas. Um filtro combinado consulta o bitmap só
+nas posições da categoria, com custo proporcional ao resultado e não à
+tabela. Inserções e edições ajustam os índices, como ajustam os agregados,
+sem reconstruí-los.
+
+A busca por texto (IndiceBusca) é um índice invertido de fornecedor,
+descrição e observações, sem acentos e sem diferenciar maiúsculas. Como os
+textos se repetem muito (são categorias), o índice é de dois níveis:
+termo -> textos que o contêm, e, por campo, o texto de cada linha.
+"""
+import bisect
+import itertools
+import math
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from agregados import status_gasto
+from storage import (
+    STATUS_COMPLETO,
+    STATUS_EM_ANDAMENTO,
+    STATUS_NAO_INICIADO,
+    STATUS_OUTRO,
+    mascara_status,
+)
+
+_STATUS = (STATUS_NAO_INICIADO, STATUS_COMPLETO, STATUS_EM_ANDAMENTO, STATUS_OUTRO)
+
+_VAZIO = np.empty(0, dtype=np.int64)
+
+# Campos da busca e o peso de um termo encontrado em cada um
+CAMPOS_BUSCA = {"fornecedor": 3.0, "descricao": 2.0, "observacoes": 1.0}
+
+# Peso de um termo que só começa com a palavra buscada (o exato vale 1)
+PESO_PREFIXO = 0.5
+
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+# Estimativa (bytes) de um item nos dicionários e conjuntos da busca, somada ao
+# tamanho do texto ou termo, para memoria()
+_BYTES_POR_ENTRADA = 100
+
+
+def _categoria(gasto: dict) -> str:
+    categoria = gasto["categoria"]
+    return "" if pd.isna(categoria) else str(categoria)
+
+
+def _ampliar(valores: np.ndarray, capacidade: int) -> np.ndarray:
+    ampliado = np.zeros(capacidade, dtype=valores.dtype)
+    ampliado[:len(valores)] = valores
+    return ampliado
+
+
+class _IndicePosicoes:
+    """Base dos índices por posição: o id de cada linha e a busca da posição pelo id.
+
+    As posições são as do DataFrame de load_data(): edições mantêm a linha
+    no lugar e inserções vão para o fim, como nos storages.
+    """
+
+    def __init__(self, capacidade: int = 0):
+        self.n = 0  # linhas indexadas
+        # Arrays com folga no fim, para inserções em O(1) amortizado
+        self._ids = np.zeros(capacidade, dtype=np.int64)  # id da linha em cada posição
+        self._crescentes = True  # ids em ordem crescente: busca binária por id
+
+    def _ampliar_arrays(self, capacidade: int) -> None:
+        """Amplia os arrays por posição das subclasses."""
+
+    def _reservar(self, n: int) -> None:
+        if n <= len(self._ids):
+            return
+        capacidade = max(n, 2 * len(self._ids), 16)
+        self._ids = _ampliar(self._ids, capacidade)
+        self._ampliar_arrays(capacidade)
+
+    def _acrescentar_ids(self, ids: np.ndarray) -> int:
+        """Reserva e numera as posições de novas linhas no fim; retorna a primeira."""
+        inicio = self.n
+        self._reservar(inicio + len(ids))
+        self.n += len(ids)
+        self._crescentes = self._crescentes and bool(np.all(ids[1:] > ids[:-1])) and (
+            inicio == 0 or len(ids) == 0 or ids[0] > self._ids[inicio - 1]
+        )
+        self._ids[inicio:self.n] = ids
+        return inicio
+
+    def _posicao(self, id_) -> int:
+        """Posição da linha com o id, ou None."""
+        ids = self._ids[:self.n]
+        if self._crescentes:
+            i = int(np.searchsorted(ids, id_))
+            return i if i < self.n and ids[i] == id_ else None
+        encontradas = np.flatnonzero(ids == id_)
+        return int(encontradas[0]) if len(encontradas) else None
+
+    def _remover_posicao(self, posicao: int) -> None:
+        self.n -= 1
+        self._ids[posicao:self.n] = self._ids[posicao + 1:self.n + 1]
+
+    def confere(self, ids: np.ndarray, posicoes=None) -> bool:
+        """Confere, nas posições dadas, se a tabela (seus ids em ordem) é a indexada."""
+        if len(ids) != self.n:
+            return False
+        return posicoes is None or np.array_equal(ids[posicoes], self._ids[posicoes])
+
+
+class IndiceFiltros(_IndicePosicoes):
+    """Posições por categoria e bitmaps por status das linhas de uma tabela de gastos."""
+
+    def __init__(self, capacidade: int = 0):
+        super().__init__(capacidade)
+        self.categorias = {}  # categoria -> posições (int64, crescentes)
+        self._bitmaps = {s: np.zeros(capacidade, dtype=bool) for s in _STATUS}
+        self._posicoes_status = {}  # status -> posições, calculadas na primeira consulta
+
+    @classmethod
+    def construir(cls, df: pd.DataFrame) -> "IndiceFiltros":
+        """Índices completos de uma tabela de gastos."""
+        n = len(df)
+        ind = cls(n)
+        ind.n = n
+        ids = df["id"].to_numpy(dtype=np.int64)
+        ind._ids[:] = ids
+        ind._crescentes = bool(np.all(ids[1:] > ids[:-1]))
+        if n:
+            grupos = df.groupby("categoria", observed=True, sort=False).indices
+            ind.categorias = {str(cat): posicoes.astype(np.int64) for cat, posicoes in grupos.items()}
+        porcentagem = df["porcentagem_paga"]
+        outro = np.ones(n, dtype=bool)
+        for status in (STATUS_NAO_INICIADO, STATUS_COMPLETO, STATUS_EM_ANDAMENTO):
+            bitmap = mascara_status(porcentagem, status).to_numpy(dtype=bool)
+            ind._bitmaps[status][:] = bitmap
+            outro &= ~bitmap
+        ind._bitmaps[STATUS_OUTRO][:] = outro
+        return ind
+
+    def _ampliar_arrays(self, capacidade: int) -> None:
+        self._bitmaps = {s: _ampliar(bitmap, capacidade) for s, bitmap in self._bitmaps.items()}
+
+    def _tirar_categoria(self, categoria: str, posicao: int) -> None:
+        posicoes = self.categorias.get(categoria, _VAZIO)
+        i = np.searchsorted(posicoes, posicao)
+        if i < len(posicoes) and posicoes[i] == posicao:
+            posicoes = np.delete(posicoes, i)
+            if len(posicoes):
+                self.categorias[categoria] = posicoes
+            else:
+                del self.categorias[categoria]
+
+    def _por_categoria(self, categoria: str, posicao: int) -> None:
+        posicoes = self.categorias.get(categoria, _VAZIO)
+        self.categorias[categoria] = np.insert(posicoes, np.searchsorted(posicoes, posicao), posicao)
+
+    def _marcar_status(self, posicao: int, gasto: dict) -> None:
+        for bitmap in self._bitmaps.values():
+            bitmap[posicao] = False
+        self._bitmaps[status_gasto(gasto["porcentagem_paga"])][posicao] = True
+
+    def aplicar(self, anterior: dict = None, novo: dict = None) -> None:
+        """Ajusta os índices para a troca de um gasto (None = não existia / removido).
+
+        Edições e inserções custam o tamanho da categoria envolvida; uma
+        remoção renumera as posições seguintes e custa o tamanho da tabela.
+        """
+        self._posicoes_status.clear()
+        if anterior is None:
+            if novo is None:
+                return
+            posicao = self._acrescentar_ids(np.array([novo["id"]], dtype=np.int64))
+            self._por_categoria(_categoria(novo), posicao)
+            self._marcar_status(posicao, novo)
+            return
+
+        posicao = self._posicao(anterior["id"])
+        if posicao is None:
+            return
+        if novo is None:
+            self._remover(posicao, _categoria(anterior))
+            return
+        if _categoria(novo) != _categoria(anterior):
+            self._tirar_categoria(_categoria(anterior), posicao)
+            self._por_categoria(_categoria(novo), posicao)
+        self._marcar_status(posicao, novo)
+
+    def _remover(self, posicao: int, categoria: str) -> None:
+        self._tirar_categoria(categoria, posicao)
+        self._remover_posicao(posicao)
+        for bitmap in self._bitmaps.values():
+            bitmap[posicao:self.n] = bitmap[posicao + 1:self.n + 1]
+            bitmap[self.n] = False
+        for cat, posicoes in self.categorias.items():
+            self.categorias[cat] = posicoes - (posicoes > posicao)
+
+    def incorporar(self, df: pd.DataFrame) -> None:
+        """Acrescenta ao fim as linhas de uma tabela que ainda não estavam indexadas (ex.: importação)."""
+        self._posicoes_status.clear()
+        novo = IndiceFiltros.construir(df)
+        inicio = self._acrescentar_ids(novo._ids[:novo.n])
+        for status, bitmap in novo._bitmaps.items():
+            self._bitmaps[status][inicio:self.n] = bitmap
+        for categoria, posicoes in novo.categorias.items():
+            self.categorias[categoria] = np.concatenate([self.categorias.get(categoria, _VAZIO), inicio + posicoes])
+
+    def _posicoes_de(self, status: str) -> np.ndarray:
+        posicoes = self._posicoes_status.get(status)
+        if posicoes is None:
+            posicoes = np.flatnonzero(self._bitmaps[status][:self.n])
+            self._posicoes_status[status] = posicoes
+        return posicoes
+
+    def filtrar(self, categoria: str = None, status: str = None):
+        """Posições das linhas da categoria e/ou do status, em ordem; None sem filtro."""
+        if categoria is None:
+            return None if status is None else self._posicoes_de(status)
+        posicoes = self.categorias.get(categoria, _VAZIO)
+        if status is not None:
+            posicoes = posicoes[self._bitmaps[status][posicoes]]
+        return posicoes
+
+    def nomes_categorias(self) -> list:
+        return sorted(self.categorias)
+
+    def memoria(self) -> int:
+        """Bytes dos arrays (sem contar os dicionários)."""
+        arrays = [self._ids, *self._bitmaps.values(), *self.categorias.values(), *self._posicoes_status.values()]
+        return sum(a.nbytes for a in arrays)
+
+
+def termos(texto: str) -> list:
+    """Palavras do texto sem acentos, em minúsculas ("Flôr & Cia." -> ["flor", "cia"])."""
+    sem_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return _PALAVRA.findall(sem_acentos.lower())
+
+
+class IndiceBusca(_IndicePosicoes):
+    """Índice invertido de fornecedor, descrição e observações das linhas de uma tabela de gastos.
+
+    Cada texto distinto recebe um número e é quebrado em termos uma única
+    vez; os termos ficam também numa lista ordenada, para achar os que
+    começam com a palavra buscada por busca binária. Os textos contam
+    quantas vezes aparecem nas linhas: o que deixa de aparecer (editado ou
+    removido) sai do índice, com os termos que só ele tinha, e o número
+    dele é reaproveitado.
+    """
+
+    def __init__(self, capacidade: int = 0):
+        super().__init__(capacidade)
+        self._textos = {}     # texto -> número
+        self._do_numero = []  # número -> texto (None: livre)
+        self._usos = []       # número -> quantas vezes aparece nos códigos
+        self._livres = []     # números de textos que saíram, para reaproveitar
+        self._termos = {}     # termo -> números dos textos que o contêm
+        self._ordenados = []  # termos em ordem, para os prefixos
+        self._bytes = 0       # estimativa dos textos e termos guardados (memoria)
+        # Por campo, o número do texto de cada posição (-1: vazio)
+        self._codigos = {campo: np.full(capacidade, -1, dtype=np.int32) for campo in CAMPOS_BUSCA}
+
+    @classmethod
+    def construir(cls, df: pd.DataFrame) -> "IndiceBusca":
+        """Índice completo de uma tabela de gastos."""
+        ind = cls(len(df))
+        ind.incorporar(df)
+        return ind
+
+    def _ampliar_arrays(self, capacidade: int) -> None:
+        for campo, codigos in self._codigos.items():
+            ampliado = np.full(capacidade, -1, dtype=np.int32)
+            ampliado[:len(codigos)] = codigos
+            self._codigos[campo] = ampliado
+
+    def _numero(self, texto, usos: int = 1) -> int:
+        """Número do texto, com mais `usos` usos, indexando seus termos se for novo; -1 para vazio."""
+        if texto is None or pd.isna(texto) or not str(texto).strip():
+            return -1
+        texto = str(texto)
+        numero = self._textos.get(texto)
+        if numero is None:
+            if self._livres:
+                numero = self._livres.pop()
+                self._do_numero[numero] = texto
+            else:
+                numero = len(self._do_numero)
+                self._do_numero.append(texto)
+                self._usos.append(0)
+            self._textos[texto] = numero
+            novos = set(termos(texto))
+            self._bytes += len(texto) + _BYTES_POR_ENTRADA * (1 + len(novos))
+            for termo in novos:
+                textos = self._termos.get(termo)
+                if textos is None:
+                    self._termos[termo] = {numero}
+                    bisect.insort(self._ordenados, termo)
+                    self._bytes += len(termo) + _BYTES_POR_ENTRADA
+                else:
+                    textos.add(numero)
+        self._usos[numero] += usos
+        return numero
+
+    def _liberar(self, numero: int) -> None:
+        """Um uso a menos do texto; sem usos, ele e os termos que só ele tinha saem do índice."""
+        if numero < 0:
+            return
+        self._usos[numero] -= 1
+        if self._usos[numero]:
+            return
+        texto = self._do_numero[numero]
+        self._do_numero[numero] = None
+        del self._textos[texto]
+        self._livres.append(numero)
+        velhos = set(termos(texto))
+        self._bytes -= len(texto) + _BYTES_POR_ENTRADA * (1 + len(velhos))
+        for termo in velhos:
+            textos = self._termos[termo]
+            textos.discard(numero)
+            if not textos:
+                del self._termos[termo]
+                del self._ordenados[bisect.bisect_left(self._ordenados, termo)]
+                self._bytes -= len(termo) + _BYTES_POR_ENTRADA
+
+    def aplicar(self, anterior: dict = None, novo: dict = None) -> None:
+        """Ajusta o índice para a troca de um gasto (None = não existia / removido)."""
+        if anterior is None:
+            if novo is None:
+                return
+            posicao = self._acrescentar_ids(np.array([novo["id"]], dtype=np.int64))
+        else:
+            posicao = self._posicao(anterior["id"])
+            if posicao is None:
+                return
+            if novo is None:
+                self._remover_posicao(posicao)
+                for codigos in self._codigos.values():
+                    self._liberar(int(codigos[posicao]))
+                    codigos[posicao:self.n] = codigos[posicao + 1:self.n + 1]
+                    codigos[self.n] = -1
+                return
+        for campo, codigos in self._codigos.items():
+            # O novo antes de soltar o anterior: um texto que não mudou não sai e volta
+            anterior_numero = int(codigos[posicao])
+            codigos[posicao] = self._numero(novo.get(campo))
+            self._liberar(anterior_numero)
+
+    def incorporar(self, df: pd.DataFrame) -> None:
+        """Acrescenta ao fim as linhas de uma tabela que ainda não estavam indexadas (ex.: importação)."""
+        inicio = self._acrescentar_ids(df["id"].to_numpy(dtype=np.int64))
+        for campo, codigos in self._codigos.items():
+            # Cada texto distinto é quebrado em termos uma vez só
+            posicoes, distintos = pd.factorize(df[campo], use_na_sentinel=True)
+            usos = np.bincount(posicoes[posicoes >= 0], minlength=len(distintos))
+            numeros = np.array(
+                [self._numero(t, int(u)) for t, u in zip(distintos, usos)] + [-1], dtype=np.int32
+            )
+            codigos[inicio:self.n] = numeros[posicoes]  # -1 (ausente) cai no último, -1
+
+    def _pesos_textos(self, palavra: str):
+        """Textos que casam com a palavra e o peso de cada um: 1 se contém o termo exato, PESO_PREFIXO se só um que começa com ela.
+
+        Retorna (números dos textos, em ordem crescente, e pesos); só os
+        textos candidatos entram, não todos os do índice.
+        """
+        inicio = bisect.bisect_left(self._ordenados, palavra)
+        fim = bisect.bisect_left(self._ordenados, palavra + "\uffff")
+        com_prefixo = itertools.chain.from_iterable(self._termos[termo] for termo in self._ordenados[inicio:fim])
+        numeros = np.unique(np.fromiter(com_prefixo, dtype=np.int64))
+        pesos = np.full(len(numeros), PESO_PREFIXO)
+        exatos = self._termos.get(palavra, ())
+        pesos[np.searchsorted(numeros, np.fromiter(exatos, dtype=np.int64, count=len(exatos)))] = 1.0
+        return numeros, pesos
+
+    def _pesos_posicoes(self, numeros: np.ndarray, pesos: np.ndarray, codigos: np.ndarray) -> np.ndarray:
+        """Peso do texto de cada posição (códigos), 0 se não está entre os candidatos ou é vazio (-1).
+
+        A tabela vai só até o maior número candidato; o item a mais, 0, é o
+        que as posições vazias e as de textos acima dele indexam.
+        """
+        maior = int(numeros[-1])
+        tabela = np.zeros(maior + 2)
+        tabela[numeros] = pesos
+        return tabela[np.minimum(codigos, maior + 1)]
+
+    def buscar(self, consulta: str, posicoes=None) -> np.ndarray:
+        """Posições das linhas com todas as palavras da consulta, da mais para a menos relevante.
+
+        Cada palavra casa com termos iguais ou que começam com ela; a
+        relevância soma, por palavra, o peso do campo (fornecedor > descrição
+        > observações) vezes o do casamento (exato > prefixo), ponderado pela
+        raridade da palavra. Empates ficam na ordem da tabela. Com posicoes,
+        só elas são consideradas.
+        """
+        palavras = termos(consulta)
+        if posicoes is None:
+            posicoes = np.arange(self.n, dtype=np.int64)
+        if not palavras:
+            return posicoes
+        pontos = np.zeros(len(posicoes))
+        for palavra in dict.fromkeys(palavras):
+            numeros, pesos = self._pesos_textos(palavra)
+            if not len(numeros):
+                return _VAZIO
+            pontos_palavra = np.zeros(len(posicoes))
+            for campo, peso_campo in CAMPOS_BUSCA.items():
+                pontos_palavra += peso_campo * self._pesos_posicoes(numeros, pesos, self._codigos[campo][posicoes])
+            encontradas = pontos_palavra > 0
+            if not encontradas.any():
+                return _VAZIO
+            # Palavras raras pesam mais (idf)
+            pontos_palavra *= math.log(1 + self.n / int(encontradas.sum()))
+            posicoes, pontos = posicoes[encontradas], pontos[encontradas] + pontos_palavra[encontradas]
+        return posicoes[np.argsort(-pontos, kind="stable")]
+
+    def memoria(self) -> int:
+        """Bytes dos arrays mais a estimativa dos textos e termos guardados."""
+        return self._ids.nbytes + sum(c.nbytes for c in self._codigos.values()) + self._bytes
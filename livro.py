@@ -0,0 +1,359 @@
+"""Livro de pagamentos: histórico só de acréscimos dos eventos de cada gasto.
+
+Cada escrita do app vira eventos num arquivo JSON lines ao lado dos dados:
+criação, entrada paga, parcela n paga, edição e remoção, cada um com o
+instante e o total devido (centavos) logo depois dele. A cada
+SNAPSHOT_A_CADA eventos a tabela inteira é gravada (Arrow IPC) e indexada
+pelo evento e pela data; o estado em qualquer ponto é o snapshot anterior
+mais, no máximo, esses eventos reaplicados. "Quanto devíamos no dia X"
+acha o snapshot por busca binária na data e lê só os eventos seguintes,
+sem percorrer o histórico.
+
+    python livro.py data/gastos.csv --em 2026-03-01
+    python livro.py data/gastos.csv --verificar
+"""
+import argparse
+import bisect
+import json
+import os
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage import COLUMNS, ArrowStorage, abrir_storage, adotar_lateral, para_reais, tipos_internos, valor_pago
+
+# Eventos entre dois snapshots (limita o que uma reconstrução reaplica)
+SNAPSHOT_A_CADA = 1000
+
+CRIACAO = "criacao"
+ENTRADA_PAGA = "entrada_paga"
+PARCELA_PAGA = "parcela_paga"
+EDICAO = "edicao"
+REMOCAO = "remocao"
+SUBSTITUICAO = "substituicao"  # tabela inteira regravada; sempre seguida de um snapshot
+
+# Campos cuja mudança não é só pagamento de parcelas
+_CAMPOS_EDICAO = [c for c in COLUMNS if c not in ("id", "parcelas_pagas", "porcentagem_paga", "versao")]
+
+
+def _nativo(valor):
+    """Escalares numpy em tipos do Python; ausentes viram None."""
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return None
+    return valor
+
+
+def _instante(agora: datetime = None) -> str:
+    return (agora or datetime.now()).isoformat(timespec="seconds")
+
+
+def _pago(gasto: dict, parcelas_pagas=None) -> int:
+    parcelas = gasto["parcelas_pagas"] if parcelas_pagas is None else parcelas_pagas
+    return int(valor_pago(gasto["entrada"], parcelas, gasto["valor_parcela"], gasto["num_parcelas"], gasto["valor_total"]))
+
+
+def _restante(gasto: dict) -> int:
+    """Centavos ainda devidos num gasto (0 se ele não existe)."""
+    return 0 if gasto is None else int(gasto["valor_total"]) - _pago(gasto)
+
+
+def _devido_tabela(df: pd.DataFrame) -> int:
+    if df.empty:
+        return 0
+    pago = valor_pago(df["entrada"], df["parcelas_pagas"], df["valor_parcela"], df["num_parcelas"], df["valor_total"])
+    return int((df["valor_total"] - pago).sum())
+
+
+def _linha(gasto: dict, versao: int) -> dict:
+    linha = {c: _nativo(gasto.get(c)) for c in COLUMNS}
+    linha["versao"] = versao
+    return linha
+
+
+def _porcentagem(gasto: dict, parcelas_pagas: int) -> float:
+    valor_total = gasto["valor_total"]
+    porcentagem = _pago(gasto, parcelas_pagas) / valor_total * 100 if valor_total > 0 else 0.0
+    return float(min(max(round(porcentagem, 1), 0.0), 100.0))
+
+
+def eventos_da_troca(anterior: dict = None, novo: dict = None) -> list:
+    """Eventos de uma troca de gasto (None = não existia / removido): [(tipo, dados, delta)].
+
+    delta é a variação, em centavos, do total devido. Numa criação a
+    entrada conta como devida e sai no evento de entrada paga; parcelas
+    pagas a mais numa edição viram um evento por parcela, e o que sobrar
+    da troca (outros campos, estorno de parcelas) vira uma edição.
+    """
+    if novo is None:
+        if anterior is None:
+            return []
+        return [(REMOCAO, {"id": int(anterior["id"])}, -_restante(anterior))]
+
+    if anterior is None:
+        linha = _linha(novo, 1)
+        entrada = int(novo["entrada"])
+        eventos = [(CRIACAO, {"id": linha["id"], "versao": 1, "linha": linha}, _restante(novo) + entrada)]
+        if entrada > 0:
+            eventos.append((ENTRADA_PAGA, {"id": linha["id"], "versao": 1, "valor": entrada}, -entrada))
+        return eventos
+
+    versao = int(anterior["versao"]) + 1
+    id_ = int(novo["id"])
+    eventos = []
+    pagas_antes, pagas = int(anterior["parcelas_pagas"]), int(novo["parcelas_pagas"])
+    pago_parcelas = 0
+    if pagas > pagas_antes:
+        for n in range(pagas_antes + 1, pagas + 1):
+            valor = _pago(novo, n) - _pago(novo, n - 1)
+            porcentagem = float(novo["porcentagem_paga"]) if n == pagas else _porcentagem(novo, n)
+            eventos.append((
+                PARCELA_PAGA,
+                {"id": id_, "versao": versao, "parcela": n, "valor": valor, "porcentagem_paga": porcentagem},
+                -valor,
+            ))
+            pago_parcelas += valor
+    resto = _restante(novo) - _restante(anterior) + pago_parcelas
+    outros_campos = any(_nativo(anterior[c]) != _nativo(novo[c]) for c in _CAMPOS_EDICAO)
+    if outros_campos or pagas < pagas_antes or resto != 0 or not eventos:
+        eventos.append((EDICAO, {"id": id_, "versao": versao, "linha": _linha(novo, versao)}, resto))
+    return eventos
+
+
+class Livro:
+    """Eventos de pagamento de um plano, com snapshots periódicos da tabela.
+
+    tabela() devolve a tabela atual do storage (tipada, em centavos); é
+    chamada só quando um snapshot precisa ser gravado. Não é thread-safe:
+    no app, é usado com o lock do plano.
+    """
+
+    def __init__(self, data_path: Path, tabela=None):
+        data_path = Path(data_path)
+        self.eventos_path = adotar_lateral(data_path, ".livro.jsonl")
+        self.indice_path = adotar_lateral(data_path, ".livro.snapshots.jsonl")
+        self.snapshots_dir = adotar_lateral(data_path, ".livro")
+        self.tabela = tabela or (lambda: abrir_storage(data_path).ler())
+        self.snapshots = []  # {"seq", "ts", "offset", "devido", "arquivo"}, em ordem
+        self._datas = []     # data (AAAA-MM-DD) de cada snapshot, para a busca binária
+        self.seq = 0         # último evento gravado
+        self.devido = 0      # total devido depois dele (centavos)
+        self._offset = 0     # fim do último evento íntegro
+        self._carregar()
+
+    def _carregar(self) -> None:
+        try:
+            with open(self.indice_path, "r", encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        snapshot = json.loads(linha)
+                    except json.JSONDecodeError:
+                        break  # gravação interrompida no fim do índice
+                    if (self.snapshots_dir / snapshot["arquivo"]).exists():
+                        self.snapshots.append(snapshot)
+                        self._datas.append(snapshot["ts"][:10])
+        except FileNotFoundError:
+            return
+        if not self.snapshots:
+            return
+        ultimo = self.snapshots[-1]
+        self.seq, self.devido, self._offset = ultimo["seq"], ultimo["devido"], ultimo["offset"]
+        for evento, fim in self._ler_eventos(ultimo["offset"]):
+            self.seq, self.devido, self._offset = evento["seq"], evento["devido"], fim
+        if self.eventos_path.exists() and self.eventos_path.stat().st_size > self._offset:
+            # Linha incompleta de uma gravação interrompida: os próximos eventos vêm depois do último íntegro
+            with open(self.eventos_path, "r+b") as f:
+                f.truncate(self._offset)
+
+    def _ler_eventos(self, offset: int, ate: str = None):
+        """(evento, offset do fim) a partir de offset; para no primeiro evento depois do dia ate."""
+        try:
+            f = open(self.eventos_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for bruta in f:
+                if not bruta.endswith(b"\n"):
+                    return
+                try:
+                    evento = json.loads(bruta)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    return
+                if ate is not None and evento["ts"][:10] > ate:
+                    return
+                offset += len(bruta)
+                yield evento, offset
+
+    def iniciado(self) -> bool:
+        return bool(self.snapshots)
+
+    def iniciar(self, df: pd.DataFrame = None, agora: datetime = None) -> None:
+        """Abre o livro com um snapshot da tabela atual (o que já existia antes dele)."""
+        if self.iniciado():
+            return
+        self.eventos_path.touch()
+        self._offset = self.eventos_path.stat().st_size
+        df = self.tabela() if df is None else df
+        self.devido = _devido_tabela(df)
+        self._snapshot(df, _instante(agora))
+
+    def registrar(self, trocas, agora: datetime = None) -> int:
+        """Grava os eventos de uma escrita (pares anterior, novo); retorna quantos."""
+        eventos = [evento for anterior, novo in trocas for evento in eventos_da_troca(anterior, novo)]
+        return self._acrescentar(eventos, agora)
+
+    def substituir(self, agora: datetime = None) -> None:
+        """Tabela inteira regravada (save_data): um evento e um snapshot do novo estado."""
+        df = self.tabela()
+        self._acrescentar([(SUBSTITUICAO, {}, _devido_tabela(df) - self.devido)], agora, df)
+
+    def _acrescentar(self, eventos: list, agora: datetime = None, snapshot: pd.DataFrame = None) -> int:
+        if not eventos:
+            return 0
+        if not self.iniciado():
+            self.iniciar(agora=agora)
+        ts = _instante(agora)
+        linhas = []
+        for tipo, dados, delta in eventos:
+            self.seq += 1
+            self.devido += delta
+            evento = {"seq": self.seq, "ts": ts, "tipo": tipo, **dados, "devido": self.devido}
+            linhas.append(json.dumps(evento, ensure_ascii=False) + "\n")
+        conteudo = "".join(linhas).encode("utf-8")
+        with open(self.eventos_path, "ab") as f:
+            f.write(conteudo)
+        self._offset += len(conteudo)
+        if snapshot is not None or self.seq - self.snapshots[-1]["seq"] >= SNAPSHOT_A_CADA:
+            self._snapshot(self.tabela() if snapshot is None else snapshot, ts)
+        return len(eventos)
+
+    def _snapshot(self, df: pd.DataFrame, ts: str) -> None:
+        """Grava a tabela depois do evento seq e o registra no índice."""
+        self.sincronizar()  # o índice só aponta para eventos já em disco
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        arquivo = f"{self.seq:012d}.arrow"
+        ArrowStorage(self.snapshots_dir / arquivo, "ipc", journal=False).salvar(df[COLUMNS])
+        snapshot = {"seq": self.seq, "ts": ts, "offset": self._offset, "devido": self.devido, "arquivo": arquivo}
+        with open(self.indice_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.snapshots.append(snapshot)
+        self._datas.append(ts[:10])
+
+    def sincronizar(self) -> None:
+        """Leva ao disco (fsync) os eventos já acrescentados."""
+        if not self.eventos_path.exists():
+            return
+        with open(self.eventos_path, "ab") as f:
+            os.fsync(f.fileno())
+
+    def ler_snapshot(self, snapshot: dict) -> pd.DataFrame:
+        """Tabela gravada num snapshot (um item de self.snapshots)."""
+        return ArrowStorage(self.snapshots_dir / snapshot["arquivo"], "ipc", journal=False).ler()
+
+    def eventos(self):
+        """Todos os eventos, em ordem, desde o primeiro snapshot."""
+        if self.snapshots:
+            for evento, _ in self._ler_eventos(self.snapshots[0]["offset"]):
+                yield evento
+
+    def _snapshot_ate(self, ate: str = None):
+        """Último snapshot até o fim do dia ate (ISO), ou None se o livro começa depois."""
+        if ate is None:
+            return self.snapshots[-1] if self.snapshots else None
+        i = bisect.bisect_right(self._datas, ate)
+        return self.snapshots[i - 1] if i else None
+
+    def devido_em(self, dia: date = None):
+        """Total devido (centavos) no fim do dia; None se o livro ainda não existia.
+
+        Sem dia, o total atual. Lê no máximo os eventos entre dois snapshots.
+        """
+        if dia is None:
+            return self.devido if self.iniciado() else None
+        ate = dia.isoformat()
+        snapshot = self._snapshot_ate(ate)
+        if snapshot is None:
+            return None
+        devido = snapshot["devido"]
+        for evento, _ in self._ler_eventos(snapshot["offset"], ate):
+            devido = evento["devido"]
+        return devido
+
+    def estado(self, dia: date = None) -> pd.DataFrame:
+        """Tabela de gastos no fim do dia (ou a atual): snapshot anterior mais os eventos seguintes."""
+        ate = None if dia is None else dia.isoformat()
+        snapshot = self._snapshot_ate(ate)
+        if snapshot is None:
+            return None
+        df = self.ler_snapshot(snapshot)
+        linhas = df.set_index("id", drop=False)
+        alterados = {}  # id -> linha (dict), na ordem em que apareceram
+        removidos = set()
+        for evento, _ in self._ler_eventos(snapshot["offset"], ate):
+            tipo, id_ = evento["tipo"], evento.get("id")
+            if tipo in (CRIACAO, EDICAO):
+                alterados[id_] = dict(evento["linha"])
+                removidos.discard(id_)
+            elif tipo == PARCELA_PAGA:
+                linha = alterados.get(id_)
+                if linha is None:
+                    linha = alterados[id_] = {c: _nativo(v) for c, v in linhas.loc[id_].items()}
+                linha.update(parcelas_pagas=evento["parcela"], porcentagem_paga=evento["porcentagem_paga"], versao=evento["versao"])
+            elif tipo == REMOCAO:
+                alterados.pop(id_, None)
+                removidos.add(id_)
+            elif tipo == SUBSTITUICAO:
+                raise ValueError(f"Snapshot ausente depois do evento {evento['seq']} (substituição da tabela)")
+        if alterados:
+            novas = pd.DataFrame(list(alterados.values()), columns=COLUMNS)
+            combinado = pd.concat([df.astype(object), novas.astype(object)], ignore_index=True)
+            ordem = combinado["id"].drop_duplicates(keep="first")
+            df = combinado.drop_duplicates("id", keep="last").set_index("id", drop=False).loc[ordem.to_numpy()]
+        if removidos:
+            df = df[~df["id"].isin(removidos)]
+        return tipos_internos(df.reset_index(drop=True)[COLUMNS])
+
+    def verificar(self, df: pd.DataFrame = None) -> list:
+        """Diferenças entre a reconstrução pelo livro e a tabela atual (vazia se batem)."""
+        df = self.tabela() if df is None else df
+        estado = self.estado()
+        if estado is None:
+            return ["Livro ainda não iniciado."]
+        erros = []
+        if self.devido != _devido_tabela(df):
+            erros.append(f"total devido: livro {para_reais(self.devido)} x tabela {para_reais(_devido_tabela(df))}")
+        a = estado.set_index("id").sort_index()
+        b = df[COLUMNS].set_index("id").sort_index()
+        for id_ in a.index.symmetric_difference(b.index)[:20]:
+            erros.append(f"gasto {id_}: {'só no livro' if id_ in a.index else 'só na tabela'}")
+        comuns = a.index.intersection(b.index)
+        a, b = a.loc[comuns].astype(object), b.loc[comuns].astype(object)
+        diferentes = (a != b) & ~(a.isna() & b.isna())
+        for id_, coluna in list(zip(*np.nonzero(diferentes.to_numpy())))[:20]:
+            erros.append(f"gasto {comuns[id_]}: {a.columns[coluna]} difere")
+        return erros
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consulta o livro de pagamentos de um plano.")
+    parser.add_argument("dados", type=Path, help="arquivo de dados do plano")
+    parser.add_argument("--em", type=date.fromisoformat, help="total devido no fim deste dia (AAAA-MM-DD)")
+    parser.add_argument("--verificar", action="store_true", help="confere a reconstrução contra a tabela atual")
+    args = parser.parse_args()
+
+    livro = Livro(args.dados)
+    if not livro.iniciado():
+        raise SystemExit("Livro ainda não iniciado para este plano.")
+    print(f"{livro.seq} evento(s), {len(livro.snapshots)} snapshot(s)")
+    if args.em is not None:
+        devido = livro.devido_em(args.em)
+        print("Livro começa depois desse dia." if devido is None else f"Devido em {args.em}: R$ {para_reais(devido):,.2f}")
+    if args.verificar:
+        erros = livro.verificar()
+        print("\n".join(erros) if erros else "Livro confere com a tabela.")
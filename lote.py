@@ -0,0 +1,118 @@
+"""Processamento em lote de vários planos, sem Streamlit.
+
+Para cada arquivo de plano de um diretório calcula os resumos, o
+cronograma (próxima parcela de cada gasto, parcelas em atraso e fluxo
+mensal) e o relatório de validação. Os planos são distribuídos entre
+processos, um plano por tarefa.
+
+    python lote.py data/planos --saida relatorio.json
+    python lote.py data/planos --saida relatorio/ --formato parquet --processos 8
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+from cronograma import fluxo_mensal, parcelas_atrasadas, proximas_parcelas
+from nucleo import calcular_resumos, carregar_gastos, validar_gastos
+from planos import caminho_plano, listar_planos
+from storage import para_reais
+
+
+def processar_plano(path: Path, hoje: date = None) -> dict:
+    """Resumos, cronograma e validação de um plano; falhas viram o campo "falha"."""
+    path = Path(path)
+    try:
+        df = carregar_gastos(path)
+        atrasadas = parcelas_atrasadas(df, hoje)
+        proximas = proximas_parcelas(df)[["id", "proxima_parcela", "num_parcelas", "proximo_vencimento", "valor_parcela"]]
+        fluxo = fluxo_mensal(df)
+        # As tabelas de saída ficam em reais, como nos arquivos de dados
+        return {
+            "plano": path.stem,
+            "gastos": len(df),
+            "resumos": {
+                **calcular_resumos(df),
+                "parcelas_atrasadas": len(atrasadas),
+                "valor_atrasado": para_reais(atrasadas["valor"].sum()),
+            },
+            "proximas": proximas.assign(valor_parcela=para_reais(proximas["valor_parcela"])).reset_index(drop=True),
+            "fluxo": fluxo.assign(pago=para_reais(fluxo["pago"]), a_pagar=para_reais(fluxo["a_pagar"])),
+            "validacao": validar_gastos(df),
+        }
+    except Exception as erro:  # noqa: BLE001 - um plano com problema não derruba o lote
+        return {"plano": path.stem, "falha": f"{type(erro).__name__}: {erro}"}
+
+
+def processar_diretorio(diretorio: Path, processos: int = None, hoje: date = None) -> list:
+    """Processa todos os planos do diretório em paralelo, na ordem dos nomes."""
+    caminhos = [caminho_plano(nome, diretorio) for nome in listar_planos(diretorio)]
+    processos = processos or os.cpu_count() or 1
+    if processos == 1 or len(caminhos) <= 1:
+        return [processar_plano(path, hoje) for path in caminhos]
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        chunksize = max(1, len(caminhos) // (processos * 4))
+        return list(pool.map(processar_plano, caminhos, [hoje] * len(caminhos), chunksize=chunksize))
+
+
+def gravar_json(resultados: list, destino: Path) -> None:
+    """{"planos": [...]} com as tabelas de cada plano como listas de registros.
+
+    As tabelas são serializadas direto pelo pandas (to_json), plano a plano,
+    sem montar o documento inteiro em objetos Python.
+    """
+    with open(destino, "w", encoding="utf-8") as f:
+        f.write('{"planos": [')
+        for i, r in enumerate(resultados):
+            if i:
+                f.write(", ")
+            if "falha" in r:
+                f.write(json.dumps(r, ensure_ascii=False))
+                continue
+            cabecalho = {"plano": r["plano"], "gastos": r["gastos"], "resumos": r["resumos"]}
+            f.write(json.dumps(cabecalho, ensure_ascii=False)[:-1])
+            for tabela in ("proximas", "fluxo", "validacao"):
+                f.write(f', "{tabela}": ')
+                f.write(r[tabela].to_json(orient="records", date_format="iso", force_ascii=False))
+            f.write("}")
+        f.write("]}")
+
+
+def gravar_parquet(resultados: list, destino: Path) -> None:
+    """Um arquivo por tabela (resumos, proximas, fluxo, validacao), com a coluna plano."""
+    destino.mkdir(parents=True, exist_ok=True)
+    ok = [r for r in resultados if "falha" not in r]
+    pd.DataFrame(
+        [{"plano": r["plano"], "gastos": r["gastos"], **r["resumos"]} for r in ok]
+        + [{"plano": r["plano"], "falha": r["falha"]} for r in resultados if "falha" in r]
+    ).to_parquet(destino / "resumos.parquet", index=False)
+    for tabela in ("proximas", "fluxo", "validacao"):
+        partes = [r[tabela].assign(plano=r["plano"]) for r in ok]
+        if partes:
+            pd.concat(partes, ignore_index=True).to_parquet(destino / f"{tabela}.parquet", index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumos, cronogramas e validação de vários planos em paralelo.")
+    parser.add_argument("diretorio", type=Path, help="diretório com um arquivo de dados por plano")
+    parser.add_argument("--saida", type=Path, required=True, help="arquivo JSON ou diretório Parquet")
+    parser.add_argument("--formato", choices=["json", "parquet"], default="json")
+    parser.add_argument("--processos", type=int, default=None, help="padrão: número de CPUs")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resultados = processar_diretorio(args.diretorio, args.processos)
+    if args.formato == "parquet":
+        gravar_parquet(resultados, args.saida)
+    else:
+        gravar_json(resultados, args.saida)
+    falhas = [r for r in resultados if "falha" in r]
+    print(
+        f"{len(resultados)} plano(s) em {time.perf_counter() - inicio:.2f}s"
+        + (f", {len(falhas)} com falha" if falhas else "")
+    )
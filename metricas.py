@@ -0,0 +1,105 @@
+"""Medição do tempo de cada fase de um rerun do app.
+
+Cada rerun registra spans (nome da fase -> duração); a sessão guarda os
+últimos reruns e calcula p50/p95 por fase. Desligado, medir() devolve um
+contexto vazio compartilhado, sem tomar tempo nem alocar.
+"""
+import json
+import time
+from collections import deque
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+
+# Quantos reruns cada sessão guarda para as estatísticas
+HISTORICO_MAX = 200
+
+_NULO = nullcontext()
+
+
+class _Span:
+    __slots__ = ("medidor", "nome", "inicio")
+
+    def __init__(self, medidor, nome: str):
+        self.medidor = medidor
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        fim = time.perf_counter()
+        self.medidor._registrar(self.nome, fim - self.inicio, fim)
+        return False
+
+
+class Medidor:
+    """Spans do rerun atual e o histórico de reruns de uma sessão."""
+
+    NULO = _NULO  # contexto vazio, para quem ainda não tem um medidor
+
+    def __init__(self, sessao: str = "", exportar_para: Path = None):
+        self.ativo = False
+        self.sessao = sessao
+        self.exportar_para = exportar_para  # arquivo JSON lines, um rerun por linha
+        self.historico = deque(maxlen=HISTORICO_MAX)
+        self._atual = None
+        self._inicio = 0.0
+        self._fim = 0.0
+
+    def novo_rerun(self, **contexto) -> None:
+        """Fecha o rerun anterior (vai para o histórico e o export) e começa outro."""
+        self._fechar()
+        if self.ativo:
+            self._atual = {"fases": {}, **contexto}
+            self._inicio = self._fim = time.perf_counter()
+
+    def medir(self, nome: str):
+        """Contexto que mede uma fase; vazio (custo ~zero) se a medição estiver desligada."""
+        if self._atual is None:
+            return _NULO
+        return _Span(self, nome)
+
+    def _registrar(self, nome: str, duracao: float, fim: float) -> None:
+        if self._atual is None:
+            return
+        fases = self._atual["fases"]
+        # A mesma fase repetida no rerun acumula
+        fases[nome] = fases.get(nome, 0.0) + duracao * 1000
+        self._fim = max(self._fim, fim)
+
+    def _fechar(self) -> None:
+        if self._atual is None:
+            return
+        registro = self._atual
+        registro["fases"]["total"] = (self._fim - self._inicio) * 1000
+        registro.update(ts=time.time(), sessao=self.sessao)
+        self.historico.append(registro)
+        self._atual = None
+        if self.exportar_para is not None:
+            with open(self.exportar_para, "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    def estatisticas(self) -> list:
+        """Por fase: reruns medidos, último, p50 e p95 (ms), da mais lenta para a mais rápida."""
+        duracoes = {}
+        for registro in self.historico:
+            for nome, ms in registro["fases"].items():
+                duracoes.setdefault(nome, []).append(ms)
+        linhas = []
+        for nome, valores in duracoes.items():
+            p50, p95 = np.percentile(valores, [50, 95])
+            linhas.append({
+                "fase": nome,
+                "reruns": len(valores),
+                "ultimo_ms": valores[-1],
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+            })
+        return sorted(linhas, key=lambda linha: linha["p50_ms"], reverse=True)
+
+    def jsonl(self) -> str:
+        """Histórico da sessão em JSON lines (um rerun por linha)."""
+        return "".join(json.dumps(registro, ensure_ascii=False) + "\n" for registro in self.historico)
@@ -0,0 +1,199 @@
+"""Regras de negócio dos gastos, sem dependência de interface.
+
+Usado pelo app Streamlit e por tarefas offline (lote.py); importar este
+módulo não carrega o Streamlit.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from storage import (
+    STATUS_COMPLETO,
+    STATUS_EM_ANDAMENTO,
+    STATUS_NAO_INICIADO,
+    STATUS_OUTRO,
+    abrir_storage,
+    mascara_status,
+    para_reais,
+    valor_pago,
+)
+
+# Ordem das categorias da coluna status de derivar_gastos
+ORDEM_STATUS = [STATUS_NAO_INICIADO, STATUS_COMPLETO, STATUS_EM_ANDAMENTO, STATUS_OUTRO]
+
+# Valor usado quando uma célula numérica editada não é um número válido
+# (valores monetários em centavos)
+_PADROES_NUMERICOS = {
+    "valor_total": 0,
+    "entrada": 0,
+    "num_parcelas": 1,
+    "valor_parcela": 0,
+    "parcelas_pagas": 0,
+    "porcentagem_paga": 0.0,
+}
+
+
+def carregar_gastos(path: Path) -> pd.DataFrame:
+    """Gastos tipados de um arquivo de dados (qualquer formato do storage)."""
+    return abrir_storage(path).ler()
+
+
+def _valor_pago(df: pd.DataFrame) -> pd.Series:
+    return valor_pago(df["entrada"], df["parcelas_pagas"], df["valor_parcela"], df["num_parcelas"], df["valor_total"])
+
+
+def derivar_gastos(df: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta valor_pago, valor_restante (centavos), progresso e status numa passada vetorizada."""
+    pago = _valor_pago(df)
+    valor_total = df["valor_total"]
+    porcentagem = df["porcentagem_paga"]
+    status = np.select(
+        [mascara_status(porcentagem, s) for s in (STATUS_NAO_INICIADO, STATUS_COMPLETO, STATUS_EM_ANDAMENTO)],
+        [STATUS_NAO_INICIADO, STATUS_COMPLETO, STATUS_EM_ANDAMENTO],
+        default=STATUS_OUTRO,
+    )
+    return df.assign(
+        valor_pago=pago,
+        valor_restante=valor_total - pago,
+        progresso=(pago / valor_total * 100).where(valor_total > 0, 0.0),
+        status=pd.Categorical(status, categories=ORDEM_STATUS),
+    )
+
+
+def calcular_resumos(df: pd.DataFrame) -> dict:
+    """Calcula totais em reais: planejado, pago e faltante.
+
+    As somas são feitas em centavos inteiros; planejado = pago + faltante exatamente.
+    """
+    if df.empty:
+        return {
+            "total_planejado": 0.0,
+            "total_pago": 0.0,
+            "total_faltante": 0.0,
+            "progresso_geral": 0.0,
+        }
+
+    # Calcula valor pago considerando entrada + parcelas pagas
+    if "valor_pago" in df.columns:
+        valor_pago_por_linha = df["valor_pago"]
+    else:
+        valor_pago_por_linha = _valor_pago(df)
+    total_planejado = int(df["valor_total"].sum())
+    total_pago = int(valor_pago_por_linha.sum())
+    total_faltante = total_planejado - total_pago
+    progresso_geral = (total_pago / total_planejado * 100) if total_planejado > 0 else 0
+
+    return {
+        "total_planejado": para_reais(total_planejado),
+        "total_pago": para_reais(total_pago),
+        "total_faltante": para_reais(total_faltante),
+        "progresso_geral": float(progresso_geral),
+    }
+
+
+def formatar_moeda(valor: float) -> str:
+    """Valor em reais no formato brasileiro (use para_reais antes, se vier em centavos)."""
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def sincronizar_parcelas_porcentagem(df: pd.DataFrame) -> pd.DataFrame:
+    """Sincroniza parcelas_pagas e porcentagem_paga"""
+    df_sinc = df.copy()
+
+    # Se porcentagem foi alterada, atualiza parcelas_pagas
+    mask_porc = df_sinc['porcentagem_paga'].notna()
+    df_sinc.loc[mask_porc, 'parcelas_pagas'] = (
+        (df_sinc.loc[mask_porc, 'valor_total'] - df_sinc.loc[mask_porc, 'entrada']) *
+        df_sinc.loc[mask_porc, 'porcentagem_paga'] / 100 /
+        df_sinc.loc[mask_porc, 'valor_parcela']
+    ).round().astype(df_sinc['parcelas_pagas'].dtype)
+
+    # Se parcelas foram alteradas, atualiza porcentagem
+    mask_parc = df_sinc['parcelas_pagas'].notna()
+    df_sinc.loc[mask_parc, 'porcentagem_paga'] = (
+        _valor_pago(df_sinc.loc[mask_parc]) /
+        df_sinc.loc[mask_parc, 'valor_total'] * 100
+    ).round(1)
+
+    return df_sinc
+
+
+def dividir_parcelas(valor_total: int, entrada: int, num_parcelas: int) -> int:
+    """Valor de cada parcela em centavos (divisão inteira; o resto vai na última)."""
+    if valor_total > entrada and num_parcelas > 0:
+        return (valor_total - entrada) // num_parcelas
+    return 0
+
+
+def calcular_parcelas(df: pd.DataFrame) -> pd.DataFrame:
+    """Preenche valor_parcela e porcentagem_paga como o formulário de novo gasto calcula (centavos)."""
+    valor_total, entrada, num_parcelas = df["valor_total"], df["entrada"], df["num_parcelas"]
+    validas = (valor_total > entrada) & (num_parcelas > 0)
+    valor_parcela = ((valor_total - entrada) // num_parcelas.where(validas, 1)).where(validas, 0)
+    calculado = df.assign(valor_parcela=valor_parcela)
+    return calculado.assign(
+        porcentagem_paga=(_valor_pago(calculado) / valor_total * 100).where(valor_total > 0, 0.0),
+    )
+
+
+def reconciliar_edicao(original: dict, alteracoes: dict) -> dict:
+    """Aplica as células alteradas de uma linha do editor e reconcilia o gasto.
+
+    Só as células tocadas são validadas. Se o usuário alterou a porcentagem
+    (e não as parcelas), as parcelas pagas são derivadas dela; caso contrário
+    a porcentagem é recalculada a partir das parcelas e dos valores. Valores
+    monetários em centavos, nas duas entradas.
+    """
+    gasto = dict(original)
+    for col, valor in alteracoes.items():
+        if col in _PADROES_NUMERICOS:
+            padrao = _PADROES_NUMERICOS[col]
+            valor = pd.to_numeric(valor, errors="coerce")
+            valor = type(padrao)(padrao if pd.isna(valor) else valor)
+        gasto[col] = valor
+
+    if not alteracoes.keys() & _PADROES_NUMERICOS.keys():
+        return gasto
+
+    valor_total, entrada = gasto["valor_total"], gasto["entrada"]
+    valor_parcela = gasto["valor_parcela"]
+    if "porcentagem_paga" in alteracoes and "parcelas_pagas" not in alteracoes:
+        pago_em_parcelas = valor_total * gasto["porcentagem_paga"] / 100 - entrada
+        gasto["parcelas_pagas"] = int(round(pago_em_parcelas / valor_parcela)) if valor_parcela > 0 else 0
+
+    # Garante consistência
+    gasto["parcelas_pagas"] = int(min(max(gasto["parcelas_pagas"], 0), gasto["num_parcelas"]))
+    pago = valor_pago(entrada, gasto["parcelas_pagas"], valor_parcela, gasto["num_parcelas"], valor_total)
+    porcentagem = pago / valor_total * 100 if valor_total > 0 else 0.0
+    gasto["porcentagem_paga"] = float(min(max(round(porcentagem, 1), 0.0), 100.0))
+    return gasto
+
+
+def _vazio(textos: pd.Series) -> pd.Series:
+    """Textos ausentes ou só com espaços; em categorias, cada valor distinto é avaliado uma vez."""
+    if isinstance(textos.dtype, pd.CategoricalDtype):
+        vazias = textos.cat.categories.astype(str).str.strip() == ""
+        codigos = textos.cat.codes.to_numpy()
+        return pd.Series((codigos < 0) | vazias[codigos], index=textos.index)
+    return textos.fillna("").astype(str).str.strip() == ""
+
+
+def validar_gastos(df: pd.DataFrame) -> pd.DataFrame:
+    """Regras do formulário de novo gasto aplicadas à tabela inteira.
+
+    Retorna uma linha por violação: posicao (linha do df, 0-based), id e
+    erro (mesma mensagem do formulário). Vazio se tudo estiver válido.
+    """
+    regras = [
+        (df["valor_total"] <= 0, "O valor total deve ser maior que zero."),
+        (df["entrada"] > df["valor_total"], "A entrada não pode ser maior que o valor total."),
+        (_vazio(df["categoria"]), "Informe uma categoria."),
+        (_vazio(df["fornecedor"]), "Informe o fornecedor."),
+    ]
+    ids = df["id"].to_numpy() if "id" in df.columns else np.full(len(df), None)
+    partes = []
+    for mascara, erro in regras:
+        posicoes = np.flatnonzero(mascara.to_numpy(dtype=bool, na_value=True))
+        partes.append(pd.DataFrame({"posicao": posicoes, "id": ids[posicoes], "erro": erro}))
+    return pd.concat(partes, ignore_index=True).sort_values("posicao", kind="stable", ignore_index=True)
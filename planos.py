@@ -0,0 +1,268 @@
+"""Planos de casamento (tenants) e o cache compartilhado dos planos carregados.
+
+Cada plano é um arquivo de dados próprio em PLANOS_DIR; a sessão escolhe o
+seu pelo nome. O cache guarda, por plano, o storage aberto e os DataFrames
+já tipados, limitado por memória: passando do limite, os planos usados há
+mais tempo são descartados (LRU) e voltam a ser lidos do disco se pedidos.
+"""
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from storage import EscritaAtrasada, abrir_storage
+
+# Diretório com um arquivo de dados por plano
+PLANOS_DIR = Path("data/planos")
+
+# Memória máxima dos DataFrames mantidos no cache de planos
+MEMORIA_MAX_BYTES = 256 * 1024 * 1024
+
+# Nomes aceitos (viram nome de arquivo; impede caminhos fora de PLANOS_DIR)
+_NOME_VALIDO = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+# Extensões procuradas para um plano existente, na ordem de preferência
+_EXTENSOES = [".db", ".parquet", ".arrow", ".csv"]
+
+
+def nome_valido(nome: str) -> bool:
+    return bool(nome) and _NOME_VALIDO.fullmatch(nome) is not None
+
+
+def caminho_plano(nome: str, diretorio: Path = PLANOS_DIR, novo: bool = False) -> Path:
+    """Arquivo de dados do plano.
+
+    Um plano sem arquivo levanta FileNotFoundError, a não ser com novo: aí
+    o caminho é o do CSV com que ele começa (ver CachePlanos.criar).
+    """
+    if not nome_valido(nome):
+        raise ValueError(f"Nome de plano inválido: {nome!r}")
+    for extensao in _EXTENSOES:
+        path = diretorio / f"{nome}{extensao}"
+        if path.exists():
+            return path
+    if not novo:
+        raise FileNotFoundError(f"Plano inexistente: {nome!r}")
+    return diretorio / f"{nome}.csv"
+
+
+def listar_planos(diretorio: Path = PLANOS_DIR) -> list:
+    """Nomes dos planos com arquivo de dados no diretório."""
+    if not diretorio.exists():
+        return []
+    return sorted({p.stem for p in diretorio.iterdir() if p.suffix in _EXTENSOES and nome_valido(p.stem)})
+
+
+def tamanho_entrada(entrada: dict) -> int:
+    """Memória (bytes) dos DataFrames guardados numa entrada do cache.
+
+    Contam a tabela, as tabelas das visões (abas) memoizadas e os índices
+    dos filtros e da busca.
+    """
+    tamanho = 0
+    df = entrada["df"]
+    if df is not None:
+        tamanho += int(df.memory_usage(index=True, deep=True).sum())
+    for indice in (entrada["indices"], entrada["busca"]):
+        if indice is not None:
+            tamanho += indice.memoria()
+    for _, dados in entrada["visoes"].values():
+        valores = dados.values() if isinstance(dados, dict) else [dados]
+        tamanho += sum(
+            int(v.memory_usage(index=True, deep=True).sum()) for v in valores if isinstance(v, pd.DataFrame)
+        )
+    return tamanho
+
+
+class CachePlanos:
+    """Cache LRU de planos carregados, limitado pela memória dos DataFrames.
+
+    Cada entrada é um dict com o storage aberto, o df tipado, os agregados,
+    os índices dos filtros, o livro de pagamentos e os contadores do plano.
+    Só planos que já existem são abertos; um novo é criado por criar().
+
+    O lock de cada plano não é descartado junto com a entrada: uma escrita
+    em andamento numa entrada já removida continua serializada com a
+    entrada recriada. Os locks de planos fora do cache que ninguém está
+    segurando são podados quando entradas saem.
+
+    Com intervalo_escrita, o storage de cada plano é envolvido numa
+    EscritaAtrasada (usando o lock do plano), e ao_descarregar(entrada,
+    antes, depois, conflitos) é chamada depois de cada gravação das
+    pendentes. Planos com escritas pendentes não são descartados.
+    """
+
+    def __init__(
+        self,
+        memoria_max: int = MEMORIA_MAX_BYTES,
+        diretorio: Path = PLANOS_DIR,
+        padrao: Path = None,
+        intervalo_escrita: float = None,
+        ao_descarregar=None,
+    ):
+        self.memoria_max = memoria_max
+        self.diretorio = Path(diretorio)
+        self.padrao = padrao  # arquivo usado quando a sessão não escolhe plano
+        self.intervalo_escrita = intervalo_escrita  # None: cada escrita vai direto para o disco
+        self.ao_descarregar = ao_descarregar
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # nome -> entrada, da menos para a mais usada
+        self._tamanhos = {}
+        self._locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.descartes = 0
+
+    def caminho(self, nome: str = None) -> Path:
+        if nome is None:
+            if self.padrao is None:
+                raise ValueError("Nenhum plano escolhido e nenhum arquivo padrão configurado")
+            return self.padrao
+        return caminho_plano(nome, self.diretorio)
+
+    def existe(self, nome: str = None) -> bool:
+        """Se o plano tem arquivo de dados (o padrão é criado ao abrir, se faltar)."""
+        if nome is None:
+            return True
+        with self._lock:
+            if nome in self._entradas:
+                return True
+        try:
+            self.caminho(nome)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def criar(self, nome: str) -> Path:
+        """Cria o arquivo de um plano novo, vazio e em CSV; um que já existe fica como está."""
+        path = caminho_plano(nome, self.diretorio, novo=True)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            abrir_storage(path)
+        return path
+
+    def obter(self, nome: str = None) -> dict:
+        """Entrada do plano, abrindo o storage se ele não estiver no cache.
+
+        Levanta FileNotFoundError se o plano não existe (ver criar).
+        """
+        with self._lock:
+            entrada = self._entradas.get(nome)
+            if entrada is not None:
+                self._entradas.move_to_end(nome)
+                return entrada
+
+        # Antes do lock: um nome qualquer não deixa nada para trás
+        path = self.caminho(nome)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            # Reentrante: a EscritaAtrasada usa o mesmo lock dentro das chamadas
+            lock = self._locks.setdefault(nome, threading.RLock())
+        nova = {
+            "nome": nome,
+            "path": path,
+            "lock": lock,
+            "storage": None,
+            "versao": 0,         # incrementada a cada escrita
+            "chave": None,       # (versao, identidade do storage) do df em cache
+            "df": None,          # DataFrame já tipado
+            "agregados": None,   # Agregados mantidos incrementalmente
+            "indices": None,     # IndiceFiltros da aba "Nossos Gastos"
+            "indices_chave": None,
+            "busca": None,       # IndiceBusca (busca por texto) da mesma aba
+            "busca_chave": None,
+            "livro": None,       # Livro de pagamentos, aberto na primeira escrita
+            "historico": None,   # Historico diário dos totais
+            "visoes": {},        # nome -> (chave, dados de uma aba), ver load_visao
+            "exportacoes": {},   # (relatório, formato) -> (chave, Exportacao)
+            "descartadas": [],   # relatório das escritas perdidas ao descarregar (conflito com o disco)
+            "hits": 0,
+            "misses": 0,
+        }
+        with lock:
+            storage = abrir_storage(path)
+            if self.intervalo_escrita is not None:
+                storage = EscritaAtrasada(storage, lock, self.intervalo_escrita)
+                if self.ao_descarregar is not None:
+                    storage.ao_descarregar = lambda antes, depois, conflitos: self.ao_descarregar(
+                        nova, antes, depois, conflitos
+                    )
+            nova["storage"] = storage
+        with self._lock:
+            # Outra thread pode ter criado a entrada enquanto o storage abria
+            entrada = self._entradas.setdefault(nome, nova)
+            self._entradas.move_to_end(nome)
+            self._tamanhos.setdefault(nome, 0)
+            self._locks.setdefault(nome, entrada["lock"])
+            return entrada
+
+    def _podar_locks(self) -> None:
+        """Tira os locks dos planos fora do cache que ninguém está segurando. Com self._lock."""
+        for nome in [n for n in self._locks if n not in self._entradas]:
+            lock = self._locks[nome]
+            if lock.acquire(blocking=False):
+                del self._locks[nome]
+                lock.release()
+
+    def contar(self, acerto: bool) -> None:
+        """Conta uma leitura de plano servida da memória (acerto) ou do disco."""
+        with self._lock:
+            if acerto:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def registrar_tamanho(self, entrada: dict) -> None:
+        """Atualiza a memória ocupada pela entrada e descarta as menos usadas.
+
+        Deve ser chamada com o lock do plano, depois de carregar DataFrames.
+        A própria entrada nunca é descartada aqui, mesmo sozinha acima do limite.
+        """
+        tamanho = tamanho_entrada(entrada)
+        with self._lock:
+            nome = entrada["nome"]
+            if self._entradas.get(nome) is not entrada:
+                return  # já descartada
+            self._tamanhos[nome] = tamanho
+            descartaveis = [
+                n for n, e in self._entradas.items() if n != nome and not getattr(e["storage"], "pendentes", 0)
+            ]
+            for mais_antigo in descartaveis:
+                if sum(self._tamanhos.values()) <= self.memoria_max:
+                    break
+                del self._entradas[mais_antigo]
+                del self._tamanhos[mais_antigo]
+                self.descartes += 1
+            self._podar_locks()
+
+    def descartar(self, nome: str = None) -> None:
+        with self._lock:
+            entrada = self._entradas.pop(nome, None)
+            if entrada is not None:
+                del self._tamanhos[nome]
+            self._podar_locks()
+        if entrada is not None and isinstance(entrada["storage"], EscritaAtrasada):
+            entrada["storage"].descarregar()
+
+    def descarregar(self) -> None:
+        """Grava as escritas pendentes de todos os planos em cache."""
+        with self._lock:
+            entradas = list(self._entradas.values())
+        for entrada in entradas:
+            if isinstance(entrada["storage"], EscritaAtrasada):
+                entrada["storage"].descarregar()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "planos_em_cache": len(self._entradas),
+                "memoria_bytes": sum(self._tamanhos.values()),
+                "memoria_max_bytes": self.memoria_max,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "descartes": self.descartes,
+            }
@@ -0,0 +1,277 @@
+"""Relatórios para compartilhar (lista de gastos, resumo por categoria e cronograma de parcelas).
+
+Cada relatório é gerado em blocos de TAMANHO_BLOCO linhas e gravado aos
+poucos num arquivo (CSV, XLSX ou HTML): a memória usada não depende do
+tamanho do plano. O arquivo é escrito com outro nome e renomeado no fim,
+então um relatório interrompido nunca parece pronto. O app roda as
+exportações num pool de threads (Exportacao), fora da thread do script,
+e acompanha o progresso pelos blocos já gravados.
+
+    python relatorios.py data/gastos.csv cronograma --formato xlsx --saida cronograma.xlsx
+"""
+import argparse
+import csv
+import html
+import os
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from agregados import Agregados
+from cronograma import expandir_parcelas
+from nucleo import derivar_gastos, formatar_moeda
+from storage import (
+    STATUS_COMPLETO,
+    STATUS_EM_ANDAMENTO,
+    STATUS_NAO_INICIADO,
+    STATUS_OUTRO,
+    abrir_storage,
+    em_reais,
+)
+
+# Linhas (ou gastos, no cronograma) processadas e gravadas por vez
+TAMANHO_BLOCO = 50_000
+
+# Limite de linhas de uma planilha XLSX (fora o cabeçalho)
+MAX_LINHAS_XLSX = 1_048_575
+
+_ROTULOS_STATUS = {
+    STATUS_NAO_INICIADO: "Não iniciado",
+    STATUS_COMPLETO: "Completo",
+    STATUS_EM_ANDAMENTO: "Em andamento",
+    STATUS_OUTRO: "Outro",
+}
+
+FORMATOS = {
+    "csv": ("text/csv", ".csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+    "html": ("text/html", ".html"),
+}
+
+# Relatório -> (título, colunas (nome no arquivo, rótulo), colunas monetárias)
+RELATORIOS = {
+    "gastos": (
+        "Lista de gastos",
+        [
+            ("id", "ID"), ("categoria", "Categoria"), ("fornecedor", "Fornecedor"), ("descricao", "Descrição"),
+            ("valor_total", "Valor total (R$)"), ("entrada", "Entrada (R$)"), ("num_parcelas", "Parcelas"),
+            ("valor_parcela", "Valor da parcela (R$)"), ("parcelas_pagas", "Parcelas pagas"),
+            ("valor_pago", "Pago (R$)"), ("valor_restante", "Restante (R$)"), ("status", "Status"),
+            ("data_primeira_parcela", "Primeira parcela"), ("observacoes", "Observações"),
+        ],
+        ["valor_total", "entrada", "valor_parcela", "valor_pago", "valor_restante"],
+    ),
+    "categorias": (
+        "Resumo por categoria",
+        [
+            ("categoria", "Categoria"), ("valor_total", "Total (R$)"), ("valor_pago", "Pago (R$)"),
+            ("valor_restante", "Restante (R$)"), ("progresso_percentual", "Progresso (%)"),
+        ],
+        ["valor_total", "valor_pago", "valor_restante"],
+    ),
+    "cronograma": (
+        "Cronograma de parcelas",
+        [
+            ("categoria", "Categoria"), ("fornecedor", "Fornecedor"), ("parcela", "Parcela"),
+            ("vencimento", "Vencimento"), ("valor", "Valor (R$)"), ("situacao", "Situação"),
+        ],
+        ["valor"],
+    ),
+}
+
+
+def _fatias(df: pd.DataFrame, tamanho: int):
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+
+def _blocos_gastos(df: pd.DataFrame, tamanho: int):
+    for bloco in _fatias(df, tamanho):
+        derivado = derivar_gastos(bloco)
+        yield derivado.assign(status=derivado["status"].map(_ROTULOS_STATUS)), len(bloco)
+
+
+def _blocos_categorias(df: pd.DataFrame, tamanho: int):
+    somas = Agregados.calcular(df).por_categoria()
+    progresso = (somas["valor_pago"] / somas["valor_total"] * 100).where(somas["valor_total"] > 0, 0.0).round(1)
+    yield somas.assign(progresso_percentual=progresso), len(df)
+
+
+def _blocos_cronograma(df: pd.DataFrame, tamanho: int):
+    # Expande um bloco de gastos por vez: o cronograma inteiro nunca fica em memória
+    for bloco in _fatias(df, tamanho):
+        parcelas = expandir_parcelas(bloco)
+        posicao = pd.Index(bloco["id"]).get_indexer(parcelas["id"])
+        yield pd.DataFrame({
+            "categoria": bloco["categoria"].to_numpy()[posicao],
+            "fornecedor": bloco["fornecedor"].to_numpy()[posicao],
+            "parcela": parcelas["parcela"].astype(str) + "/" + parcelas["num_parcelas"].astype(str),
+            "vencimento": parcelas["vencimento"].dt.strftime("%Y-%m-%d"),
+            "valor": parcelas["valor"],
+            "situacao": np.where(parcelas["paga"].to_numpy(), "Paga", "A pagar"),
+        }), len(bloco)
+
+
+_BLOCOS = {"gastos": _blocos_gastos, "categorias": _blocos_categorias, "cronograma": _blocos_cronograma}
+
+
+def _linhas_relatorio(tipo: str, df: pd.DataFrame) -> int:
+    if tipo == "cronograma":
+        return int(np.maximum(df["num_parcelas"].to_numpy("int64"), 0).sum())
+    if tipo == "categorias":
+        return int(df["categoria"].nunique())
+    return len(df)
+
+
+class _EscritorCsv:
+    def __init__(self, path: Path, titulo: str, rotulos: list):
+        # BOM: o Excel reconhece o UTF-8 e os acentos
+        self.arquivo = open(path, "w", encoding="utf-8-sig", newline="")
+        csv.writer(self.arquivo).writerow(rotulos)
+
+    def escrever(self, bloco: pd.DataFrame, monetarias: list) -> None:
+        bloco.to_csv(self.arquivo, header=False, index=False, float_format="%.2f")
+
+    def fechar(self) -> None:
+        self.arquivo.close()
+
+
+class _EscritorXlsx:
+    def __init__(self, path: Path, titulo: str, rotulos: list):
+        # openpyxl só é necessário para XLSX; o modo write_only grava as linhas em streaming
+        from openpyxl import Workbook
+
+        self.path = path
+        self.livro = Workbook(write_only=True)
+        self.planilha = self.livro.create_sheet(titulo[:31])
+        self.planilha.append(rotulos)
+
+    def escrever(self, bloco: pd.DataFrame, monetarias: list) -> None:
+        for linha in bloco.astype(object).where(bloco.notna(), None).itertuples(index=False, name=None):
+            self.planilha.append(linha)
+
+    def fechar(self) -> None:
+        self.livro.save(self.path)
+
+
+class _EscritorHtml:
+    def __init__(self, path: Path, titulo: str, rotulos: list):
+        self.arquivo = open(path, "w", encoding="utf-8")
+        cabecalho = "".join(f"<th>{html.escape(r)}</th>" for r in rotulos)
+        self.arquivo.write(
+            "<!DOCTYPE html>\n<html lang=\"pt-BR\"><head><meta charset=\"utf-8\">"
+            f"<title>{html.escape(titulo)}</title><style>"
+            "body{font-family:sans-serif;color:#333}h1{color:#d48aa9}"
+            "table{border-collapse:collapse}th,td{border:1px solid #f1c6d6;padding:4px 8px}"
+            "th{background:#f1c6d6}td.num{text-align:right}"
+            f"</style></head><body><h1>{html.escape(titulo)}</h1>\n<table><thead><tr>{cabecalho}</tr></thead><tbody>\n"
+        )
+
+    def escrever(self, bloco: pd.DataFrame, monetarias: list) -> None:
+        linhas = pd.Series("<tr>", index=bloco.index)
+        for coluna in bloco.columns:
+            valores = bloco[coluna]
+            if coluna in monetarias:
+                celulas = '<td class="num">' + valores.map(formatar_moeda) + "</td>"
+            else:
+                celulas = "<td>" + valores.astype(object).where(valores.notna(), "").astype(str).map(html.escape) + "</td>"
+            linhas = linhas + celulas
+        self.arquivo.write("\n".join(linhas + "</tr>"))
+        self.arquivo.write("\n")
+
+    def fechar(self) -> None:
+        self.arquivo.write("</tbody></table></body></html>\n")
+        self.arquivo.close()
+
+
+_ESCRITORES = {"csv": _EscritorCsv, "xlsx": _EscritorXlsx, "html": _EscritorHtml}
+
+
+def exportar(df: pd.DataFrame, tipo: str, formato: str, destino: Path, progresso=None,
+             tamanho_bloco: int = TAMANHO_BLOCO) -> Path:
+    """Grava o relatório `tipo` da tabela de gastos (centavos) em `destino`, bloco a bloco.
+
+    progresso(feitos, total), se dado, é chamada depois de cada bloco, com
+    o número de gastos já processados.
+    """
+    titulo, colunas, monetarias = RELATORIOS[tipo]
+    if formato == "xlsx" and _linhas_relatorio(tipo, df) > MAX_LINHAS_XLSX:
+        raise ValueError(f"O relatório tem mais de {MAX_LINHAS_XLSX:,} linhas, o limite do XLSX; use CSV.".replace(",", "."))
+    destino = Path(destino)
+    tmp_path = destino.with_name(destino.name + ".tmp")
+    nomes = [nome for nome, _ in colunas]
+    escritor = _ESCRITORES[formato](tmp_path, titulo, [rotulo for _, rotulo in colunas])
+    try:
+        try:
+            feitos = 0
+            for bloco, gastos in _BLOCOS[tipo](df, tamanho_bloco):
+                escritor.escrever(em_reais(bloco[nomes], monetarias), monetarias)
+                feitos += gastos
+                if progresso is not None:
+                    progresso(feitos, len(df))
+        finally:
+            escritor.fechar()
+        os.replace(tmp_path, destino)
+    except BaseException:
+        # Falhou no meio: não deixa o arquivo parcial para trás
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return destino
+
+
+class Exportacao:
+    """Um relatório sendo gerado (ou pronto) num pool de threads.
+
+    progresso vai de 0 a 1; concluida diz se terminou (com sucesso, erro
+    ou cancelada por descartar()); erro traz a exceção, se houve.
+    """
+
+    def __init__(self, pool, df: pd.DataFrame, tipo: str, formato: str, destino: Path):
+        self.tipo = tipo
+        self.formato = formato
+        self.destino = Path(destino)
+        self.progresso = 0.0
+        self._future: Future = pool.submit(exportar, df, tipo, formato, self.destino, self._avancar)
+
+    def _avancar(self, feitos: int, total: int) -> None:
+        self.progresso = feitos / total if total else 1.0
+
+    @property
+    def concluida(self) -> bool:
+        return self._future.done()
+
+    @property
+    def erro(self):
+        # Uma cancelada não tem exceção (exception() levantaria CancelledError)
+        if not self._future.done() or self._future.cancelled():
+            return None
+        return self._future.exception()
+
+    @property
+    def mime(self) -> str:
+        return FORMATOS[self.formato][0]
+
+    @property
+    def nome_arquivo(self) -> str:
+        return self.tipo + FORMATOS[self.formato][1]
+
+    def descartar(self) -> None:
+        """Cancela se ainda não começou e apaga o arquivo gerado."""
+        self._future.cancel()
+        self._future.add_done_callback(lambda _: self.destino.unlink(missing_ok=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta um relatório de um plano.")
+    parser.add_argument("dados", type=Path, help="arquivo de dados do plano")
+    parser.add_argument("relatorio", choices=list(RELATORIOS))
+    parser.add_argument("--formato", choices=list(FORMATOS), default="csv")
+    parser.add_argument("--saida", type=Path, required=True)
+    args = parser.parse_args()
+
+    tabela = abrir_storage(args.dados).ler()
+    exportar(tabela, args.relatorio, args.formato, args.saida,
+             lambda feitos, total: print(f"\r{feitos}/{total} gasto(s)", end="", flush=True))
+    print(f"\n{args.saida} gravado")
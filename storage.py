@@ -0,0 +1,1053 @@
+"""Camada de armazenamento dos gastos: backends CSV/Arrow (com journal) e SQLite.
+
+Os backends não são thread-safe por si só; quem os usa (app.py) serializa
+as chamadas com um lock.
+"""
+import argparse
+import atexit
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+# Colunas base do CSV
+COLUMNS = [
+    "id",
+    "categoria",
+    "fornecedor",
+    "descricao",
+    "valor_total",
+    "entrada",
+    "num_parcelas",
+    "valor_parcela",
+    "parcelas_pagas",
+    "porcentagem_paga",
+    "data_primeira_parcela",
+    "observacoes",
+    "versao",  # versão da linha, incrementada a cada escrita (controle otimista)
+]
+
+# Colunas monetárias: em memória (e no formato colunar) são centavos inteiros,
+# para que parcelas e totais fechem sem erro de arredondamento; CSV, SQLite e
+# journal continuam gravando reais
+COLUNAS_MONETARIAS = ["valor_total", "entrada", "valor_parcela"]
+
+# Colunas de texto; as de poucos valores distintos são guardadas como categorias
+# (descrição, observações e datas são quase todas distintas: ficam como texto)
+COLUNAS_TEXTO = ["categoria", "fornecedor", "descricao", "data_primeira_parcela", "observacoes"]
+COLUNAS_CATEGORICAS = ["categoria", "fornecedor"]
+
+# Tipos numéricos da representação em memória
+_TIPOS_NUMERICOS = {
+    "id": "int64",
+    "valor_total": "int64",
+    "entrada": "int64",
+    "num_parcelas": "int32",
+    "valor_parcela": "int64",
+    "parcelas_pagas": "int32",
+    "porcentagem_paga": "float64",
+    "versao": "int32",
+}
+
+# Status de pagamento derivados de porcentagem_paga
+STATUS_COMPLETO = "completo"
+STATUS_EM_ANDAMENTO = "em_andamento"
+STATUS_NAO_INICIADO = "nao_iniciado"
+STATUS_OUTRO = "outro"  # fora das faixas válidas (ex.: porcentagem acima de 100)
+
+JOURNAL_MAX_BYTES = 256 * 1024  # acima disso o journal é compactado no snapshot
+JOURNAL_MAX_REGISTROS = 1000  # escritas maiores vão direto para um novo snapshot
+
+# Escrita atrasada (EscritaAtrasada): segundos entre uma escrita e a gravação
+# em disco, e quantas linhas pendentes forçam a gravação na hora
+ESCRITA_INTERVALO_S = 1.0
+ESCRITA_MAX_PENDENTES = 500
+
+logger = logging.getLogger(__name__)
+
+
+def para_centavos(reais):
+    """Reais (escalar ou série) em centavos inteiros, arredondados ao centavo."""
+    if isinstance(reais, pd.Series):
+        return (reais.astype("float64") * 100).round().astype("int64")
+    return int(round(float(reais) * 100))
+
+
+def para_reais(centavos):
+    """Centavos (escalar ou série) em reais, para exibir ou gravar."""
+    if isinstance(centavos, pd.Series):
+        return centavos / 100
+    return int(centavos) / 100
+
+
+def valor_pago(entrada, parcelas_pagas, valor_parcela, num_parcelas, valor_total):
+    """Centavos pagos: entrada mais as parcelas pagas (escalares ou séries).
+
+    A última parcela leva os centavos que sobram da divisão, então um gasto
+    com todas as parcelas pagas soma exatamente o valor total.
+    """
+    ultima = valor_total - entrada - (num_parcelas - 1) * valor_parcela
+    pago = entrada + parcelas_pagas * valor_parcela
+    return pago + np.where(parcelas_pagas >= num_parcelas, ultima - valor_parcela, 0)
+
+
+def tipos_internos(df: pd.DataFrame) -> pd.DataFrame:
+    """Representação em memória de uma tabela já em centavos.
+
+    Inteiros de 32 bits para contagens e versões; categoria e fornecedor
+    viram categorias e os demais textos ficam como texto (vazios em vez de
+    ausentes).
+    """
+    df = df.astype(_TIPOS_NUMERICOS)
+    for col in COLUNAS_TEXTO:
+        serie = df[col]
+        if col not in COLUNAS_CATEGORICAS:
+            df[col] = serie.astype(object).where(serie.notna(), "")
+            continue
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype("category")
+        if serie.hasnans:
+            if "" not in serie.cat.categories:
+                serie = serie.cat.add_categories("")
+            serie = serie.fillna("")
+        df[col] = serie
+    return df[COLUMNS]
+
+
+def tipar_dados(df: pd.DataFrame) -> pd.DataFrame:
+    """Garante as colunas base e converte valores em reais (CSV, SQL, journal) para a representação interna."""
+    # Garante que todas as colunas existam
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+
+    # Tipagem básica
+    for col in COLUNAS_MONETARIAS:
+        df[col] = para_centavos(pd.to_numeric(df[col], errors="coerce").fillna(0.0))
+    df["num_parcelas"] = pd.to_numeric(df["num_parcelas"], errors="coerce").fillna(1)
+    df["parcelas_pagas"] = pd.to_numeric(df["parcelas_pagas"], errors="coerce").fillna(0)
+    df["porcentagem_paga"] = pd.to_numeric(df["porcentagem_paga"], errors="coerce").fillna(0.0)
+    df["versao"] = pd.to_numeric(df["versao"], errors="coerce").fillna(0)
+
+    return tipos_internos(df)
+
+
+def em_reais(df: pd.DataFrame, colunas: list = None) -> pd.DataFrame:
+    """Cópia da tabela com as colunas monetárias (ou as indicadas) em reais, para gravar ou exibir."""
+    colunas = COLUNAS_MONETARIAS if colunas is None else colunas
+    return df.assign(**{col: para_reais(df[col]) for col in colunas})
+
+
+def _linha_em_reais(linha: dict) -> dict:
+    return {**linha, **{col: para_reais(linha[col]) for col in COLUNAS_MONETARIAS if col in linha}}
+
+
+def decimos_porcentagem(porcentagem):
+    """Porcentagem paga (escalar ou série) em décimos de ponto, arredondada.
+
+    porcentagem_paga é gravada com uma casa decimal; comparar em décimos
+    inteiros evita que ruído de ponto flutuante (99.99999...) mude o status.
+    Meios arredondam para longe do zero, como o round() do SQLite (a coluna
+    status do banco usa as mesmas faixas).
+    """
+    decimos = porcentagem * 10
+    return np.trunc(decimos + np.copysign(0.5, decimos))
+
+
+def mascara_status(porcentagem: pd.Series, status: str) -> pd.Series:
+    """Máscara booleana de um status sobre a coluna porcentagem_paga."""
+    decimos = decimos_porcentagem(porcentagem)
+    if status == STATUS_COMPLETO:
+        return decimos == 1000
+    if status == STATUS_EM_ANDAMENTO:
+        return (decimos > 0) & (decimos < 1000)
+    if status == STATUS_NAO_INICIADO:
+        return decimos == 0
+    raise ValueError(f"Status desconhecido: {status}")
+
+
+def _stat_chave(path: Path):
+    """Identidade barata de um arquivo: (mtime_ns, tamanho), ou None."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def caminho_lateral(data_path: Path, sufixo: str) -> Path:
+    """Arquivo auxiliar de um arquivo de dados (journal, agregados, livro, histórico).
+
+    O nome leva a extensão do arquivo de dados: gastos.csv e gastos.parquet
+    no mesmo diretório não dividem auxiliares.
+    """
+    data_path = Path(data_path)
+    return data_path.with_name(data_path.name + sufixo)
+
+
+def adotar_lateral(data_path: Path, sufixo: str) -> Path:
+    """caminho_lateral, renomeando para ele o auxiliar com o nome antigo (só o nome-base).
+
+    O antigo só é adotado se nenhum outro arquivo de dados tiver o mesmo
+    nome-base; senão, não há como saber de qual deles ele é e fica onde está.
+    """
+    data_path = Path(data_path)
+    path = caminho_lateral(data_path, sufixo)
+    antigo = data_path.with_name(data_path.stem + sufixo)
+    if not path.exists() and antigo.exists():
+        irmaos = [
+            p for p in data_path.parent.glob(glob.escape(data_path.stem) + ".*")
+            if p.suffix in _SUFIXOS_DADOS and p.name != data_path.name
+        ]
+        if irmaos:
+            logger.warning("%s pode ser de %s ou de %s; não foi adotado", antigo, data_path, irmaos[0])
+        else:
+            os.replace(antigo, path)
+    return path
+
+
+def _json_default(valor):
+    """Converte escalares numpy (int64/float64) em tipos nativos do Python."""
+    if hasattr(valor, "item"):
+        return valor.item()
+    raise TypeError(f"Valor não serializável: {valor!r}")
+
+
+def _preparar_escrita(gastos: list, esperadas: list, versoes: dict, proximo_id: int):
+    """Confere as versões esperadas e monta as linhas a gravar (compare-and-swap).
+
+    versoes mapeia id -> versão atual. Uma versão esperada None indica
+    inserção: se o id já existir (outra sessão inseriu antes), o gasto
+    recebe um id novo. Retorna (linhas, ids_em_conflito).
+    """
+    linhas, conflitos = [], []
+    for gasto, esperada in zip(gastos, esperadas):
+        if esperada is None:
+            gasto_id = gasto["id"]
+            if gasto_id in versoes or gasto_id < proximo_id:
+                gasto_id = proximo_id
+            proximo_id = gasto_id + 1
+            linhas.append({**gasto, "id": gasto_id, "versao": 1})
+        elif versoes.get(gasto["id"]) != esperada:
+            conflitos.append(gasto["id"])
+        else:
+            linhas.append({**gasto, "versao": int(esperada) + 1})
+    return linhas, conflitos
+
+
+def relatorio_conflitos(atuais: pd.DataFrame, gastos: list, esperadas: list, ids: list) -> list:
+    """Detalha cada conflito: versão esperada, versão atual e as duas linhas."""
+    por_id = {g["id"]: (g, e) for g, e in zip(gastos, esperadas)}
+    atuais = atuais.set_index("id")
+    relatorio = []
+    for gasto_id in ids:
+        sua, esperada = por_id[gasto_id]
+        atual = atuais.loc[gasto_id].to_dict() if gasto_id in atuais.index else None
+        relatorio.append({
+            "id": gasto_id,
+            "versao_esperada": esperada,
+            "versao_atual": None if atual is None else int(atual["versao"]),
+            "sua": sua,
+            "atual": atual,
+        })
+    return relatorio
+
+
+def gastos_pendentes(df: pd.DataFrame) -> pd.DataFrame:
+    """Gastos com saldo a pagar, com o valor_restante, ordenados pela data da primeira parcela."""
+    valor_restante = df["valor_total"] - valor_pago(
+        df["entrada"], df["parcelas_pagas"], df["valor_parcela"], df["num_parcelas"], df["valor_total"]
+    )
+    pendentes = df[valor_restante > 0].assign(valor_restante=valor_restante[valor_restante > 0])
+    pendentes["data_primeira_parcela"] = pd.to_datetime(pendentes["data_primeira_parcela"])
+    return pendentes.sort_values("data_primeira_parcela")
+
+
+def _aplicar_registros(df: pd.DataFrame, registros: list) -> pd.DataFrame:
+    """Aplica registros de journal (upsert/delete por id) sobre um DataFrame."""
+    if not registros:
+        return df
+
+    linhas = []
+    removidos = set()
+    for reg in registros:
+        if reg["op"] == "upsert":
+            linhas.append(reg["row"])
+            removidos.discard(reg["row"]["id"])
+        elif reg["op"] == "delete":
+            removidos.add(reg["id"])
+
+    if linhas:
+        # Os registros guardam reais; o df já está na representação interna.
+        # Tabela vazia fica de fora do concat (o pandas avisa sobre partes vazias)
+        novas = tipar_dados(pd.DataFrame(linhas))
+        combinado = pd.concat([df, novas], ignore_index=True) if not df.empty else novas
+        # Mantém a posição original do gasto e o valor do último registro
+        ordem = combinado["id"].drop_duplicates(keep="first")
+        ultimos = combinado.drop_duplicates("id", keep="last").set_index("id")
+        df = ultimos.loc[ordem.values].reset_index()
+    if removidos:
+        df = df[~df["id"].isin(removidos)]
+
+    return tipos_internos(df.reset_index(drop=True))
+
+
+class _SnapshotStorage:
+    """Snapshot em arquivo + journal (JSON lines) de inserções e edições.
+
+    As subclasses definem o formato do snapshot em _ler_snapshot() e
+    _escrever_arquivo(); journal, compactação e consultas são comuns.
+    """
+
+    def __init__(self, path: Path, journal: bool = True):
+        self.path = Path(path)
+        self.journal = journal
+        self.journal_path = adotar_lateral(self.path, ".journal")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Snapshot já tipado, reaproveitado enquanto o arquivo não mudar
+        self._snap_chave = None
+        self._snap_df = None
+        # Versão atual de cada id, para o compare-and-swap das escritas
+        self._versoes = None
+        self._versoes_chave = None
+        self._proximo_id = 1
+        self._em_lote = 0  # lotes abertos: journal sem limites até o fim (ver lote)
+        if not self.path.exists():
+            self._gravar_snapshot(pd.DataFrame(columns=COLUMNS))
+
+    def identidade(self) -> tuple:
+        """Muda sempre que o conteúdo persistido pode ter mudado."""
+        return (_stat_chave(self.path), _stat_chave(self.journal_path))
+
+    def _ler_snapshot(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def _escrever_arquivo(self, df: pd.DataFrame, destino: Path) -> None:
+        raise NotImplementedError
+
+    def _snapshot(self) -> pd.DataFrame:
+        snap_chave = _stat_chave(self.path)
+        if self._snap_df is None or self._snap_chave != snap_chave:
+            self._snap_df = self._ler_snapshot()
+            self._snap_chave = snap_chave
+        return self._snap_df
+
+    def _ler_journal(self) -> list:
+        """Lê os registros do journal, ignorando uma última linha truncada."""
+        if not self.journal or not self.journal_path.exists():
+            return []
+        registros = []
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registros.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    # Escrita interrompida no meio: o registro não foi confirmado
+                    break
+        return registros
+
+    def ler(self) -> pd.DataFrame:
+        """Snapshot com o journal reaplicado."""
+        return _aplicar_registros(self._snapshot(), self._ler_journal())
+
+    def _gravar_snapshot(self, df: pd.DataFrame) -> None:
+        """Grava o snapshot de forma atômica (arquivo temporário + rename)."""
+        df = tipos_internos(df)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._escrever_arquivo(df, tmp_path)
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        # O snapshot recém-gravado já entra no cache, sem nova leitura
+        self._snap_df = df
+        self._snap_chave = _stat_chave(self.path)
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        """Grava o DataFrame inteiro como novo snapshot."""
+        self._gravar_snapshot(df)
+        # O snapshot já contém tudo que estava no journal
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+    def _journal_append(self, registros: list) -> None:
+        """Acrescenta registros ao journal com um fsync; compacta se crescer demais."""
+        if len(registros) > JOURNAL_MAX_REGISTROS and not self._em_lote:
+            # Lote grande (ex.: importação): seria compactado logo em seguida,
+            # então vai direto para um novo snapshot
+            self.salvar(_aplicar_registros(self.ler(), registros))
+            return
+        linhas = "".join(
+            json.dumps(reg, ensure_ascii=False, default=_json_default) + "\n" for reg in registros
+        )
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(linhas)
+            f.flush()
+            os.fsync(f.fileno())
+            tamanho = f.tell()
+        if tamanho > JOURNAL_MAX_BYTES and not self._em_lote:
+            self.compactar()
+
+    @contextmanager
+    def lote(self):
+        """Sequência de escritas (ex.: importação em blocos) que vão todas para o journal.
+
+        Sem ele, cada escrita que passa dos limites do journal regrava o
+        snapshot inteiro; com ele, o journal é compactado uma única vez, no
+        fim do lote mais externo.
+        """
+        self._em_lote += 1
+        try:
+            yield self
+        finally:
+            self._em_lote -= 1
+        if not self._em_lote:
+            self.compactar()
+
+    def _versoes_atuais(self) -> dict:
+        """id -> versão; reconstruído só se os arquivos mudaram por fora."""
+        chave = self.identidade()
+        if self._versoes is None or self._versoes_chave != chave:
+            df = self.ler()
+            self._versoes = dict(zip(df["id"].tolist(), df["versao"].tolist()))
+            self._proximo_id = max(self._versoes, default=0) + 1
+            self._versoes_chave = chave
+        return self._versoes
+
+    def upsert(self, gastos: list, versoes_esperadas: list = None) -> tuple:
+        """Insere ou atualiza gastos (por id), num único registro durável.
+
+        Cada gasto é gravado só se a versão da linha ainda for a esperada
+        (None para inserções). Retorna (linhas gravadas, conflitos): as
+        linhas são os gastos, na mesma ordem, com o id (trocado se a
+        inserção colidiu) e a versão que receberam. Se alguma versão
+        divergir, nada é gravado e retorna ([], relatório de conflitos).
+        """
+        esperadas = versoes_esperadas or [None] * len(gastos)
+        versoes = self._versoes_atuais()
+        linhas, conflitos = _preparar_escrita(gastos, esperadas, versoes, self._proximo_id)
+        if conflitos:
+            return [], relatorio_conflitos(self.ler(), gastos, esperadas, conflitos)
+
+        self._gravar_linhas(linhas)
+        return linhas, []
+
+    def gravar_linhas(self, linhas: list, versoes_base: list) -> list:
+        """Grava linhas com id e versão já definidos (ex.: pela EscritaAtrasada).
+
+        Cada linha só é gravada se a versão no arquivo ainda for a de
+        versoes_base (None = id ainda inexistente). Se alguma divergir, nada
+        é gravado e retorna os ids em conflito; sem conflitos, retorna [].
+        """
+        versoes = self._versoes_atuais()
+        conflitos = [linha["id"] for linha, base in zip(linhas, versoes_base) if versoes.get(linha["id"]) != base]
+        if conflitos:
+            return conflitos
+        self._gravar_linhas(linhas)
+        return []
+
+    def _gravar_linhas(self, linhas: list) -> None:
+        versoes = self._versoes_atuais()
+        registros = [{"op": "upsert", "row": _linha_em_reais(linha)} for linha in linhas]
+        if not self.journal:
+            self.salvar(_aplicar_registros(self.ler(), registros))
+        else:
+            self._journal_append(registros)
+
+        for linha in linhas:
+            versoes[linha["id"]] = linha["versao"]
+            self._proximo_id = max(self._proximo_id, linha["id"] + 1)
+        self._versoes_chave = self.identidade()
+
+    def compactar(self) -> None:
+        """Incorpora o journal ao snapshot (troca atômica) e zera o journal."""
+        registros = self._ler_journal()
+        if not registros:
+            return
+        self._gravar_snapshot(_aplicar_registros(self._snapshot(), registros))
+        # Se cair aqui, o replay do journal sobre o novo snapshot é idempotente
+        self.journal_path.unlink()
+
+
+class CsvStorage(_SnapshotStorage):
+    """Snapshot CSV; só é reprocessado se o hash do conteúdo mudar."""
+
+    _snap_hash = None
+
+    def _ler_snapshot(self) -> pd.DataFrame:
+        conteudo = self.path.read_bytes()
+        hash_conteudo = hashlib.sha1(conteudo).hexdigest()
+        if self._snap_df is not None and self._snap_hash == hash_conteudo:
+            return self._snap_df
+        self._snap_hash = hash_conteudo
+        textos = {col: str for col in COLUNAS_TEXTO}
+        return tipar_dados(pd.read_csv(io.BytesIO(conteudo), dtype=textos))
+
+    def _escrever_arquivo(self, df: pd.DataFrame, destino: Path) -> None:
+        conteudo = em_reais(df).to_csv(index=False).encode("utf-8")
+        destino.write_bytes(conteudo)
+        self._snap_hash = hashlib.sha1(conteudo).hexdigest()
+
+
+_CENTAVOS = {b"unidade": b"centavos"}
+ARROW_SCHEMA = pa.schema([
+    pa.field("id", pa.int64()),
+    pa.field("categoria", pa.dictionary(pa.int32(), pa.string())),
+    pa.field("fornecedor", pa.dictionary(pa.int32(), pa.string())),
+    pa.field("descricao", pa.string()),
+    pa.field("valor_total", pa.int64(), metadata=_CENTAVOS),
+    pa.field("entrada", pa.int64(), metadata=_CENTAVOS),
+    pa.field("num_parcelas", pa.int32()),
+    pa.field("valor_parcela", pa.int64(), metadata=_CENTAVOS),
+    pa.field("parcelas_pagas", pa.int32()),
+    pa.field("porcentagem_paga", pa.float64()),
+    pa.field("data_primeira_parcela", pa.date32()),
+    pa.field("observacoes", pa.string()),
+    pa.field("versao", pa.int64()),
+])
+
+
+def _para_arrow(df: pd.DataFrame) -> pa.Table:
+    """Converte o DataFrame tipado para uma tabela com ARROW_SCHEMA."""
+    colunas = {}
+    for campo in ARROW_SCHEMA:
+        serie = df[campo.name]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype(object)
+        if campo.name in COLUNAS_MONETARIAS:
+            serie = serie.astype("int64")
+        elif campo.name == "data_primeira_parcela":
+            serie = pd.to_datetime(serie, errors="coerce").dt.date
+        elif pa.types.is_string(campo.type) or pa.types.is_dictionary(campo.type):
+            serie = serie.where(serie.isna(), serie.astype(str))
+        colunas[campo.name] = pa.array(serie, type=campo.type, from_pandas=True)
+    return pa.table(colunas, schema=ARROW_SCHEMA)
+
+
+def _de_arrow(tabela: pa.Table) -> pd.DataFrame:
+    """Converte uma tabela ARROW_SCHEMA no DataFrame usado pelo app.
+
+    Os centavos e os dicionários do arquivo vão direto para a representação
+    em memória, sem o parse e os pd.to_numeric(..., errors="coerce") do
+    caminho CSV.
+    """
+    colunas = {}
+    for campo in ARROW_SCHEMA:
+        coluna = tabela.column(campo.name)
+        if campo.name == "data_primeira_parcela":
+            coluna = pc.cast(coluna, pa.string())
+        colunas[campo.name] = coluna
+    return tipos_internos(pa.table(colunas).to_pandas())
+
+
+class ArrowStorage(_SnapshotStorage):
+    """Snapshot colunar tipado (Parquet ou Arrow IPC), lido via memory map.
+
+    No formato IPC (.arrow/.feather) a leitura é zero-copy sobre o mmap;
+    no Parquet o arquivo é mapeado e apenas decodificado.
+    """
+
+    def __init__(self, path: Path, formato: str = "parquet", journal: bool = True):
+        self.formato = formato
+        super().__init__(path, journal)
+
+    def _ler_snapshot(self) -> pd.DataFrame:
+        if self.formato == "ipc":
+            with pa.memory_map(str(self.path), "r") as fonte:
+                tabela = ipc.open_file(fonte).read_all()
+        else:
+            tabela = pq.read_table(self.path, memory_map=True)
+        if "versao" not in tabela.schema.names:
+            # Arquivos gravados antes do controle de versão por linha
+            tabela = tabela.append_column("versao", pa.array([0] * tabela.num_rows, pa.int64()))
+        return _de_arrow(tabela.cast(ARROW_SCHEMA))
+
+    def _escrever_arquivo(self, df: pd.DataFrame, destino: Path) -> None:
+        tabela = _para_arrow(df)
+        if self.formato == "ipc":
+            with ipc.new_file(str(destino), ARROW_SCHEMA) as escritor:
+                escritor.write_table(tabela)
+        else:
+            pq.write_table(tabela, destino)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gastos (
+    id INTEGER PRIMARY KEY,
+    categoria TEXT NOT NULL DEFAULT '',
+    fornecedor TEXT,
+    descricao TEXT,
+    valor_total REAL NOT NULL DEFAULT 0,
+    entrada REAL NOT NULL DEFAULT 0,
+    num_parcelas INTEGER NOT NULL DEFAULT 1,
+    valor_parcela REAL NOT NULL DEFAULT 0,
+    parcelas_pagas INTEGER NOT NULL DEFAULT 0,
+    porcentagem_paga REAL NOT NULL DEFAULT 0,
+    data_primeira_parcela TEXT,
+    observacoes TEXT,
+    versao INTEGER NOT NULL DEFAULT 0,
+    valor_restante REAL GENERATED ALWAYS AS
+        (valor_total - (entrada + parcelas_pagas * valor_parcela)) VIRTUAL,
+    -- Mesmas faixas de mascara_status, em décimos de ponto arredondados
+    status TEXT GENERATED ALWAYS AS (
+        CASE
+            WHEN round(porcentagem_paga * 10) = 0 THEN 'nao_iniciado'
+            WHEN round(porcentagem_paga * 10) = 1000 THEN 'completo'
+            WHEN round(porcentagem_paga * 10) BETWEEN 1 AND 999 THEN 'em_andamento'
+            ELSE 'outro'
+        END
+    ) VIRTUAL
+);
+-- Sem consultas por categoria ou data no banco: índices de versões antigas saem
+DROP INDEX IF EXISTS idx_gastos_categoria;
+DROP INDEX IF EXISTS idx_gastos_data;
+CREATE INDEX IF NOT EXISTS idx_gastos_status ON gastos(status);
+"""
+
+_SQL_COLUNAS = ", ".join(COLUMNS)
+_SQL_INSERT = f"INSERT INTO gastos ({_SQL_COLUNAS}) VALUES ({', '.join('?' * len(COLUMNS))})"
+_SQL_UPDATE_CAS = (
+    "UPDATE gastos SET "
+    + ", ".join(f"{c} = ?" for c in COLUMNS if c != "id")
+    + " WHERE id = ? AND versao = ?"
+)
+_SQL_UPSERT = (
+    f"INSERT INTO gastos ({_SQL_COLUNAS}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "id")
+)
+
+
+def _valores_sql(gasto: dict) -> dict:
+    # Reais, e sem escalares numpy (int64/float64), que o sqlite3 não aceita
+    return {c: _json_default(v) if hasattr(v, "item") else v for c, v in _linha_em_reais(gasto).items()}
+
+
+class SqliteStorage:
+    """Tabela SQLite tipada, com CAS por linha nas escritas.
+
+    Filtros e consultas são feitos em memória pelo app (índices e agregados);
+    a coluna status só serve à conferência de divergencias_status.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        colunas = {linha[1] for linha in self.conn.execute("PRAGMA table_info(gastos)")}
+        if colunas and "versao" not in colunas:
+            # Bancos criados antes do controle de versão por linha
+            self.conn.execute("ALTER TABLE gastos ADD COLUMN versao INTEGER NOT NULL DEFAULT 0")
+        (definicao,) = self.conn.execute(
+            "SELECT COALESCE(MAX(sql), '') FROM sqlite_master WHERE type = 'table' AND name = 'gastos'"
+        ).fetchone()
+        if colunas and "'outro'" not in definicao:
+            self._recriar_tabela()
+        self.conn.executescript(_SQLITE_SCHEMA)
+
+    def _recriar_tabela(self) -> None:
+        """Recria a tabela com a coluna status atual (colunas geradas não podem ser alteradas)."""
+        self.conn.executescript(
+            "BEGIN;"
+            "DROP INDEX IF EXISTS idx_gastos_categoria;"
+            "DROP INDEX IF EXISTS idx_gastos_data;"
+            "DROP INDEX IF EXISTS idx_gastos_status;"
+            "ALTER TABLE gastos RENAME TO gastos_anterior;"
+            + _SQLITE_SCHEMA
+            + f"INSERT INTO gastos ({_SQL_COLUNAS}) SELECT {_SQL_COLUNAS} FROM gastos_anterior;"
+            "DROP TABLE gastos_anterior;"
+            "COMMIT;"
+        )
+
+    def identidade(self) -> tuple:
+        return (_stat_chave(self.path), self.conn.total_changes)
+
+    def ler(self) -> pd.DataFrame:
+        return tipar_dados(pd.read_sql_query(f"SELECT {_SQL_COLUNAS} FROM gastos ORDER BY id", self.conn))
+
+    @staticmethod
+    def _linhas(df: pd.DataFrame):
+        df = em_reais(df[COLUMNS]).astype(object)
+        return df.where(df.notna(), None).itertuples(index=False, name=None)
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM gastos")
+            self.conn.executemany(_SQL_UPSERT, self._linhas(df))
+
+    def upsert(self, gastos: list, versoes_esperadas: list = None) -> tuple:
+        """Mesma semântica de _SnapshotStorage.upsert, numa transação IMMEDIATE.
+
+        A atualização só acontece com WHERE id = ? AND versao = ?, então o
+        compare-and-swap vale também entre processos.
+        """
+        esperadas = versoes_esperadas or [None] * len(gastos)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            linhas, conflitos = [], []
+            for gasto, esperada in zip(gastos, esperadas):
+                valores = _valores_sql(gasto)
+                if esperada is None:
+                    existe = self.conn.execute("SELECT 1 FROM gastos WHERE id = ?", (valores["id"],)).fetchone()
+                    if existe:
+                        (valores["id"],) = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM gastos").fetchone()
+                    valores["versao"] = 1
+                    self.conn.execute(_SQL_INSERT, [valores.get(c) for c in COLUMNS])
+                else:
+                    valores["versao"] = int(esperada) + 1
+                    cursor = self.conn.execute(
+                        _SQL_UPDATE_CAS,
+                        [valores.get(c) for c in COLUMNS if c != "id"] + [valores["id"], int(esperada)],
+                    )
+                    if cursor.rowcount == 0:
+                        conflitos.append(valores["id"])
+                linhas.append({**gasto, "id": valores["id"], "versao": valores["versao"]})
+            if conflitos:
+                self.conn.rollback()
+                return [], relatorio_conflitos(self.ler(), gastos, esperadas, conflitos)
+            self.conn.commit()
+            return linhas, []
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def gravar_linhas(self, linhas: list, versoes_base: list) -> list:
+        """Mesma semântica de _SnapshotStorage.gravar_linhas, numa transação IMMEDIATE."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            conflitos = []
+            for linha, base in zip(linhas, versoes_base):
+                atual = self.conn.execute("SELECT versao FROM gastos WHERE id = ?", (int(linha["id"]),)).fetchone()
+                if (None if atual is None else atual[0]) != base:
+                    conflitos.append(linha["id"])
+            if conflitos:
+                self.conn.rollback()
+                return conflitos
+            self.conn.executemany(
+                _SQL_UPSERT, ([_valores_sql(linha).get(c) for c in COLUMNS] for linha in linhas)
+            )
+            self.conn.commit()
+            return []
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def compactar(self) -> None:
+        self.conn.execute("PRAGMA optimize")
+
+    @contextmanager
+    def lote(self):
+        """Mesma interface de _SnapshotStorage.lote; no SQLite cada escrita já é incremental."""
+        yield self
+
+    def contar_status(self) -> dict:
+        """Gastos por status, pela coluna gerada."""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM gastos GROUP BY status").fetchall())
+
+
+def divergencias_status(storage: SqliteStorage) -> dict:
+    """Status cuja contagem pela coluna gerada do SQLite difere da de mascara_status sobre a tabela lida.
+
+    Retorna {status: (contagem no SQLite, contagem no pandas)}; vazio se conferem.
+    """
+    porcentagem = storage.ler()["porcentagem_paga"]
+    faixas = (STATUS_NAO_INICIADO, STATUS_COMPLETO, STATUS_EM_ANDAMENTO)
+    contagens = {status: int(mascara_status(porcentagem, status).sum()) for status in faixas}
+    contagens[STATUS_OUTRO] = len(porcentagem) - sum(contagens.values())
+    no_banco = storage.contar_status()
+    return {
+        status: (no_banco.get(status, 0), contagem)
+        for status, contagem in contagens.items()
+        if no_banco.get(status, 0) != contagem
+    }
+
+
+class EscritaAtrasada:
+    """Escrita atrasada (write-behind) sobre outro storage, com a mesma interface.
+
+    upsert e salvar conferem as versões contra o estado em memória (o do
+    disco mais as escritas pendentes) e retornam na hora; as pendentes vão
+    para o storage numa única escrita (um registro no journal, um fsync)
+    até `intervalo` segundos depois, por uma thread, ou na própria chamada
+    se passarem de `max_pendentes` linhas. Edições seguidas da mesma linha
+    viram uma só. Leituras já enxergam as pendentes.
+
+    Durabilidade: descarregar() grava tudo na hora, e as pendentes de todas
+    as instâncias são gravadas na saída normal do processo (atexit); uma
+    queda do processo perde no máximo as escritas do último intervalo. Vale
+    para um único processo escrevendo no arquivo: o que outro gravar por
+    fora nas linhas pendentes aparece como conflito no descarregamento. As
+    linhas em conflito não são gravadas (as demais, sim); o relatório delas
+    (como o do upsert) fica em `conflitos` e é repassado a ao_descarregar.
+
+    `lock` deve ser reentrante e é o mesmo que serializa as chamadas ao
+    storage; a thread o usa para descarregar.
+    """
+
+    def __init__(self, storage, lock, intervalo: float = ESCRITA_INTERVALO_S, max_pendentes: int = ESCRITA_MAX_PENDENTES):
+        self.storage = storage
+        self.lock = lock
+        self.intervalo = intervalo
+        self.max_pendentes = max_pendentes
+        self.conflitos = []  # relatório das linhas descartadas no descarregamento por escrita de fora
+        # Chamada (com o lock) depois de cada descarregamento, com a identidade
+        # antes e depois e o relatório das linhas descartadas: sem elas, os
+        # dados não mudaram, só foram para o disco; com elas, o que está em
+        # memória inclui escritas que não chegaram ao disco
+        self.ao_descarregar = None
+        self._pendentes = {}  # id -> linha a gravar (a última versão)
+        self._bases = {}  # id -> versão no disco (None para inserções)
+        self._snapshot = None  # tabela inteira de um salvar() pendente
+        self._seq = 0
+        self._versoes = None  # id -> versão, com as pendentes
+        self._versoes_disco = None
+        self._proximo_id = 1
+        self._cheio = threading.Event()
+        self._thread = None
+        _ESCRITAS_ATRASADAS.add(self)
+
+    @property
+    def pendentes(self) -> int:
+        return len(self._pendentes) + (self._snapshot is not None)
+
+    def identidade(self) -> tuple:
+        with self.lock:
+            if not self.pendentes:
+                return self.storage.identidade()
+            return (self.storage.identidade(), "pendentes", self._seq)
+
+    def ler(self) -> pd.DataFrame:
+        with self.lock:
+            df = self.storage.ler() if self._snapshot is None else self._snapshot
+            registros = [{"op": "upsert", "row": _linha_em_reais(linha)} for linha in self._pendentes.values()]
+            return _aplicar_registros(df, registros)
+
+    def _versoes_atuais(self) -> dict:
+        disco = self.storage.identidade()
+        if self._versoes is None or self._versoes_disco != disco:
+            df = self.ler()
+            self._versoes = dict(zip(df["id"].tolist(), df["versao"].tolist()))
+            self._proximo_id = max(self._versoes, default=0) + 1
+            self._versoes_disco = disco
+        return self._versoes
+
+    def upsert(self, gastos: list, versoes_esperadas: list = None) -> tuple:
+        """Mesma semântica de _SnapshotStorage.upsert; a gravação fica pendente."""
+        esperadas = versoes_esperadas or [None] * len(gastos)
+        with self.lock:
+            versoes = self._versoes_atuais()
+            linhas, conflitos = _preparar_escrita(gastos, esperadas, versoes, self._proximo_id)
+            if conflitos:
+                return [], relatorio_conflitos(self.ler(), gastos, esperadas, conflitos)
+            for linha in linhas:
+                gasto_id = linha["id"]
+                if gasto_id not in self._pendentes:
+                    self._bases[gasto_id] = versoes.get(gasto_id)
+                self._pendentes[gasto_id] = linha
+                versoes[gasto_id] = linha["versao"]
+                self._proximo_id = max(self._proximo_id, gasto_id + 1)
+            self._agendar()
+            return linhas, []
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        """Substitui a tabela inteira; a gravação fica pendente (e absorve as anteriores)."""
+        with self.lock:
+            self._snapshot = tipos_internos(df.reset_index(drop=True))
+            self._pendentes.clear()
+            self._bases.clear()
+            self._versoes = dict(zip(self._snapshot["id"].tolist(), self._snapshot["versao"].tolist()))
+            self._proximo_id = max(self._versoes, default=0) + 1
+            self._versoes_disco = self.storage.identidade()
+            self._agendar()
+
+    def _agendar(self) -> None:
+        self._seq += 1
+        if len(self._pendentes) >= self.max_pendentes:
+            # Lote grande (ex.: importação): vai para o disco já
+            self.descarregar()
+        elif self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="escrita-atrasada", daemon=True)
+            self._thread.start()
+
+    def _executar(self) -> None:
+        while True:
+            time.sleep(self.intervalo)
+            with self.lock:
+                try:
+                    self.descarregar()
+                except Exception:
+                    # As pendentes continuam em memória; nova tentativa no próximo intervalo
+                    logger.exception("Falha ao gravar as escritas pendentes de %s", self.storage.path)
+                if not self.pendentes:
+                    self._thread = None
+                    return
+
+    def descarregar(self) -> None:
+        """Grava as escritas pendentes no storage, numa única escrita.
+
+        Linhas gravadas por fora desde a escrita pendente não são gravadas;
+        as demais vão para o disco assim mesmo.
+        """
+        with self.lock:
+            if not self.pendentes:
+                return
+            antes = self.identidade()
+            linhas = list(self._pendentes.values())
+            descartadas = []
+            if self._snapshot is not None:
+                registros = [{"op": "upsert", "row": _linha_em_reais(linha)} for linha in linhas]
+                self.storage.salvar(_aplicar_registros(self._snapshot, registros))
+            else:
+                bases = [self._bases[linha["id"]] for linha in linhas]
+                while linhas:
+                    conflitos = self.storage.gravar_linhas(linhas, bases)
+                    if not conflitos:
+                        break
+                    # Nada foi gravado: tira as linhas em conflito e tenta com as demais
+                    descartadas += conflitos
+                    restantes = [(linha, base) for linha, base in zip(linhas, bases) if linha["id"] not in conflitos]
+                    linhas, bases = [linha for linha, _ in restantes], [base for _, base in restantes]
+            relatorio = []
+            if descartadas:
+                logger.warning("Escritas pendentes em conflito com gravações de fora, descartadas: ids %s", descartadas)
+                relatorio = relatorio_conflitos(
+                    self.storage.ler(),
+                    [self._pendentes[gasto_id] for gasto_id in descartadas],
+                    [self._bases[gasto_id] for gasto_id in descartadas],
+                    descartadas,
+                )
+                self.conflitos += relatorio
+            self._pendentes.clear()
+            self._bases.clear()
+            self._snapshot = None
+            if descartadas:
+                self._versoes = None
+            else:
+                self._versoes_disco = self.storage.identidade()
+            if self.ao_descarregar is not None:
+                self.ao_descarregar(antes, self.identidade(), relatorio)
+
+    def compactar(self) -> None:
+        with self.lock:
+            self.descarregar()
+            self.storage.compactar()
+
+    @contextmanager
+    def lote(self):
+        """Lote do storage (ver _SnapshotStorage.lote); as pendentes vão para o disco antes de ele fechar.
+
+        Abrir e fechar (que compacta) são feitos com o lock, como as escritas.
+        """
+        with ExitStack() as pilha:
+            with self.lock:
+                pilha.enter_context(self.storage.lote())
+            try:
+                yield self
+            finally:
+                with self.lock:
+                    self.descarregar()
+                    pilha.close()
+
+
+# Instâncias vivas de EscritaAtrasada, descarregadas na saída do processo
+_ESCRITAS_ATRASADAS = weakref.WeakSet()
+
+
+@atexit.register
+def _descarregar_todas() -> None:
+    for escrita in list(_ESCRITAS_ATRASADAS):
+        try:
+            escrita.descarregar()
+        except Exception:
+            logger.exception("Falha ao gravar as escritas pendentes de %s na saída", escrita.storage.path)
+
+
+# Assinaturas no início do arquivo usadas na detecção do formato
+_ASSINATURAS = [
+    (b"SQLite format 3\x00", "sqlite"),
+    (b"PAR1", "parquet"),
+    (b"ARROW1", "ipc"),
+]
+_SUFIXOS = {
+    ".db": "sqlite",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+    ".parquet": "parquet",
+    ".arrow": "ipc",
+    ".feather": "ipc",
+}
+
+
+# Extensões de arquivos de dados (os auxiliares ficam ao lado, ver caminho_lateral)
+_SUFIXOS_DADOS = {".csv", *_SUFIXOS}
+
+
+def detectar_formato(path: Path) -> str:
+    """Detecta o formato pelo conteúdo do arquivo, ou pela extensão se não existir."""
+    path = Path(path)
+    if path.exists() and path.stat().st_size > 0:
+        with open(path, "rb") as f:
+            inicio = f.read(16)
+        for assinatura, formato in _ASSINATURAS:
+            if inicio.startswith(assinatura):
+                return formato
+        return "csv"
+    return _SUFIXOS.get(path.suffix.lower(), "csv")
+
+
+def abrir_storage(path: Path):
+    """Abre o backend adequado ao formato do arquivo de dados."""
+    formato = detectar_formato(path)
+    if formato == "sqlite":
+        return SqliteStorage(path)
+    if formato in ("parquet", "ipc"):
+        return ArrowStorage(path, formato)
+    return CsvStorage(path)
+
+
+def converter_storage(origem: Path, destino: Path) -> int:
+    """Converte os gastos entre formatos (CSV, SQLite, Parquet, Arrow IPC).
+
+    O journal pendente da origem, se houver, é compactado no snapshot
+    dela antes da cópia: não sobra para trás um journal da origem.
+    """
+    fonte = abrir_storage(origem)
+    fonte.compactar()
+    df = fonte.ler()
+    abrir_storage(destino).salvar(df)
+    return len(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Converte os gastos entre CSV, SQLite (.db), Parquet (.parquet) e Arrow (.arrow)."
+    )
+    parser.add_argument("origem", type=Path, help="arquivo de origem")
+    parser.add_argument("destino", type=Path, nargs="?", help="arquivo de destino (padrão: mesmo nome, .db)")
+    args = parser.parse_args()
+    destino = args.destino or args.origem.with_suffix(".db")
+    total = converter_storage(args.origem, destino)
+    print(f"{total} gasto(s) convertido(s) para {destino}")
+    convertido = abrir_storage(destino)
+    if isinstance(convertido, SqliteStorage):
+        # Os filtros do banco usam a coluna status; o app, mascara_status
+        divergencias = divergencias_status(convertido)
+        for status, (no_banco, no_pandas) in divergencias.items():
+            print(f"status {status}: {no_banco} no SQLite, {no_pandas} no pandas")
+        if divergencias:
+            raise SystemExit(1)
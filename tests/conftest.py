@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Os módulos do app ficam na raiz do repositório
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gerador import gerar_gastos  # noqa: E402
+from storage import abrir_storage  # noqa: E402
+
+N_GASTOS = 20
+
+
+def abrir_com_gastos(path: Path, n: int = N_GASTOS):
+    storage = abrir_storage(path)
+    storage.salvar(gerar_gastos(n, seed=1))
+    return storage
+
+
+def linha(storage, gasto_id: int) -> dict:
+    """A linha do gasto como dict (centavos), como o app a manda para upsert."""
+    df = storage.ler()
+    return df[df["id"] == gasto_id].iloc[0].to_dict()
+
+
+@pytest.fixture(params=["csv", "parquet", "arrow", "db"])
+def storage(request, tmp_path):
+    """Cada backend, com N_GASTOS gastos (ids 1..N_GASTOS, versão 0)."""
+    return abrir_com_gastos(tmp_path / f"gastos.{request.param}")
+
+
+@pytest.fixture(params=["csv", "parquet", "arrow"])
+def snapshot(request, tmp_path):
+    """Os backends de snapshot + journal."""
+    return abrir_com_gastos(tmp_path / f"gastos.{request.param}")
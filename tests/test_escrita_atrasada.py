@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from conftest import N_GASTOS, linha
+from storage import EscritaAtrasada
+
+
+@pytest.fixture
+def atrasada(storage):
+    # Intervalo longo: nos testes, o descarregamento é chamado explicitamente
+    escrita = EscritaAtrasada(storage, threading.RLock(), intervalo=3600)
+    yield escrita
+    escrita.descarregar()
+
+
+def test_edicoes_seguidas_da_mesma_linha_viram_uma_gravacao(atrasada, storage, monkeypatch):
+    gravacoes = []
+    gravar_linhas = storage.gravar_linhas
+    monkeypatch.setattr(
+        storage, "gravar_linhas", lambda linhas, bases: gravacoes.append(len(linhas)) or gravar_linhas(linhas, bases),
+    )
+    original = linha(storage, 1)
+    for i in range(5):
+        atual = linha(atrasada, 1)
+        _, conflitos = atrasada.upsert([{**atual, "descricao": f"v{i}"}], [atual["versao"]])
+        assert conflitos == []
+
+    assert atrasada.pendentes == 1
+    assert linha(atrasada, 1)["descricao"] == "v4"
+    assert linha(storage, 1)["descricao"] == original["descricao"]
+
+    atrasada.descarregar()
+    assert gravacoes == [1]
+    assert atrasada.pendentes == 0
+    gravada = linha(storage, 1)
+    assert gravada["descricao"] == "v4"
+    assert gravada["versao"] == original["versao"] + 5
+
+
+def test_upsert_com_versao_velha_e_recusado_na_hora(atrasada):
+    atual = linha(atrasada, 2)
+    atrasada.upsert([{**atual, "descricao": "primeira"}], [atual["versao"]])
+
+    gravadas, conflitos = atrasada.upsert([{**atual, "descricao": "segunda"}], [atual["versao"]])
+    assert gravadas == []
+    assert [c["id"] for c in conflitos] == [2]
+    assert conflitos[0]["versao_atual"] == atual["versao"] + 1
+    assert linha(atrasada, 2)["descricao"] == "primeira"
+
+
+def test_insercoes_pendentes_recebem_ids_novos(atrasada, storage):
+    novo = linha(atrasada, 1)
+    gravadas, _ = atrasada.upsert([dict(novo), dict(novo)])
+    assert [g["id"] for g in gravadas] == [N_GASTOS + 1, N_GASTOS + 2]
+    atrasada.descarregar()
+    assert len(storage.ler()) == N_GASTOS + 2
+
+
+def test_passar_de_max_pendentes_grava_na_hora(storage):
+    escrita = EscritaAtrasada(storage, threading.RLock(), intervalo=3600, max_pendentes=3)
+    novo = linha(storage, 1)
+    escrita.upsert([dict(novo), dict(novo)])
+    assert escrita.pendentes == 2
+    escrita.upsert([dict(novo)])
+    assert escrita.pendentes == 0
+    assert len(storage.ler()) == N_GASTOS + 3
+
+
+def test_a_thread_descarrega_depois_do_intervalo(storage):
+    escrita = EscritaAtrasada(storage, threading.RLock(), intervalo=0.05)
+    atual = linha(storage, 1)
+    escrita.upsert([{**atual, "descricao": "editada"}], [atual["versao"]])
+    limite = time.monotonic() + 5
+    while escrita.pendentes and time.monotonic() < limite:
+        time.sleep(0.02)
+    assert escrita.pendentes == 0
+    assert linha(storage, 1)["descricao"] == "editada"
+
+
+def test_conflito_no_descarregamento_descarta_so_a_linha_e_relata(atrasada, storage):
+    avisos = []
+    atrasada.ao_descarregar = lambda antes, depois, relatorio: avisos.append(relatorio)
+    l1, l2 = linha(atrasada, 1), linha(atrasada, 2)
+    atrasada.upsert([{**l1, "descricao": "minha"}, {**l2, "descricao": "minha também"}], [l1["versao"], l2["versao"]])
+
+    # Outro processo grava a linha 1 direto no arquivo
+    storage.upsert([{**l1, "descricao": "de fora"}], [l1["versao"]])
+    atrasada.descarregar()
+
+    assert atrasada.pendentes == 0
+    assert linha(storage, 1)["descricao"] == "de fora"
+    assert linha(storage, 2)["descricao"] == "minha também"
+    assert [c["id"] for c in atrasada.conflitos] == [1]
+    assert atrasada.conflitos[0]["sua"]["descricao"] == "minha"
+    assert atrasada.conflitos[0]["atual"]["descricao"] == "de fora"
+    assert avisos == [atrasada.conflitos]
+    assert linha(atrasada, 1)["descricao"] == "de fora"
+
+
+def test_salvar_pendente_absorve_as_edicoes_anteriores(atrasada, storage):
+    atual = linha(atrasada, 1)
+    atrasada.upsert([{**atual, "descricao": "editada"}], [atual["versao"]])
+    df = atrasada.ler()
+    atrasada.salvar(df[df["id"] != 2])
+    assert len(storage.ler()) == N_GASTOS
+
+    atrasada.descarregar()
+    df = storage.ler()
+    assert len(df) == N_GASTOS - 1
+    assert 2 not in df["id"].tolist()
+    assert df.loc[df["id"] == 1, "descricao"].item() == "editada"
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from importacao import importar, preparar_bloco
+
+BASE = {
+    "categoria": "Buffet", "fornecedor": "Sabor & Arte", "valor_total": "1000", "entrada": "100",
+    "num_parcelas": "3", "parcelas_pagas": "1", "data_primeira_parcela": "2026-03-15",
+}
+
+
+def test_colunas_obrigatorias_ausentes_levantam_erro():
+    with pytest.raises(ValueError, match="valor_total"):
+        preparar_bloco(pd.DataFrame({"categoria": ["Buffet"], "fornecedor": ["X"]}, dtype=str), 2)
+
+
+def test_linha_valida_vai_para_centavos_com_os_padroes():
+    bruto = pd.DataFrame({" Categoria ": ["Buffet"], "FORNECEDOR": ["X"], "valor_total": ["1000.50"]})
+    gastos, erros = preparar_bloco(bruto, 2, hoje=date(2026, 5, 1))
+    assert erros.empty
+    gasto = gastos.iloc[0]
+    assert gasto["valor_total"] == 100050
+    assert gasto["entrada"] == 0
+    assert gasto["num_parcelas"] == 1
+    assert gasto["parcelas_pagas"] == 0
+    assert gasto["valor_parcela"] == 100050
+    assert gasto["data_primeira_parcela"] == "2026-05-01"
+
+
+def test_data_no_formato_brasileiro_e_aceita():
+    gastos, erros = preparar_bloco(pd.DataFrame([{**BASE, "data_primeira_parcela": "15/03/2026"}]), 2)
+    assert erros.empty
+    assert gastos["data_primeira_parcela"].tolist() == ["2026-03-15"]
+
+
+@pytest.mark.parametrize("coluna, valor, erro", [
+    ("valor_total", "abc", "valor_total: valor não numérico."),
+    ("entrada", "x", "entrada: valor não numérico."),
+    ("valor_total", "0", "O valor total deve ser maior que zero."),
+    ("entrada", "-5", "entrada: não pode ser negativa."),
+    ("entrada", "5000", "A entrada não pode ser maior que o valor total."),
+    ("num_parcelas", "0", "num_parcelas: deve ser um inteiro maior ou igual a 1."),
+    ("num_parcelas", "2.5", "num_parcelas: deve ser um inteiro maior ou igual a 1."),
+    ("parcelas_pagas", "4", "parcelas_pagas: deve ser um inteiro entre 0 e num_parcelas."),
+    ("data_primeira_parcela", "31/02/2026", "data_primeira_parcela: data inválida."),
+    ("categoria", " ", "Informe uma categoria."),
+    ("fornecedor", "", "Informe o fornecedor."),
+])
+def test_linha_invalida_vai_para_o_relatorio(coluna, valor, erro):
+    bruto = pd.DataFrame([BASE, {**BASE, coluna: valor}, BASE])
+    gastos, erros = preparar_bloco(bruto, 10)
+    assert len(gastos) == 2
+    # A linha 11 da planilha é a segunda do bloco que começa na linha 10
+    assert set(erros["linha"]) == {11}
+    assert erro in erros["erro"].tolist()
+
+
+def test_importar_numera_cada_bloco_a_partir_dos_ids_gravados():
+    numerados = []
+
+    def gravar(gastos):
+        numerados.append(gastos["id"].tolist())
+        # Outra escrita ocupou os ids no meio tempo: o storage os trocou
+        return [{**g, "id": g["id"] + 100} for g in gastos.to_dict("records")]
+
+    blocos = [pd.DataFrame([BASE, BASE]), pd.DataFrame([BASE, {**BASE, "data_primeira_parcela": "ontem"}, BASE])]
+    importados, relatorio = importar(blocos, gravar, 1)
+    assert importados == 4
+    assert numerados == [[1, 2], [103, 104]]
+    assert relatorio.to_dict("records") == [{"linha": 5, "erro": "data_primeira_parcela: data inválida."}]
@@ -0,0 +1,37 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gerador import gerar_gastos
+from relatorios import Exportacao, exportar
+
+
+@pytest.mark.parametrize("formato", ["csv", "xlsx", "html"])
+def test_exportar_grava_o_destino_sem_temporario(tmp_path, formato):
+    destino = tmp_path / f"gastos.{formato}"
+    exportar(gerar_gastos(50, seed=1), "gastos", formato, destino, tamanho_bloco=10)
+    assert destino.stat().st_size > 0
+    assert list(tmp_path.iterdir()) == [destino]
+
+
+def test_exportacao_que_falha_nao_deixa_arquivo(tmp_path):
+    def progresso(feitos, total):
+        raise RuntimeError("falhou no meio")
+
+    with pytest.raises(RuntimeError):
+        exportar(gerar_gastos(50, seed=1), "gastos", "csv", tmp_path / "gastos.csv", progresso, tamanho_bloco=10)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_exportacao_cancelada_nao_tem_erro(tmp_path):
+    liberar = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # Ocupa a única thread: a exportação fica na fila e pode ser cancelada
+        pool.submit(liberar.wait, 5)
+        exportacao = Exportacao(pool, gerar_gastos(10, seed=1), "gastos", "csv", tmp_path / "gastos.csv")
+        exportacao.descartar()
+        assert exportacao.concluida
+        assert exportacao.erro is None
+        liberar.set()
+    assert not (tmp_path / "gastos.csv").exists()
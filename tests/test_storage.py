@@ -0,0 +1,179 @@
+import pytest
+
+import storage as storage_mod
+from conftest import N_GASTOS, abrir_com_gastos, linha
+from storage import abrir_storage, converter_storage
+
+
+# Compare-and-swap e ids (todos os backends)
+
+def test_upsert_com_a_versao_esperada_incrementa_a_versao(storage):
+    atual = linha(storage, 3)
+    gravadas, conflitos = storage.upsert([{**atual, "descricao": "editada"}], [atual["versao"]])
+    assert conflitos == []
+    assert gravadas[0]["versao"] == atual["versao"] + 1
+    relida = linha(abrir_storage(storage.path), 3)
+    assert relida["descricao"] == "editada"
+    assert relida["versao"] == atual["versao"] + 1
+
+
+def test_upsert_com_versao_velha_nao_grava_nada_do_lote(storage):
+    l3, l4 = linha(storage, 3), linha(storage, 4)
+    storage.upsert([{**l3, "descricao": "de outra sessão"}], [l3["versao"]])
+
+    gravadas, conflitos = storage.upsert(
+        [{**l4, "descricao": "minha"}, {**l3, "descricao": "minha"}], [l4["versao"], l3["versao"]],
+    )
+    assert gravadas == []
+    assert [c["id"] for c in conflitos] == [3]
+    assert conflitos[0]["versao_esperada"] == l3["versao"]
+    assert conflitos[0]["versao_atual"] == l3["versao"] + 1
+    assert conflitos[0]["atual"]["descricao"] == "de outra sessão"
+    assert linha(storage, 4)["descricao"] == l4["descricao"]
+    assert linha(storage, 3)["descricao"] == "de outra sessão"
+
+
+def test_insercao_com_id_ocupado_recebe_o_proximo_id(storage):
+    novo = {**linha(storage, 5), "descricao": "nova"}
+    gravadas, conflitos = storage.upsert([novo, dict(novo)])
+    assert conflitos == []
+    assert [g["id"] for g in gravadas] == [N_GASTOS + 1, N_GASTOS + 2]
+    assert [g["versao"] for g in gravadas] == [1, 1]
+    df = storage.ler()
+    assert len(df) == N_GASTOS + 2
+    assert df["id"].is_unique
+    assert linha(storage, 5)["descricao"] != "nova"
+
+
+def test_gravar_linhas_confere_as_versoes_base(storage):
+    atual = linha(storage, 7)
+    editada = {**atual, "descricao": "editada", "versao": atual["versao"] + 1}
+
+    assert storage.gravar_linhas([editada], [atual["versao"] + 5]) == [7]
+    assert linha(storage, 7)["descricao"] == atual["descricao"]
+
+    assert storage.gravar_linhas([editada], [atual["versao"]]) == []
+    assert linha(abrir_storage(storage.path), 7)["descricao"] == "editada"
+
+
+def test_gravar_linhas_de_insercao_com_id_existente_e_conflito(storage):
+    nova = {**linha(storage, 2), "id": N_GASTOS + 1, "versao": 1}
+    repetida = {**linha(storage, 2), "descricao": "repetida", "versao": 1}
+
+    assert storage.gravar_linhas([nova, repetida], [None, None]) == [2]
+    assert len(storage.ler()) == N_GASTOS
+
+    assert storage.gravar_linhas([nova], [None]) == []
+    assert len(storage.ler()) == N_GASTOS + 1
+
+
+# Journal (backends de snapshot)
+
+def test_journal_e_reaplicado_ao_reabrir(snapshot):
+    atual = linha(snapshot, 1)
+    snapshot.upsert([{**atual, "descricao": "editada"}], [atual["versao"]])
+    snapshot.upsert([{**atual, "id": 999, "fornecedor": "Novo"}])
+    assert snapshot.journal_path.exists()
+
+    df = abrir_storage(snapshot.path).ler()
+    assert len(df) == N_GASTOS + 1
+    assert df.loc[df["id"] == 1, "descricao"].item() == "editada"
+    assert df.loc[df["id"] == 999, "fornecedor"].item() == "Novo"
+
+
+def test_compactar_incorpora_o_journal_no_snapshot(snapshot):
+    atual = linha(snapshot, 1)
+    snapshot.upsert([{**atual, "descricao": "editada"}], [atual["versao"]])
+    antes = snapshot.ler()
+
+    snapshot.compactar()
+    assert not snapshot.journal_path.exists()
+    depois = abrir_storage(snapshot.path).ler()
+    assert depois.to_dict("records") == antes.to_dict("records")
+
+
+def test_ultima_linha_truncada_do_journal_e_ignorada(snapshot):
+    atual = linha(snapshot, 1)
+    gravadas, _ = snapshot.upsert([{**atual, "descricao": "primeira"}], [atual["versao"]])
+    snapshot.upsert([{**gravadas[0], "descricao": "segunda"}], [gravadas[0]["versao"]])
+    conteudo = snapshot.journal_path.read_bytes()
+    snapshot.journal_path.write_bytes(conteudo[:-10])
+
+    assert linha(abrir_storage(snapshot.path), 1)["descricao"] == "primeira"
+
+
+def test_escrita_grande_vai_direto_para_o_snapshot(snapshot, monkeypatch):
+    monkeypatch.setattr(storage_mod, "JOURNAL_MAX_REGISTROS", 2)
+    novo = linha(snapshot, 1)
+    snapshot.upsert([dict(novo) for _ in range(3)])
+    assert not snapshot.journal_path.exists()
+    assert len(abrir_storage(snapshot.path).ler()) == N_GASTOS + 3
+
+
+def test_journal_grande_e_compactado(snapshot, monkeypatch):
+    monkeypatch.setattr(storage_mod, "JOURNAL_MAX_BYTES", 1)
+    atual = linha(snapshot, 1)
+    snapshot.upsert([{**atual, "descricao": "editada"}], [atual["versao"]])
+    assert not snapshot.journal_path.exists()
+    assert linha(abrir_storage(snapshot.path), 1)["descricao"] == "editada"
+
+
+def test_lote_suspende_os_limites_e_compacta_no_fim(snapshot, monkeypatch):
+    monkeypatch.setattr(storage_mod, "JOURNAL_MAX_REGISTROS", 2)
+    monkeypatch.setattr(storage_mod, "JOURNAL_MAX_BYTES", 1)
+    snapshots = []
+    gravar = type(snapshot)._gravar_snapshot
+    monkeypatch.setattr(type(snapshot), "_gravar_snapshot", lambda self, df: snapshots.append(len(df)) or gravar(self, df))
+    novo = linha(snapshot, 1)
+
+    with snapshot.lote():
+        with snapshot.lote():
+            snapshot.upsert([dict(novo) for _ in range(3)])
+        snapshot.upsert([dict(novo) for _ in range(3)])
+        assert snapshot.journal_path.exists()
+        assert snapshots == []
+    assert not snapshot.journal_path.exists()
+    assert snapshots == [N_GASTOS + 6]
+
+
+# Arquivos auxiliares
+
+def test_arquivos_com_o_mesmo_nome_base_nao_dividem_o_journal(tmp_path):
+    csv = abrir_com_gastos(tmp_path / "g.csv")
+    abrir_com_gastos(tmp_path / "g.parquet")
+    csv.upsert([linha(csv, 1)])
+
+    assert csv.journal_path.name == "g.csv.journal"
+    assert len(abrir_storage(tmp_path / "g.csv").ler()) == N_GASTOS + 1
+    assert len(abrir_storage(tmp_path / "g.parquet").ler()) == N_GASTOS
+
+
+def test_journal_com_o_nome_antigo_e_adotado(tmp_path):
+    csv = abrir_com_gastos(tmp_path / "g.csv")
+    csv.upsert([linha(csv, 1)])
+    csv.journal_path.rename(tmp_path / "g.journal")
+
+    reaberto = abrir_storage(tmp_path / "g.csv")
+    assert reaberto.journal_path.exists()
+    assert not (tmp_path / "g.journal").exists()
+    assert len(reaberto.ler()) == N_GASTOS + 1
+
+
+def test_journal_com_o_nome_antigo_ambiguo_fica_onde_esta(tmp_path):
+    csv = abrir_com_gastos(tmp_path / "g.csv")
+    abrir_com_gastos(tmp_path / "g.parquet")
+    csv.upsert([linha(csv, 1)])
+    csv.journal_path.rename(tmp_path / "g.journal")
+
+    assert len(abrir_storage(tmp_path / "g.parquet").ler()) == N_GASTOS
+    assert (tmp_path / "g.journal").exists()
+
+
+def test_converter_nao_deixa_o_journal_da_origem(tmp_path):
+    csv = abrir_com_gastos(tmp_path / "g.csv")
+    csv.upsert([linha(csv, 1)])
+
+    assert converter_storage(tmp_path / "g.csv", tmp_path / "g.db") == N_GASTOS + 1
+    assert not csv.journal_path.exists()
+    assert len(abrir_storage(tmp_path / "g.csv").ler()) == N_GASTOS + 1
+    assert len(abrir_storage(tmp_path / "g.db").ler()) == N_GASTOS + 1